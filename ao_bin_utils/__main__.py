@@ -0,0 +1,5 @@
+import sys
+
+from ao_bin_utils.ao_bin_cli import main
+
+sys.exit(main())
@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic, sleep, time
+from typing import Dict, Iterator, List
+
+import numpy as np
+import requests
+
+import ao_bin_utils.ao_bin_utilities as abu
+from ao_bin_utils.ao_bin_data import AoBinData
+from ao_bin_utils.ao_bin_export import get_enchant_item_powers
+from ao_bin_utils.ao_bin_item_id import ItemId
+from ao_bin_utils.ao_bin_metrics import METRICS
+
+CITIES = [
+    'Bridgewatch',
+    'Caerleon',
+    'Fort Sterling',
+    'Lymhurst',
+    'Martlock',
+    'Thetford',
+    'Black Market',
+]
+QUALITIES = [1, 2, 3, 4, 5]
+
+# The API allows 180 requests a minute, URLs are kept under 4 KB
+REQUESTS_PER_SECOND = 3.0
+MAX_URL_LENGTH = 4000
+MAX_RETRIES = 3
+RETRY_SLEEP = 1.0
+MARKET_TAX = 0.065
+CHUNK_SIZE = 4096
+
+logger = logging.getLogger(__name__)
+
+
+def get_tradeable_items(ao_data: AoBinData) -> List:
+    """Returns the unique names of every item and enchant level in the data.
+
+    Returns
+    -------
+    list
+        Unique names with the enchant level if enchanted, e.g.
+        ['T4_BAG', 'T4_BAG@1', ...].
+    """
+
+    res = []
+    for _, item in ao_data.get_items():
+        item_id = ItemId.parse(item['@uniquename'])
+        for enchant in sorted(get_enchant_item_powers(item)):
+            res.append(item_id.with_enchant(enchant).name)
+
+    return list(dict.fromkeys(res))
+
+
+def make_batches(names: List, max_length: int = MAX_URL_LENGTH) -> List:
+    """Splits names into batches whose price URL fits in max_length."""
+
+    budget = max_length - len(abu.PRICE_URL)
+    res = []
+    batch = []
+    length = 0
+    for name in names:
+        if batch and length + len(name) + 1 > budget:
+            res.append(batch)
+            batch = []
+            length = 0
+        batch.append(name)
+        length += len(name) + 1
+
+    if batch:
+        res.append(batch)
+
+    return res
+
+
+class RateLimiter():
+    """Spaces calls to wait() at least 1/rate seconds apart across threads.
+
+    A rate of None doesn't wait.
+    """
+
+    def __init__(self, rate: float = REQUESTS_PER_SECOND):
+        self._interval = 1/rate if rate else 0
+        self._next = 0.0
+        self._lock = Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = monotonic()
+            start = max(now, self._next)
+            self._next = start + self._interval
+
+        if start > now:
+            sleep(start - now)
+            METRICS.inc('ao_bin_sleep_seconds_total', start - now)
+
+
+class AoBinPriceMatrix():
+    """Latest sell and buy order prices per item, quality and city.
+
+    Prices are kept in (item, quality, city) NumPy arrays with the time they
+    were seen in the market. Missing and stale sell prices are +inf and
+    buy prices -inf, so they never make a spread.
+
+    ...
+
+    Attributes
+    ----------
+    items, qualities, cities: list
+        Labels of each axis.
+    sell_min, buy_max: numpy array
+        Cheapest sell order and highest buy order.
+    sell_date, buy_date: numpy array
+        datetime64[s] the price was seen, NaT if never.
+
+    Methods
+    -------
+    update(records):
+        Stores the prices from a market API response.
+    spreads(max_age, min_profit, tax):
+        Returns the best cross-city trade of every item and quality, ranked.
+    """
+
+    def __init__(self, items: List, cities: List = None,
+                 qualities: List = None):
+        self.items = list(items)
+        self.cities = list(cities or CITIES)
+        self.qualities = list(qualities or QUALITIES)
+        self._item_index = {x: i for i, x in enumerate(self.items)}
+        self._city_index = {x: i for i, x in enumerate(self.cities)}
+        self._quality_index = {x: i for i, x in enumerate(self.qualities)}
+
+        shape = (len(self.items), len(self.qualities), len(self.cities))
+        self.sell_min = np.full(shape, np.inf)
+        self.buy_max = np.full(shape, -np.inf)
+        self.sell_date = np.full(shape, np.datetime64('NaT'), 'datetime64[s]')
+        self.buy_date = np.full(shape, np.datetime64('NaT'), 'datetime64[s]')
+        self._lock = Lock()
+
+    def update(self, records: List) -> int:
+        """Stores the prices from a market API response.
+
+        Records for unknown items, qualities or cities are skipped, as are
+        prices of 0, which the API returns when there is no order.
+
+        Parameters
+        ----------
+        records: list
+            Dictionaries with 'item_id', 'quality', 'city',
+            'sell_price_min', 'sell_price_min_date', 'buy_price_max' and
+            'buy_price_max_date' keys.
+
+        Returns
+        -------
+        int
+            Number of records stored.
+        """
+
+        index = []
+        sell = []
+        buy = []
+        for x in records:
+            i = self._item_index.get(x['item_id'])
+            q = self._quality_index.get(x['quality'])
+            c = self._city_index.get(x['city'])
+            if i is None or q is None or c is None:
+                continue
+            index.append((i, q, c))
+            sell.append((
+                x.get('sell_price_min') or 0,
+                x.get('sell_price_min_date') or 'NaT',
+            ))
+            buy.append((
+                x.get('buy_price_max') or 0,
+                x.get('buy_price_max_date') or 'NaT',
+            ))
+
+        if not index:
+            return 0
+
+        index = tuple(np.array(index, dtype=np.intp).T)
+        with self._lock:
+            for (prices, dates), values, missing in (
+                ((self.sell_min, self.sell_date), sell, np.inf),
+                ((self.buy_max, self.buy_date), buy, -np.inf),
+            ):
+                price = np.array([x[0] for x in values], dtype=np.float64)
+                date = np.array(
+                    [x[1] for x in values], dtype='datetime64[s]'
+                )
+                has_order = price > 0
+                prices[index] = np.where(has_order, price, missing)
+                dates[index] = np.where(has_order, date, np.datetime64('NaT'))
+
+        return len(index[0])
+
+    def _fresh(self, prices, dates, now, max_age, missing):
+        if max_age is None:
+            return prices
+        fresh = (now - dates) <= np.timedelta64(int(max_age*60), 's')
+
+        return np.where(fresh, prices, missing)
+
+    def spreads(
+            self,
+            max_age: float = None,
+            min_profit: float = 0,
+            tax: float = MARKET_TAX) -> List:
+        """Returns the best cross-city trade of every item and quality.
+
+        A trade buys from the cheapest sell order in one city and sells to
+        the highest buy order in another, paying tax on the sale. All
+        city pairs are compared at once, in chunks of CHUNK_SIZE items.
+
+        Parameters
+        ----------
+        max_age: float
+            Max age of a price in minutes. (default: any age)
+        min_profit: float
+            Trades must make more than this after tax.
+        tax: float
+            Share of the sale price lost to market tax.
+
+        Returns
+        -------
+        list
+            Dictionaries with 'item', 'quality', 'buy_city', 'buy_price',
+            'sell_city', 'sell_price', 'profit' and 'roi', most profitable
+            first.
+        """
+
+        if not self.items:
+            return []
+
+        now = np.datetime64(int(time()), 's')
+        with self._lock:
+            sell = self._fresh(
+                self.sell_min, self.sell_date, now, max_age, np.inf
+            )
+            buy = self._fresh(
+                self.buy_max, self.buy_date, now, max_age, -np.inf
+            )
+
+        n_cities = len(self.cities)
+        same_city = np.eye(n_cities, dtype=bool).ravel()
+
+        found = []
+        for start in range(0, len(self.items), CHUNK_SIZE):
+            chunk_sell = sell[start:start + CHUNK_SIZE]
+            chunk_buy = buy[start:start + CHUNK_SIZE]
+
+            # profit[i, q, a*n_cities + b] buys in city a, sells in city b
+            profit = (
+                chunk_buy[:, :, None, :]*(1 - tax)
+                - chunk_sell[:, :, :, None]
+            ).reshape(chunk_sell.shape[:2] + (-1,))
+            profit[:, :, same_city] = -np.inf
+
+            best = profit.argmax(axis=2)
+            best_profit = np.take_along_axis(
+                profit, best[:, :, None], axis=2
+            )[:, :, 0]
+            i, q = np.nonzero(best_profit > min_profit)
+            found.append((i + start, q, best[i, q], best_profit[i, q]))
+
+        items = np.concatenate([x[0] for x in found])
+        qualities = np.concatenate([x[1] for x in found])
+        pairs = np.concatenate([x[2] for x in found])
+        profits = np.concatenate([x[3] for x in found])
+        order = np.argsort(-profits, kind='stable')
+
+        res = []
+        for i, q, pair, profit in zip(
+            items[order].tolist(),
+            qualities[order].tolist(),
+            pairs[order].tolist(),
+            profits[order].tolist(),
+        ):
+            a, b = divmod(pair, n_cities)
+            buy_price = float(sell[i, q, a])
+            res.append({
+                'item': self.items[i],
+                'quality': self.qualities[q],
+                'buy_city': self.cities[a],
+                'buy_price': buy_price,
+                'sell_city': self.cities[b],
+                'sell_price': float(buy[i, q, b]),
+                'profit': profit,
+                'roi': profit/buy_price,
+            })
+
+        return res
+
+
+class AoBinArbitrageScanner():
+    """Sweeps the market API for every item and finds cross-city trades.
+
+    The items are split into batches that fit in one request URL. Each
+    request covers every city and quality, with both sell and buy orders.
+    Requests run on a few threads, spaced out by a shared RateLimiter, and
+    feed an AoBinPriceMatrix that keeps the latest price seen. At the
+    default rate a 25,000 name sweep takes about 150 requests, under a
+    minute.
+
+    ...
+
+    Attributes
+    ----------
+    matrix: AoBinPriceMatrix object
+        The latest prices.
+    batches: list
+        Names requested together.
+    history: AoBinPriceHistory object
+        History every response's sell prices are recorded to, or None.
+
+    Methods
+    -------
+    sweep():
+        Requests the prices of every item once.
+    scan(refresh, max_age, min_profit, sweeps):
+        Sweeps every refresh seconds and yields the ranked trades.
+    """
+
+    def __init__(
+            self,
+            items: List,
+            cities: List = None,
+            qualities: List = None,
+            rate: float = REQUESTS_PER_SECOND,
+            workers: int = 4,
+            max_url_length: int = MAX_URL_LENGTH,
+            history=None):
+        """Constructor for the class.
+
+        Parameters
+        ----------
+        items: list
+            Unique names to scan, see get_tradeable_items.
+        cities: list
+            Market locations to scan. (default: CITIES)
+        qualities: list
+            Qualities to scan. (default: QUALITIES)
+        rate: float
+            Most requests per second, None for no limit.
+        workers: int
+            Number of requests in flight at once.
+        max_url_length: int
+            Longest request URL.
+        history: AoBinPriceHistory object
+            History the sell prices are recorded to. (default: None)
+        """
+
+        self.matrix = AoBinPriceMatrix(items, cities, qualities)
+        self.batches = make_batches(self.matrix.items, max_url_length)
+        self._limiter = RateLimiter(rate)
+        self._workers = workers
+        self.history = history
+        self._params = {
+            'locations': ','.join(self.matrix.cities),
+            'qualities': ','.join(str(x) for x in self.matrix.qualities),
+        }
+
+    def _fetch(self, batch: List) -> int:
+        """Requests the prices of a batch, retrying failed requests."""
+
+        url = f"{abu.PRICE_URL}{','.join(batch)}"
+        for attempt in range(1, MAX_RETRIES + 1):
+            self._limiter.wait()
+            try:
+                with METRICS.timer(
+                    'ao_bin_http_request_seconds', endpoint='prices'
+                ):
+                    response = requests.get(url, params=self._params)
+            except requests.RequestException as e:
+                logger.warning("Price request failed: %s", e)
+                continue
+
+            METRICS.inc(
+                'ao_bin_http_requests_total', status=response.status_code
+            )
+            if response.status_code == 200:
+                records = response.json()
+                if self.history is not None:
+                    self.history.append_records(records)
+                return self.matrix.update(records)
+
+            logger.warning(
+                "Price request returned %s, attempt %d",
+                response.status_code, attempt
+            )
+            sleep(RETRY_SLEEP*attempt)
+
+        return 0
+
+    def sweep(self) -> Dict:
+        """Requests the prices of every item once.
+
+        Returns
+        -------
+        dictionary
+            'requests', 'records' stored and 'seconds' taken.
+        """
+
+        start = monotonic()
+        with ThreadPoolExecutor(self._workers) as executor:
+            records = sum(executor.map(self._fetch, self.batches))
+
+        res = {
+            'requests': len(self.batches),
+            'records': records,
+            'seconds': monotonic() - start,
+        }
+        logger.info("Swept %d batches in %.1f s", len(self.batches),
+                    res['seconds'])
+
+        return res
+
+    def scan(
+            self,
+            refresh: float = 300,
+            max_age: float = 60,
+            min_profit: float = 0,
+            sweeps: int = None) -> Iterator[Dict]:
+        """Sweeps every refresh seconds and yields the ranked trades.
+
+        Parameters
+        ----------
+        refresh: float
+            Seconds from the start of one sweep to the next.
+        max_age, min_profit:
+            See AoBinPriceMatrix.spreads.
+        sweeps: int
+            Number of sweeps, None to scan forever.
+
+        Yields
+        ------
+        dictionary
+            Trades from AoBinPriceMatrix.spreads, most profitable first
+            within each sweep, with the 'sweep' number added.
+        """
+
+        n = 0
+        while sweeps is None or n < sweeps:
+            start = monotonic()
+            self.sweep()
+            for trade in self.matrix.spreads(max_age, min_profit):
+                trade['sweep'] = n
+                yield trade
+
+            n += 1
+            remaining = refresh - (monotonic() - start)
+            if remaining > 0 and (sweeps is None or n < sweeps):
+                sleep(remaining)
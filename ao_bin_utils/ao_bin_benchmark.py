@@ -0,0 +1,463 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, redirect_stdout
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+from unittest import mock
+from urllib.parse import urlencode
+
+import requests
+
+import ao_bin_utils.ao_bin_tools as aot
+import ao_bin_utils.ao_bin_utilities as abu
+from ao_bin_utils.ao_bin_data import AoBinData
+from ao_bin_utils.ao_bin_ip_index import AoBinIpIndex
+
+BASE_DIR = Path(__file__).resolve().parent
+API_FIXTURE = BASE_DIR / 'fixtures' / 'api_responses.json'
+RESULTS_DIR = BASE_DIR / 'benchmarks'
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+BENCH_ITEMS = ['T4_OFF_SHIELD', 'T4_BAG', 'T4_2H_BOW', 'T4_MAIN_SWORD']
+BENCH_LOCATION = 'Lymhurst'
+
+
+class _Response():
+    """The parts of requests.Response that get_item_price uses."""
+
+    def __init__(self, data: List, status_code: int = 200):
+        self._data = data
+        self.status_code = status_code
+
+    @property
+    def content(self) -> bytes:
+        return json.dumps(self._data).encode()
+
+    def json(self) -> List:
+        return self._data
+
+
+class ApiReplay():
+    """Stands in for requests.get with recorded market API responses.
+
+    Recorded price dates are moved forward by the time since the recording,
+    so the prices are as fresh as they were when recorded. Requests that
+    weren't recorded get a synthetic response with a price for every item,
+    quality and location, derived from a hash of the three, so runs
+    without a recording are still reproducible.
+
+    ...
+
+    Attributes
+    ----------
+    recorded_at: datetime
+        When the responses were recorded.
+    responses: dictionary
+        Request key to the recorded JSON response.
+    live: bool
+        If true, requests go to the API and the responses are recorded.
+
+    Methods
+    -------
+    get(url, params):
+        Returns the response to a GET request.
+    save():
+        Writes the recorded responses to the fixture file.
+    """
+
+    def __init__(self, fixture_file=API_FIXTURE, live: bool = False):
+        """Constructor loads the recorded responses, if any.
+
+        Parameters
+        ----------
+        fixture_file: str or Path
+            Location of the recorded responses.
+        live: bool
+            If true, requests go to the API and are recorded.
+        """
+
+        self._fixture_file = Path(fixture_file)
+        self._get = requests.get
+        self.live = live
+        self.recorded_at = datetime.now(tz=timezone.utc)
+        self.responses = {}
+
+        if not live and self._fixture_file.exists():
+            with open(self._fixture_file) as f:
+                fixture = json.load(f)
+            self.recorded_at = datetime.strptime(
+                fixture['recorded_at'], DATE_FORMAT
+            ).replace(tzinfo=timezone.utc)
+            self.responses = fixture['responses']
+
+    @staticmethod
+    def key(url: str, params: Dict) -> str:
+        """Returns the key a request is recorded under."""
+
+        return url.rsplit('/', 1)[-1] + '?' + urlencode(
+            sorted((params or {}).items())
+        )
+
+    @staticmethod
+    def synthetic(url: str, params: Dict) -> List:
+        """Returns a made up response with sell and buy prices for every
+        combination.
+        """
+
+        now = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        res = []
+        for item_id in url.rsplit('/', 1)[-1].split(','):
+            for city in params['locations'].split(','):
+                for quality in params['qualities'].split(','):
+                    digest = int.from_bytes(hashlib.blake2b(
+                        f'{item_id}|{quality}|{city}'.encode(), digest_size=8
+                    ).digest(), 'little')
+                    date = now - timedelta(minutes=digest % 30)
+                    res.append({
+                        'item_id': item_id,
+                        'city': city,
+                        'quality': int(quality),
+                        'sell_price_min': (
+                            0 if digest % 7 == 0 else 1000 + digest % 100000
+                        ),
+                        'sell_price_min_date': date.strftime(DATE_FORMAT),
+                        'buy_price_max': (
+                            0 if digest % 5 == 0
+                            else 800 + (digest >> 20) % 100000
+                        ),
+                        'buy_price_max_date': date.strftime(DATE_FORMAT),
+                    })
+
+        return res
+
+    def get(self, url: str, params: Dict = None) -> _Response:
+        """Returns the response to a GET request."""
+
+        key = self.key(url, params)
+        if self.live:
+            response = self._get(url, params=params)
+            self.responses[key] = response.json()
+            return response
+
+        if key not in self.responses:
+            return _Response(self.synthetic(url, params))
+
+        shift = datetime.now(tz=timezone.utc) - self.recorded_at
+        res = []
+        for item in self.responses[key]:
+            item = dict(item)
+            date = datetime.strptime(item['sell_price_min_date'], DATE_FORMAT)
+            item['sell_price_min_date'] = (date + shift).strftime(DATE_FORMAT)
+            res.append(item)
+
+        return _Response(res)
+
+    def save(self) -> None:
+        """Writes the recorded responses to the fixture file."""
+
+        self._fixture_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._fixture_file, 'w') as f:
+            json.dump(
+                {
+                    'recorded_at': self.recorded_at.strftime(DATE_FORMAT),
+                    'responses': self.responses,
+                },
+                f,
+                indent=1,
+                sort_keys=True,
+            )
+
+
+def _new_ao_data() -> AoBinData:
+    """Builds a new AoBinData, bypassing the singleton."""
+
+    ao_data = AoBinData.__new__(AoBinData)
+    ao_data.__init__()
+
+    return ao_data
+
+
+def get_cases() -> Dict[str, Callable]:
+    """Returns the benchmark cases by name.
+
+    Each case is a function taking the shared AoBinData, or None if it
+    couldn't be built, and returning the function to time. A case raises
+    LookupError if it can't run.
+    """
+
+    def needs(ao_data):
+        if ao_data is None:
+            raise LookupError('AoBinData could not be built')
+        return ao_data
+
+    def names(ao_data):
+        return [v['@uniquename'] for _, v in needs(ao_data).get_items()]
+
+    def get_item(ao_data):
+        unique_names = names(ao_data)
+        return lambda: [ao_data.get_item(x) for x in unique_names]
+
+    def get_local_name(ao_data):
+        unique_names = names(ao_data)
+        return lambda: [ao_data.get_local_name(x) for x in unique_names]
+
+    def get_unique_name(ao_data):
+        local_names = [k for k, _ in needs(ao_data).get_items()]
+        return lambda: [ao_data.get_unique_name(x) for x in local_names]
+
+    def get_item_power(ao_data):
+        variants = [
+            x for base in BENCH_ITEMS for x in abu.get_item_variants(base, 4)
+        ]
+        needs(ao_data)
+        return lambda: [
+            abu.get_item_power(x, quality, 100, ao_data)
+            for x in variants for quality in range(1, 6)
+        ]
+
+    def get_items_above_ip(ao_data):
+        needs(ao_data)
+        return lambda: [
+            abu.get_items_above_ip(x, 1000, 100, 4, ao_data)
+            for x in BENCH_ITEMS
+        ]
+
+    def ip_range_query(ao_data):
+        index = AoBinIpIndex(needs(ao_data))
+        return lambda: [
+            index.query(subcategory, None, 1000, 1100, 100)
+            for subcategory in [None] + index.subcategories()
+        ]
+
+    def get_item_price(ao_data):
+        variants = [
+            x for base in BENCH_ITEMS for x in abu.get_item_variants(base, 4)
+        ]
+        qualities = [1 + i % 5 for i in range(len(variants))]
+        return lambda: abu.get_item_price(
+            variants, qualities, BENCH_LOCATION, 60
+        )
+
+    def efficient_item_power(ao_data):
+        strategy = aot.EfficientItemPower(
+            [1000]*len(BENCH_ITEMS),
+            BENCH_ITEMS,
+            [100]*len(BENCH_ITEMS),
+            [4]*len(BENCH_ITEMS),
+            BENCH_LOCATION,
+        )
+        needs(ao_data)
+        return lambda: strategy.algorithm(ao_data)
+
+    def generate_fixture(ao_data):
+        output_file = Path(tempfile.gettempdir()) / 'ao_bin_fixture.json'
+        needs(ao_data)
+        return lambda: ao_data.generate_fixture(output_file)
+
+    return {
+        'ao_bin_data_init': lambda ao_data: _new_ao_data,
+        'get_item': get_item,
+        'get_local_name': get_local_name,
+        'get_unique_name': get_unique_name,
+        'get_item_power': get_item_power,
+        'get_items_above_ip': get_items_above_ip,
+        'ip_range_query': ip_range_query,
+        'get_item_price': get_item_price,
+        'efficient_item_power': efficient_item_power,
+        'generate_fixture': generate_fixture,
+    }
+
+
+def time_case(func: Callable, repeat: int) -> Dict:
+    """Times func after one warm up call.
+
+    Returns
+    -------
+    dictionary
+        'repeat' and the 'min', 'median' and 'mean' run time in seconds.
+    """
+
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return {
+        'repeat': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+    }
+
+
+def git_commit() -> str:
+    """Returns the current commit hash, None outside of a git checkout."""
+
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+        cases: List = None,
+        repeat: int = 5,
+        replay: ApiReplay = None) -> Dict:
+    """Runs the benchmark cases with the market API replayed.
+
+    Parameters
+    ----------
+    cases: list of str
+        Names of the cases to run. (default: every case)
+    repeat: int
+        Number of timed runs of each case.
+    replay: ApiReplay object
+        Source of the API responses. (default: ApiReplay())
+
+    Returns
+    -------
+    dictionary
+        'meta': commit, date, Python version and platform.
+        'results': Case name to time_case's result, or to {'skipped':
+        reason} if the case couldn't run.
+    """
+
+    all_cases = get_cases()
+    cases = cases or list(all_cases)
+    replay = replay or ApiReplay()
+
+    try:
+        ao_data = AoBinData()
+    except (OSError, ValueError, KeyError, AssertionError):
+        ao_data = None
+
+    results = {}
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(abu.requests, 'get', replay.get))
+        stack.enter_context(mock.patch.object(abu, 'sleep', lambda _: None))
+        stack.enter_context(redirect_stdout(io.StringIO()))
+
+        for name in cases:
+            try:
+                func = all_cases[name](ao_data)
+                results[name] = time_case(func, repeat)
+            except (LookupError, OSError) as e:
+                results[name] = {'skipped': str(e)}
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.now(tz=timezone.utc).strftime(DATE_FORMAT),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def save(results: Dict, results_dir=RESULTS_DIR) -> Path:
+    """Writes a run's results to results_dir, named by date and commit."""
+
+    results_dir = Path(results_dir)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    meta = results['meta']
+    output_file = results_dir / (
+        meta['date'].replace(':', '') + f"_{(meta['commit'] or 'none')[:10]}"
+        + '.json'
+    )
+    with open(output_file, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    return output_file
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float = 0.1) -> List:
+    """Returns the cases that got slower between two runs.
+
+    Medians are compared, cases skipped in either run are ignored.
+
+    Parameters
+    ----------
+    baseline, current: dictionary
+        Results as returned by run.
+    tolerance: float
+        Allowed slow down as a fraction of the baseline.
+
+    Returns
+    -------
+    list
+        List of (case, baseline median, current median) tuples.
+    """
+
+    res = []
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name, {})
+        if 'median' not in result or 'median' not in old:
+            continue
+        if result['median'] > old['median']*(1 + tolerance):
+            res.append((name, old['median'], result['median']))
+
+    return res
+
+
+def main(argv: List = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run and save a benchmark')
+    run_parser.add_argument('cases', nargs='*')
+    run_parser.add_argument('--repeat', type=int, default=5)
+
+    record_parser = commands.add_parser(
+        'record', help='Record the API responses the cases need'
+    )
+    record_parser.add_argument('cases', nargs='*')
+
+    compare_parser = commands.add_parser(
+        'compare', help='Exit with 1 if a case got slower'
+    )
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        print(save(run(args.cases, args.repeat)))
+        return 0
+
+    if args.command == 'record':
+        replay = ApiReplay(live=True)
+        run(args.cases, repeat=1, replay=replay)
+        replay.save()
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.tolerance)
+    for name, old, new in regressions:
+        print(f'{name}: {old:.6f}s -> {new:.6f}s')
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
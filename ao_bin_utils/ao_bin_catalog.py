@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import json
+import re
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List
+
+from ao_bin_utils.ao_bin_data import SingletonMeta
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR.parent
+CACHE_DIR = BASE_DIR / 'cache'
+
+INDEX_KEYS = ['@uniquename', '@name', '@type']
+REFERENCE_FINDER = r"^[A-Z0-9][A-Z0-9_@]+$"
+
+
+def load_dump(fp) -> Dict:
+    """Returns the root element of an xmltodict style JSON dump.
+
+    Parameters
+    ----------
+    fp: str or Path
+        Location of the JSON file.
+
+    Returns
+    -------
+    dictionary
+        The content of the root element, without the '?xml' declaration.
+    """
+
+    with open(fp, encoding='utf8') as json_file:
+        data = json.load(json_file)
+
+    for k, v in data.items():
+        if k != '?xml':
+            return v if isinstance(v, dict) else {}
+
+    return {}
+
+
+def as_list(value) -> List:
+    """Returns value as a list.
+
+    xmltodict stores an element that appears once as a dictionary and
+    repeated elements as a list of dictionaries.
+    """
+
+    if value is None:
+        return []
+
+    return value if isinstance(value, list) else [value]
+
+
+class AoBinTable():
+    """A single dump table and its secondary indexes.
+
+    ...
+
+    Attributes
+    ----------
+    name: str
+        Name of the table, i.e. the file name without '.json'.
+    root: dictionary
+        Root element of the table.
+    records: list
+        List of (tag, index, record) tuples for each child of the root.
+
+    Methods
+    -------
+    find(key, value):
+        Returns the records whose attribute key equals value.
+    get_record(tag, index):
+        Returns a record by its position under the root.
+    """
+
+    def __init__(self, name: str, root: Dict):
+        """Constructor flattens the root's children into records.
+
+        Parameters
+        ----------
+        name: str
+            Name of the table.
+        root: dictionary
+            Root element of the table as loaded by load_dump.
+        """
+
+        self.name = name
+        self.root = root
+        self._lock = Lock()
+        self.records = [
+            (tag, i, record)
+            for tag, children in root.items() if not tag.startswith('@')
+            for i, record in enumerate(as_list(children))
+            if isinstance(record, dict)
+        ]
+        self._indexes = {key: self._build_index(key) for key in INDEX_KEYS}
+
+    def _build_index(self, key: str) -> Dict:
+        """Builds the value -> records index for an attribute key."""
+
+        index = {}
+        for record in self.records:
+            value = record[2].get(key)
+            if isinstance(value, str):
+                index.setdefault(value, []).append(record[2])
+
+        return index
+
+    def find(self, key: str, value: str) -> List:
+        """Returns the records whose attribute key equals value.
+
+        Indexes for INDEX_KEYS are built with the table, other keys are
+        indexed the first time they are asked for.
+
+        Parameters
+        ----------
+        key: str
+            Attribute name, including the '@', e.g. '@uniquename'.
+        value: str
+            Attribute value to match.
+
+        Returns
+        -------
+        list
+            List of matching records. Empty if none are found.
+        """
+
+        index = self._indexes.get(key)
+        if index is None:
+            with self._lock:
+                if key not in self._indexes:
+                    self._indexes[key] = self._build_index(key)
+                index = self._indexes[key]
+
+        return index.get(value, [])
+
+    def get_record(self, tag: str, index: int) -> Dict:
+        """Returns a record by its position under the root."""
+
+        return as_list(self.root[tag])[index]
+
+
+class AoBinCatalog(metaclass=SingletonMeta):
+    """Lazy access to every JSON table in the dump.
+
+    Tables are discovered when the catalog is built, but only parsed the
+    first time they are accessed. At most max_tables tables are kept in
+    memory and the least recently used one is evicted first.
+
+    ...
+
+    Attributes
+    ----------
+    _paths: dictionary
+        Table name to JSON file location.
+    _tables: OrderedDict
+        Loaded tables in least to most recently used order.
+    _reverse_index: dictionary
+        Attribute value to list of [table, tag, index] record addresses.
+
+    Methods
+    -------
+    tables():
+        Returns the names of all discovered tables.
+    get_table(name):
+        Returns the AoBinTable for name, loading it if necessary.
+    find(table, key, value):
+        Returns the records of a table whose attribute key equals value.
+    find_references(value):
+        Returns the addresses of every record referencing value.
+    build_reverse_index():
+        Scans every table and builds the cross-table reverse index.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, max_tables: int = 16):
+        """Constructor discovers the tables in data_dir.
+
+        Parameters
+        ----------
+        data_dir: str or Path
+            Folder containing the dump's JSON files.
+        max_tables: int
+            Number of tables to keep loaded at once.
+        """
+
+        self._data_dir = Path(data_dir)
+        self._paths = {
+            fp.name[:-len('.json')]: fp
+            for fp in sorted(self._data_dir.glob('*.json'))
+        }
+        self._max_tables = max_tables
+        self._tables = OrderedDict()
+        self._lock = Lock()
+        self._load_locks = {name: Lock() for name in self._paths}
+        self._reverse_index = None
+
+    def tables(self) -> List:
+        """Returns the names of all discovered tables."""
+
+        return list(self._paths.keys())
+
+    def get_table(self, name: str) -> AoBinTable:
+        """Returns the AoBinTable for name, loading it if necessary.
+
+        Parameters
+        ----------
+        name: str
+            Name of the table, e.g. 'loot' or 'buildings'.
+
+        Returns
+        -------
+        AoBinTable
+            The table. Raises KeyError if there is no such table.
+        """
+
+        with self._lock:
+            if name in self._tables:
+                self._tables.move_to_end(name)
+                return self._tables[name]
+
+        # Only one thread parses a given table, the others wait for it
+        with self._load_locks[name]:
+            with self._lock:
+                if name in self._tables:
+                    self._tables.move_to_end(name)
+                    return self._tables[name]
+
+            table = AoBinTable(name, load_dump(self._paths[name]))
+
+            with self._lock:
+                self._tables[name] = table
+                while len(self._tables) > self._max_tables:
+                    self._tables.popitem(last=False)
+
+        return table
+
+    def find(self, table: str, key: str, value: str) -> List:
+        """Returns the records of a table whose attribute key equals value.
+
+        Parameters
+        ----------
+        table: str
+            Name of the table.
+        key: str
+            Attribute name, including the '@', e.g. '@uniquename'.
+        value: str
+            Attribute value to match.
+
+        Returns
+        -------
+        list
+            List of matching records.
+        """
+
+        return self.get_table(table).find(key, value)
+
+    def _signature(self) -> Dict:
+        """Returns the (mtime, size) of each table, used to validate caches."""
+
+        res = {}
+        for name, fp in self._paths.items():
+            stat = fp.stat()
+            res[name] = [stat.st_mtime_ns, stat.st_size]
+
+        return res
+
+    def build_reverse_index(self, save: bool = True) -> Dict:
+        """Scans every table and builds the cross-table reverse index.
+
+        Every identifier shaped attribute value (upper case, digits, '_'
+        and '@') found anywhere within a record maps to the record's
+        address. Values with an enchant level, e.g. 'T6_BAG@1', are also
+        indexed under the base name.
+
+        Tables are read directly rather than through get_table so the scan
+        does not evict tables that are in use.
+
+        Parameters
+        ----------
+        save: bool
+            If true, the index is saved to the cache folder.
+
+        Returns
+        -------
+        dictionary
+            Attribute value to list of [table, tag, index] addresses.
+        """
+
+        pattern = re.compile(REFERENCE_FINDER)
+        index = {}
+
+        def walk(node, address, seen):
+            if isinstance(node, dict):
+                for k, v in node.items():
+                    if isinstance(v, str):
+                        if not k.startswith('@') or not pattern.match(v):
+                            continue
+                        for value in {v, v.split('@')[0]}:
+                            if value and value not in seen:
+                                seen.add(value)
+                                index.setdefault(value, []).append(address)
+                    else:
+                        walk(v, address, seen)
+            elif isinstance(node, list):
+                for x in node:
+                    walk(x, address, seen)
+
+        for name, fp in self._paths.items():
+            table = AoBinTable(name, load_dump(fp))
+            for tag, i, record in table.records:
+                walk(record, [name, tag, i], set())
+
+        self._reverse_index = index
+
+        if save:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            with open(CACHE_DIR / 'reverse_index.json', 'w') as f:
+                json.dump(
+                    {
+                        'signature': self._signature(),
+                        'pattern': REFERENCE_FINDER,
+                        'index': index,
+                    },
+                    f,
+                    separators=(',', ':'),
+                )
+
+        return index
+
+    def _load_reverse_index(self) -> Dict:
+        """Returns the reverse index from memory, the cache or a rebuild."""
+
+        if self._reverse_index is not None:
+            return self._reverse_index
+
+        try:
+            with open(CACHE_DIR / 'reverse_index.json') as f:
+                cached = json.load(f)
+            if (
+                cached['signature'] == self._signature() and
+                cached['pattern'] == REFERENCE_FINDER
+            ):
+                self._reverse_index = cached['index']
+                return self._reverse_index
+
+        except (OSError, ValueError, KeyError):
+            pass
+
+        return self.build_reverse_index()
+
+    def find_references(self, value: str, resolve: bool = False) -> List:
+        """Returns every record, in any table, that references value.
+
+        Parameters
+        ----------
+        value: str
+            The referenced value, e.g. 'T6_BAG'.
+        resolve: bool
+            If true, the records themselves are returned instead of
+            their addresses.
+
+        Returns
+        -------
+        list
+            List of [table, tag, index] addresses, or of records if resolve
+            is true.
+        """
+
+        addresses = self._load_reverse_index().get(value, [])
+        if not resolve:
+            return addresses
+
+        return [
+            self.get_table(table).get_record(tag, i)
+            for table, tag, i in addresses
+        ]
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+from contextlib import closing
+from pathlib import Path
+from typing import List
+
+from ao_bin_utils.ao_bin_item_id import ItemId
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR.parent
+INDEX_FILE = BASE_DIR / 'exports' / 'ao_bin.sqlite3'
+ITEM_FILE = DATA_DIR / 'items.json'
+
+NOT_FOUND = -1
+
+
+def build_index(index_file=INDEX_FILE) -> Path:
+    """Builds the SQLite export the lookups are read from.
+
+    Imports AoBinData and the exporter, so this is as slow as loading the
+    full data set.
+    """
+
+    from ao_bin_utils.ao_bin_data import AoBinData
+    from ao_bin_utils.ao_bin_export import export_sqlite
+
+    return export_sqlite(AoBinData(), index_file)
+
+
+def open_index(index_file=INDEX_FILE) -> sqlite3.Connection:
+    """Opens the SQLite export read-only, building it if it is missing or
+    older than items.json.
+    """
+
+    index_file = Path(index_file)
+    if not index_file.exists() or (
+        ITEM_FILE.exists()
+        and ITEM_FILE.stat().st_mtime > index_file.stat().st_mtime
+    ):
+        build_index(index_file)
+
+    return sqlite3.connect(index_file.as_uri() + '?mode=ro', uri=True)
+
+
+def get_item(con: sqlite3.Connection, item_name: str, unique: bool = True):
+    """Returns an item's JSON data as stored in the index.
+
+    Parameters
+    ----------
+    con: sqlite3 Connection
+        Connection from open_index.
+    item_name: str or ItemId
+        The item's unique name, the enchant level is ignored, or its EN-US
+        local name if unique is false.
+
+    Returns
+    -------
+    string
+        The item's compact JSON data. None if the item is not found.
+    """
+
+    if unique:
+        row = con.execute(
+            'SELECT data FROM items WHERE unique_name = ?',
+            (ItemId.parse(item_name).base_name,)
+        ).fetchone()
+    else:
+        row = con.execute(
+            'SELECT data FROM items WHERE local_name = ?', (item_name,)
+        ).fetchone()
+
+    return row[0] if row else None
+
+
+def get_item_power(
+        con: sqlite3.Connection,
+        item_unique_name: str,
+        quality: int,
+        mastery: int) -> float:
+    """Returns an item's Item Power, the same as
+    ao_bin_utilities.get_item_power.
+
+    Parameters
+    ----------
+    con: sqlite3 Connection
+        Connection from open_index.
+    item_unique_name: str or ItemId
+        Unique name of the item, with '@' and the enchant level if enchanted.
+    quality: int
+        Quality level of the item (1 = Normal, 2 = Good, etc).
+    mastery: int
+        Bonus from item mastery.
+
+    Returns
+    -------
+    float
+        The item's Item Power. NOT_FOUND if the item or its enchant level is
+        not found.
+    """
+
+    item_id = ItemId.parse(item_unique_name)
+    if not 1 < quality < 6:
+        quality = 1
+    row = con.execute(
+        'SELECT p.item_power, i.mastery_modifier '
+        'FROM item_powers p JOIN items i USING (unique_name) '
+        'WHERE p.unique_name = ? AND p.enchant = ? AND p.quality = ?',
+        (item_id.base_name, item_id.enchant, quality)
+    ).fetchone()
+
+    if row is None:
+        return NOT_FOUND
+
+    return row[0] + mastery*(1 + row[1])
+
+
+def _read_names(names: List) -> List:
+    """Returns the names passed in, or one per line of stdin if none."""
+
+    if names:
+        return names
+
+    return [x.strip() for x in sys.stdin if x.strip()]
+
+
+def _format_number(value: float) -> str:
+    return f'{value:g}'
+
+
+def cmd_item(args) -> int:
+    found = True
+    with closing(open_index(args.index)) as con:
+        for name in _read_names(args.names):
+            data = get_item(con, name, unique=not args.local)
+            found = found and data is not None
+            print(data if data is not None else 'null')
+
+    return 0 if found else 1
+
+
+def cmd_ip(args) -> int:
+    found = True
+    with closing(open_index(args.index)) as con:
+        for name in _read_names(args.names):
+            item_power = get_item_power(con, name, args.quality, args.mastery)
+            found = found and item_power != NOT_FOUND
+            print(f'{name}\t{_format_number(item_power)}')
+
+    return 0 if found else 1
+
+
+def cmd_price(args) -> int:
+    import ao_bin_utils.ao_bin_utilities as abu
+
+    names = _read_names(args.names)
+    prices = abu.get_item_price(
+        names, [args.quality]*len(names), args.location, args.max_age
+    )
+    for name, quality, price in prices:
+        print(f'{name}\t{quality}\t{price}')
+
+    return 0 if len(prices) == len(names) else 1
+
+
+def cmd_fixture(args) -> int:
+    from ao_bin_utils.ao_bin_data import AoBinData
+
+    return 0 if AoBinData().generate_fixture(args.output) else 1
+
+
+def cmd_index(args) -> int:
+    print(build_index(args.index))
+
+    return 0
+
+
+def cmd_validate(args) -> int:
+    from ao_bin_utils.ao_bin_validate import validate
+
+    res = validate(workers=args.workers, force=args.force)
+    for errors in res['errors'].values():
+        for error in errors:
+            print(error)
+    print(
+        f"{res['checked']} checked, {res['unchanged']} unchanged, "
+        f"{sum(len(x) for x in res['errors'].values())} errors",
+        file=sys.stderr
+    )
+
+    return 1 if res['errors'] else 0
+
+
+def cmd_search(args) -> int:
+    from ao_bin_utils.ao_bin_search import AoBinSearch
+
+    res = AoBinSearch().search(' '.join(args.words), args.limit)
+    for x in res:
+        print(f"{x['source']}\t{x['unique_name']}\t{x['local_name']}")
+
+    return 0 if res else 1
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='ao-bin', description='Albion Online item data lookups.'
+    )
+    parser.add_argument(
+        '--index', default=INDEX_FILE, help='location of the SQLite index'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    names_help = 'item names, read one per line from stdin if none are given'
+
+    item = commands.add_parser('item', help="print an item's JSON data")
+    item.add_argument('names', nargs='*', help=names_help)
+    item.add_argument(
+        '--local', action='store_true', help='names are EN-US local names'
+    )
+    item.set_defaults(func=cmd_item)
+
+    ip = commands.add_parser('ip', help="print an item's Item Power")
+    ip.add_argument('names', nargs='*', help=names_help)
+    ip.add_argument('--quality', type=int, default=1)
+    ip.add_argument('--mastery', type=int, default=0)
+    ip.set_defaults(func=cmd_ip)
+
+    price = commands.add_parser(
+        'price', help="print an item's cheapest sell price"
+    )
+    price.add_argument('names', nargs='*', help=names_help)
+    price.add_argument('--location', default='Lymhurst')
+    price.add_argument('--quality', type=int, default=1)
+    price.add_argument(
+        '--max-age', type=int, default=60, help='in minutes'
+    )
+    price.set_defaults(func=cmd_price)
+
+    fixture = commands.add_parser(
+        'fixture', help='generate the Django fixture file'
+    )
+    fixture.add_argument('--output', default=None)
+    fixture.set_defaults(func=cmd_fixture)
+
+    index = commands.add_parser('index', help='rebuild the SQLite index')
+    index.set_defaults(func=cmd_index)
+
+    validate = commands.add_parser(
+        'validate', help='check the consistency of the dump'
+    )
+    validate.add_argument('--workers', type=int, default=None)
+    validate.add_argument(
+        '--force', action='store_true', help='check unchanged files too'
+    )
+    validate.set_defaults(func=cmd_validate)
+
+    search = commands.add_parser(
+        'search', help='search unique names and localized names'
+    )
+    search.add_argument('words', nargs='+')
+    search.add_argument('--limit', type=int, default=20)
+    search.set_defaults(func=cmd_search)
+
+    return parser
+
+
+def main(argv: List = None) -> int:
+    """Command line entry point, e.g.
+
+        python -m ao_bin_utils item T4_BAG
+        python -m ao_bin_utils ip T5_OFF_SHIELD@1 --quality 2 --mastery 100
+        python -m ao_bin_utils price T4_BAG T5_BAG --location Lymhurst
+        python -m ao_bin_utils fixture
+        python -m ao_bin_utils validate
+        python -m ao_bin_utils search hellion hood
+
+    Item and Item Power lookups are read from the SQLite export, built from
+    AoBinData the first time it is needed and again when items.json
+    changes. Only the standard library is imported up front. requests,
+    pytz, NumPy and AoBinData are imported by the commands that use them.
+
+    Returns
+    -------
+    int
+        Exit status, 1 if an item or price wasn't found.
+    """
+
+    args = get_parser().parse_args(argv)
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
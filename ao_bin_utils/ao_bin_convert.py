@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+from xml.parsers import expat
+
+from ao_bin_utils.ao_bin_templates import file_hash
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR.parent
+MANIFEST_FILE = BASE_DIR / 'cache' / 'convert_manifest.json'
+
+INDENT = 2
+CHUNK_SIZE = 1 << 20
+DECLARATION_FINDER = rb"<\?xml([^?]*)\?>"
+ATTRIBUTE_FINDER = rb"""(\w+)\s*=\s*["']([^"']*)["']"""
+
+
+def parse_declaration(data: bytes) -> Dict:
+    """Returns the attributes of the XML declaration as '@' keys.
+
+    The dump's JSON files start with a '?xml' key holding the declaration,
+    e.g. {'@version': '1.0', '@encoding': 'utf-8'}. None if the file has
+    no declaration.
+    """
+
+    match = re.search(DECLARATION_FINDER, data[:200])
+    if match is None:
+        return None
+
+    return {
+        f"@{k.decode()}": v.decode()
+        for k, v in re.findall(ATTRIBUTE_FINDER, match.group(1))
+    }
+
+
+class _Builder():
+    """Expat handlers building the dump's JSON representation of a document.
+
+    The dump follows Json.NET's XML conversion: attributes become '@'
+    keys and child nodes are keyed by name in order of first appearance,
+    repeated names becoming a list. Text and CDATA nodes are kept as
+    written under '#text' and '#cdata-section', whitespace-only text and
+    comments are dropped. An element whose only content is a single text
+    node is that text, an element without content is None if self-closing
+    and '' otherwise. Names are kept as written, namespace prefixes and
+    'xmlns' attributes included.
+
+    If on_child is given, each complete child of the root is passed to it
+    as (tag, value) instead of being added to the root.
+    """
+
+    def __init__(self, on_child=None):
+        self.on_child = on_child
+        self.stack = []
+        self.root = None
+        self.data = b''
+        self.text = []
+        self.in_cdata = False
+
+        self.parser = expat.ParserCreate()
+        self.parser.ordered_attributes = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.text.append
+        self.parser.CommentHandler = lambda _: self.flush()
+        self.parser.StartCdataSectionHandler = self.start_cdata
+        self.parser.EndCdataSectionHandler = self.end_cdata
+
+    @staticmethod
+    def add(node, name, value):
+        if name in node:
+            if not isinstance(node[name], list):
+                node[name] = [node[name]]
+            node[name].append(value)
+        else:
+            node[name] = value
+
+    def flush(self):
+        """Adds the pending character data as a node of the open element."""
+
+        text = ''.join(self.text)
+        self.text.clear()
+        if self.in_cdata:
+            self.add(self.stack[-1][1], '#cdata-section', text)
+            self.stack[-1][2].append(text)
+        elif text.strip() and self.stack:
+            self.add(self.stack[-1][1], '#text', text)
+            self.stack[-1][2].append(text)
+
+    def start_cdata(self):
+        self.flush()
+        self.in_cdata = True
+
+    def end_cdata(self):
+        self.flush()
+        self.in_cdata = False
+
+    def start(self, name, attributes):
+        self.flush()
+        self.stack.append((name, {
+            f'@{attributes[i]}': attributes[i + 1]
+            for i in range(0, len(attributes), 2)
+        }, []))
+
+    def end(self, name):
+        self.flush()
+        _, res, texts = self.stack.pop()
+        if not res:
+            # Expat reports the position of the end tag, or of what comes
+            # after a self-closing tag
+            i = self.parser.CurrentByteIndex
+            value = '' if self.data[i:i + 2] == b'</' else None
+        elif len(res) == 1 and len(texts) == 1 and texts[0] is not None:
+            value = texts[0]
+        else:
+            value = res
+
+        if not self.stack:
+            self.root = (name, value)
+        elif len(self.stack) == 1 and self.on_child is not None:
+            self.on_child(name, value)
+        else:
+            self.add(self.stack[-1][1], name, value)
+            self.stack[-1][2].append(None)
+
+    def feed(self, data: bytes):
+        self.data = data
+        for i in range(0, len(data), CHUNK_SIZE):
+            self.parser.Parse(data[i:i + CHUNK_SIZE], False)
+        self.parser.Parse(b'', True)
+
+        return self.root
+
+
+def parse(data: bytes) -> Dict:
+    """Returns the xmltodict style representation of an XML document.
+
+    Parameters
+    ----------
+    data: bytes
+        Content of the XML file.
+
+    Returns
+    -------
+    dictionary
+        The '?xml' declaration, if any, followed by the root element.
+    """
+
+    res = {}
+    declaration = parse_declaration(data)
+    if declaration is not None:
+        res['?xml'] = declaration
+
+    tag, value = _Builder().feed(data)
+    res[tag] = value
+
+    return res
+
+
+def _dumps(value, level: int) -> str:
+    """Serializes value as it would appear nested level deep in the file."""
+
+    return json.dumps(value, indent=INDENT).replace(
+        '\n', '\n' + ' '*INDENT*level
+    )
+
+
+def _key(key: str) -> str:
+    return json.dumps(key)
+
+
+def write_json(data: bytes, out) -> None:
+    """Streams the JSON representation of an XML document to out.
+
+    The output is identical to json.dumps(parse(data), indent=2), but
+    only one child of the root element is held in memory at a time.
+    Children are written to a spool file per tag, so that repeated tags
+    which aren't next to each other still end up in one list, and the
+    spool files are joined in order of first appearance.
+
+    Parameters
+    ----------
+    data: bytes
+        Content of the XML file.
+    out: text file
+        File the JSON is written to.
+    """
+
+    pad = ' '*INDENT
+    spools = {}
+    counts = {}
+
+    def on_child(tag, value):
+        if tag not in spools:
+            spools[tag] = tempfile.TemporaryFile('w+', encoding='utf8')
+            counts[tag] = 0
+        elif counts[tag] > 0:
+            spools[tag].write(',\n')
+        spools[tag].write(pad*3 + _dumps(value, 3))
+        counts[tag] += 1
+
+    declaration = parse_declaration(data)
+    root_tag, root = _Builder(on_child).feed(data)
+
+    out.write('{')
+    if declaration is not None:
+        out.write('\n' + pad + _key('?xml') + ': ' + _dumps(declaration, 1))
+        out.write(',')
+    out.write('\n' + pad + _key(root_tag) + ': ')
+
+    if not spools:
+        out.write(_dumps(root, 1))
+        out.write('\n}')
+        return
+
+    # The root's own attributes come first and its text last
+    root = root or {}
+    text = root.pop('#text', None)
+    members = [_key(k) + ': ' + _dumps(v, 2) for k, v in root.items()]
+
+    out.write('{')
+    for i, member in enumerate(members):
+        out.write(('\n' if i == 0 else ',\n') + pad*2 + member)
+    for i, (tag, spool) in enumerate(spools.items()):
+        sep = '\n' if i == 0 and not members else ',\n'
+        out.write(sep + pad*2 + _key(tag) + ': ')
+        spool.seek(0)
+        if counts[tag] > 1:
+            out.write('[\n')
+            while True:
+                chunk = spool.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+            out.write('\n' + pad*2 + ']')
+        else:
+            out.write(spool.read()[INDENT*3:].replace('\n' + pad, '\n'))
+        spool.close()
+    if text is not None:
+        out.write(',\n' + pad*2 + _key('#text') + ': ' + json.dumps(text))
+    out.write('\n' + pad + '}\n}')
+
+
+def convert_file(xml_file, json_file=None) -> Path:
+    """Converts one XML file to its sibling JSON file.
+
+    The JSON is written to a temporary file first and then moved in
+    place, so readers never see a partial file.
+
+    Parameters
+    ----------
+    xml_file: str or Path
+        Location of the XML file.
+    json_file: str or Path
+        Location of the JSON file. (default: xml_file with '.json')
+
+    Returns
+    -------
+    Path
+        Location of the written JSON file.
+    """
+
+    xml_file = Path(xml_file)
+    json_file = Path(json_file or xml_file.with_suffix('.json'))
+
+    data = xml_file.read_bytes()
+    fd, tmp_file = tempfile.mkstemp(
+        dir=json_file.parent, prefix=json_file.name, suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'w', encoding='utf8', newline='\n') as f:
+            write_json(data, f)
+        os.replace(tmp_file, json_file)
+    except BaseException:
+        os.unlink(tmp_file)
+        raise
+
+    return json_file
+
+
+def _convert_job(args) -> tuple:
+    """Process pool worker, converts a file and returns its hash."""
+
+    xml_file, xml_hash = args
+    convert_file(xml_file)
+    return xml_file, xml_hash
+
+
+def find_pairs(data_dir=DATA_DIR) -> List:
+    """Returns the XML files of the dump that have a JSON sibling."""
+
+    return [
+        fp for fp in sorted(Path(data_dir).glob('*.xml'))
+        if fp.with_suffix('.json').exists()
+    ]
+
+
+def convert_all(
+        data_dir=DATA_DIR,
+        manifest_file=MANIFEST_FILE,
+        workers: int = None,
+        force: bool = False) -> Dict:
+    """Regenerates the JSON of every XML file whose content changed.
+
+    The manifest stores the content hash of each XML file at its last
+    conversion. Unchanged files are skipped and the rest are converted
+    across a process pool.
+
+    Parameters
+    ----------
+    data_dir: str or Path
+        Folder containing the XML/JSON pairs.
+    manifest_file: str or Path
+        Location of the manifest.
+    workers: int
+        Number of worker processes. (default: one per CPU)
+    force: bool
+        If true, every file is converted.
+
+    Returns
+    -------
+    dictionary
+        'converted' and 'unchanged' lists of XML file names.
+    """
+
+    manifest_file = Path(manifest_file)
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    jobs = []
+    res = {'converted': [], 'unchanged': []}
+    for xml_file in find_pairs(data_dir):
+        xml_hash = file_hash(xml_file.read_bytes())
+        if not force and manifest.get(xml_file.name) == xml_hash:
+            res['unchanged'].append(xml_file.name)
+        else:
+            jobs.append((str(xml_file), xml_hash))
+
+    if jobs:
+        with ProcessPoolExecutor(workers) as executor:
+            for xml_file, xml_hash in executor.map(_convert_job, jobs):
+                manifest[Path(xml_file).name] = xml_hash
+                res['converted'].append(Path(xml_file).name)
+
+        manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest, f, indent=INDENT, sort_keys=True)
+
+    return res
+
+
+def benchmark(data_dir=DATA_DIR, workers: int = None) -> Dict:
+    """Times a full reconversion against the incremental pipeline.
+
+    The full reconversion parses each file into memory and dumps it in one
+    go, one file after another, the way the dump has been regenerated so
+    far. Output is written to a temporary folder, the dump isn't touched.
+
+    Returns
+    -------
+    dictionary
+        Seconds taken by 'full', 'pipeline_cold' (every file converted
+        across the pool) and 'pipeline_warm' (nothing changed).
+    """
+
+    pairs = find_pairs(data_dir)
+    res = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        for fp in pairs:
+            (tmp_dir / fp.name).write_bytes(fp.read_bytes())
+            (tmp_dir / fp.with_suffix('.json').name).touch()
+
+        start = time.perf_counter()
+        for fp in pairs:
+            doc = parse(fp.read_bytes())
+            with open(tmp_dir / fp.with_suffix('.json').name, 'w') as f:
+                f.write(json.dumps(doc, indent=INDENT))
+        res['full'] = time.perf_counter() - start
+
+        manifest_file = tmp_dir / 'manifest.json'
+        for key in ['pipeline_cold', 'pipeline_warm']:
+            start = time.perf_counter()
+            convert_all(tmp_dir, manifest_file, workers)
+            res[key] = time.perf_counter() - start
+
+    return res
+
+
+if __name__ == "__main__":
+    print(convert_all())
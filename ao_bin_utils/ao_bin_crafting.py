@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, List
+
+import ao_bin_utils.ao_bin_utilities as abu
+from ao_bin_utils.ao_bin_catalog import AoBinCatalog, as_list
+from ao_bin_utils.ao_bin_data import AoBinData
+
+RECIPE_TABLES = ['buildings']
+
+
+def parse_recipes(requirements) -> List:
+    """Compiles an item's 'craftingrequirements' into recipes.
+
+    An item can have several 'craftingrequirements', each one is an
+    alternative way to craft it.
+
+    Parameters
+    ----------
+    requirements: dictionary or list
+        The item's 'craftingrequirements' JSON data.
+
+    Returns
+    -------
+    list
+        List of (silver, amount_crafted, resources) tuples where resources
+        is a tuple of (unique_name, count) pairs.
+    """
+
+    res = []
+    for requirement in as_list(requirements):
+        resources = []
+        for resource in as_list(requirement.get('craftresource')):
+            enchant = int(resource.get('@enchantmentlevel', 0))
+            resources.append((
+                resource['@uniquename']
+                + (f'@{enchant}' if enchant > 0 else ''),
+                int(resource.get('@count', 1)),
+            ))
+
+        res.append((
+            int(requirement.get('@silver', 0)),
+            int(requirement.get('@amountcrafted', 1)),
+            tuple(resources),
+        ))
+
+    return res
+
+
+class AoBinCrafting():
+    """Craft cost of items and buildings from their crafting requirements.
+
+    Recipes are read from the items in AoBinData, including each enchant
+    level, and from the tables in RECIPE_TABLES. Together they form a DAG
+    where each item points to the materials it is crafted from. Materials
+    without a recipe are leaves and are priced at the market.
+
+    ...
+
+    Attributes
+    ----------
+    _recipes: dictionary
+        Unique name to list of (silver, amount_crafted, resources) recipes.
+    _leaves: dictionary
+        Memoized unique name to the set of leaf materials below it.
+
+    Methods
+    -------
+    get_recipes(item_name):
+        Returns the recipes of an item.
+    get_leaves(item_names):
+        Returns every leaf material needed to craft the items.
+    get_craft_costs(item_names, prices):
+        Returns the cheapest craft cost of each item.
+    craft_vs_buy(item_names, location, max_age):
+        Compares the craft and buy cost of items at a market.
+    craft_vs_buy_item(unique_item_name, min_tier, location, max_age):
+        Compares every tier/enchant version of an item.
+    """
+
+    def __init__(self, ao_data: AoBinData, catalog: AoBinCatalog = None):
+        """Constructor compiles every known recipe.
+
+        Parameters
+        ----------
+        ao_data: AoBinData object
+            Pointer to the AoBinData object containing item information.
+        catalog: AoBinCatalog object
+            Catalog the RECIPE_TABLES are read from. (default: AoBinCatalog())
+        """
+
+        catalog = catalog or AoBinCatalog()
+
+        self._recipes = {}
+        for _, item in ao_data.get_items():
+            self._add_item(item)
+
+        for table in RECIPE_TABLES:
+            for _, _, record in catalog.get_table(table).records:
+                if '@uniquename' in record:
+                    self._add_item(record)
+
+        self._leaves = {}
+
+    def _add_item(self, item: Dict) -> None:
+        """Adds the recipes of an item and of its enchant levels."""
+
+        base_name = item['@uniquename']
+        if 'craftingrequirements' in item:
+            self._recipes[base_name] = parse_recipes(
+                item['craftingrequirements']
+            )
+
+        enchantments = item.get('enchantments', {}).get('enchantment', [])
+        for enchantment in as_list(enchantments):
+            enchant = int(enchantment['@enchantmentlevel'])
+            if enchant > 0 and 'craftingrequirements' in enchantment:
+                self._recipes[f'{base_name}@{enchant}'] = parse_recipes(
+                    enchantment['craftingrequirements']
+                )
+
+    def get_recipes(self, item_name: str) -> List:
+        """Returns the recipes of an item, or an empty list if it has none.
+
+        Parameters
+        ----------
+        item_name: str
+            The item's unique name with enchant level.
+
+        Returns
+        -------
+        list
+            List of (silver, amount_crafted, resources) tuples.
+        """
+
+        return self._recipes.get(item_name, [])
+
+    def _get_leaves(self, item_name: str, visiting: List) -> frozenset:
+        """Returns the memoized set of leaf materials below item_name."""
+
+        if item_name in self._leaves:
+            return self._leaves[item_name]
+
+        if item_name in visiting:
+            cycle = visiting[visiting.index(item_name):] + [item_name]
+            raise ValueError(f"Recipe cycle: {' -> '.join(cycle)}")
+
+        recipes = self.get_recipes(item_name)
+        if not recipes:
+            res = frozenset([item_name])
+        else:
+            visiting.append(item_name)
+            res = frozenset().union(*(
+                self._get_leaves(resource, visiting)
+                for _, _, resources in recipes
+                for resource, _ in resources
+            ))
+            visiting.pop()
+
+        self._leaves[item_name] = res
+        return res
+
+    def get_leaves(self, item_names: List) -> List:
+        """Returns every leaf material needed to craft the items.
+
+        Parameters
+        ----------
+        item_names: list of str
+            Unique names of the items, with enchant level.
+
+        Returns
+        -------
+        list
+            Sorted unique names of the materials that have no recipe.
+            Raises ValueError if the recipes contain a cycle.
+        """
+
+        res = set()
+        for item_name in item_names:
+            res |= self._get_leaves(item_name, [])
+
+        return sorted(res)
+
+    def get_craft_costs(self, item_names: List, prices: Dict) -> Dict:
+        """Returns the cheapest craft cost of each item.
+
+        Every intermediate material is either bought or crafted, whichever
+        is cheaper. The cost of each material is computed once per call and
+        shared by every item that uses it.
+
+        Parameters
+        ----------
+        item_names: list of str
+            Unique names of the items, with enchant level.
+        prices: dictionary
+            Unique name to market price. Missing materials can't be bought.
+
+        Returns
+        -------
+        dictionary
+            Unique name to craft cost. The cost is math.inf if the item
+            has no recipe or a material can't be bought or crafted.
+        """
+
+        # Fails early on cycles, the costs below assume a DAG
+        self.get_leaves(item_names)
+
+        memo = {}
+
+        def cost(item_name):
+            if item_name in memo:
+                return memo[item_name]
+
+            craft_cost = math.inf
+            for silver, amount, resources in self.get_recipes(item_name):
+                recipe_cost = silver + sum(
+                    count*min(
+                        cost(resource), prices.get(resource, math.inf)
+                    )
+                    for resource, count in resources
+                )
+                craft_cost = min(craft_cost, recipe_cost/amount)
+
+            memo[item_name] = craft_cost
+            return craft_cost
+
+        return {item_name: cost(item_name) for item_name in item_names}
+
+    def craft_vs_buy(
+            self,
+            item_names: List,
+            location: str,
+            max_age: int) -> Dict:
+        """Compares the craft and buy cost of items at a market.
+
+        The items and every leaf material are priced with a single call to
+        get_item_price, at Normal quality.
+
+        Parameters
+        ----------
+        item_names: list of str
+            Unique names of the items, with enchant level.
+        location: str
+            Name of the market whose price should be used.
+        max_age: int
+            Max age of a price in minutes that is acceptable.
+
+        Returns
+        -------
+        dictionary
+            'item_names': List of item unique names.
+            'craft_costs': List of craft costs, math.inf if not craftable.
+            'buy_costs': List of market prices, math.inf if not found.
+        """
+
+        to_price = abu.remove_dupes(
+            list(item_names) + self.get_leaves(item_names)
+        )
+        price_data = abu.get_item_price(
+            to_price, [1]*len(to_price), location, max_age
+        )
+        prices = {x[0]: x[2] for x in price_data}
+
+        craft_costs = self.get_craft_costs(item_names, prices)
+
+        return {
+            'item_names': list(item_names),
+            'craft_costs': [craft_costs[x] for x in item_names],
+            'buy_costs': [prices.get(x, math.inf) for x in item_names],
+        }
+
+    def craft_vs_buy_item(
+            self,
+            unique_item_name: str,
+            min_tier: int,
+            location: str,
+            max_age: int) -> Dict:
+        """Compares every tier/enchant version of an item.
+
+        The versions are named the same way as get_items_above_ip, only the
+        ones with a recipe are included.
+
+        Parameters
+        ----------
+        unique_item_name: str
+            The unique item name of the item type. Only the base item matters.
+        min_tier: int
+            The tier to start at.
+        location: str
+            Name of the market whose price should be used.
+        max_age: int
+            Max age of a price in minutes that is acceptable.
+
+        Returns
+        -------
+        dictionary
+            Same as craft_vs_buy.
+        """
+
+        item_names = [
+            x for x in abu.get_item_variants(unique_item_name, min_tier)
+            if self.get_recipes(x)
+        ]
+
+        return self.craft_vs_buy(item_names, location, max_age)
@@ -1,9 +1,15 @@
 import json
+import logging
 import os  # For relative paths
 from threading import Lock  # For Singleton
-import re
 
-TIER_FINDER = r"T\d_"
+from ao_bin_utils.ao_bin_item_id import ItemId
+from ao_bin_utils.ao_bin_localization import (
+    DEFAULT_LANG, AoBinLocalization, load_names,
+)
+from ao_bin_utils.ao_bin_metrics import timed
+
+logger = logging.getLogger(__name__)
 
 
 class SingletonMeta(type):
@@ -25,6 +31,8 @@ class SingletonMeta(type):
         This is called whenever an object is created. It will create
         an instance of the class if it isn't found, otherwise it returns
         the previously created instance. This is thread-safe.
+    replace_instance(cls, instance):
+        Makes instance the class' singleton instance from now on.
     """
 
     _instances = {}
@@ -46,6 +54,15 @@ class SingletonMeta(type):
 
         return cls._instances[cls]
 
+    def replace_instance(cls, instance):
+        """Makes instance the class' singleton instance from now on.
+
+        Code holding the previous instance keeps using it.
+        """
+
+        with cls._lock:
+            cls._instances[cls] = instance
+
 
 class AoBinData(metaclass=SingletonMeta):
     """Represents the AO Data from the game's extracted binaries.
@@ -58,10 +75,18 @@ class AoBinData(metaclass=SingletonMeta):
     ----------
     _item_name: dictionary
         Dictionary of "readable" item names and it's JSON data.
+    _local_name: dictionary
+        Dictionary of unique item names and their "readable" name.
+    _localization: AoBinLocalization object
+        Local names in every language, loaded on first use.
     _game: list
         List of dictionaries as read from the game JSON data file.
     TIER_IDENTIFIERS: list
         List of adjectives used to denote item tiers in local names.
+    data_files: list
+        Locations of the item, name and game data files that were read.
+    version: int
+        Incremented by AoBinDataReloader each time the data is reloaded.
 
     Methods
     -------
@@ -69,17 +94,21 @@ class AoBinData(metaclass=SingletonMeta):
         Constructor sets location of relevant data files.
     _map_item_names(self, items, names)
         Builds the _item_name dictionary.
-    get_item(item_name, unique)
+    get_item(item_name, unique, lang)
         Returns item information given the item's name.
+    get_items(self):
+        Returns (local name, item data) pairs for every mapped item.
     get_quality_table(self):
         Returns the JSON dictionary portion containing the quality
         information for items.
-    get_unique_name(self, item_name, enchant=0):
+    get_unique_name(self, item_name, enchant=0, lang='EN-US'):
         Get an item's unque name from it's local name.
-    generate_fixture(self):
+    generate_fixture(self, output_file=None):
         Generates a Django fixture file ready for import.
     """
 
+    version = 0
+
     def __init__(
         self,
         item_file=os.path.join('..', 'items.json'),
@@ -97,6 +126,8 @@ class AoBinData(metaclass=SingletonMeta):
             Location of JSON file containing item data.
         name_file: str
             Location of JSON file containing localization data for items.
+            A formatted items.txt file is read instead if name_file ends in
+            '.txt' or doesn't exist.
         game_file: str
             Location of JSON file containing game data.
         """
@@ -116,16 +147,19 @@ class AoBinData(metaclass=SingletonMeta):
             items.extend(temp_items['items']['transformationweapon'])
             assert len(items) > 0, "Failed to load items"
 
-        with open(fp_names, encoding='utf8') as json_file:
-            names = json.load(json_file)
-            names = [x for x in names if x['LocalizedNames'] is not None]
-            assert len(names) > 0, "Failed to load item names"
+        if not os.path.exists(fp_names):
+            fp_names = os.path.splitext(fp_names)[0] + '.txt'
+        names = load_names(fp_names)
+        names = [x for x in names if x['LocalizedNames'] is not None]
+        assert len(names) > 0, "Failed to load item names"
+        self._localization = AoBinLocalization(fp_names, names)
 
         with open(fp_game, encoding='utf8') as json_file:
             game = json.load(json_file)
             self._game = game['AO-GameData']
 
         self._map_item_names(items, names)
+        self.data_files = [fp_items, fp_names, fp_game]
 
         self.TIER_IDENTIFIERS = [
             "Beginner's",
@@ -153,18 +187,25 @@ class AoBinData(metaclass=SingletonMeta):
             AO Binary Data repo.
         """
 
+        local_names = {}
+        for x in names:
+            local_names.setdefault(x['UniqueName'], []).append(
+                x['LocalizedNames']['EN-US']
+            )
+
         res = {}
         for item in items:
-            item_name = [
-                x['LocalizedNames']['EN-US']
-                for x in names if x['UniqueName'] == item['@uniquename']
-            ]
+            item_name = local_names.get(item['@uniquename'], [])
             if len(item_name) == 1:
                 res[item_name[0]] = item
 
         self._item_name = res
+        self._local_name = {}
+        for k, v in res.items():
+            self._local_name.setdefault(v['@uniquename'], k)
 
-    def get_item(self, item_name, unique=True) -> dict:
+    @timed('ao_bin_lookup_seconds', method='get_item')
+    def get_item(self, item_name, unique=True, lang=DEFAULT_LANG) -> dict:
         """Returns item information given the item's name.
 
         Parameters
@@ -174,6 +215,8 @@ class AoBinData(metaclass=SingletonMeta):
         unique: bool
             If true, then item_name is the item's unque name,
             otherwise, it is the item's localized name.
+        lang: str
+            Language of the localized name. (default: 'EN-US')
 
         Returns
         -------
@@ -184,6 +227,10 @@ class AoBinData(metaclass=SingletonMeta):
 
         if unique:
             item_name = (self.get_local_name(item_name) or item_name)
+        elif lang != DEFAULT_LANG:
+            item_name = self.get_local_name(
+                self._localization.get_unique_name(item_name, lang) or ''
+            )
 
         try:
             return self._item_name[item_name]
@@ -191,6 +238,17 @@ class AoBinData(metaclass=SingletonMeta):
         except KeyError:
             return None
 
+    def get_items(self):
+        """Returns (local name, item data) pairs for every mapped item.
+
+        Returns
+        -------
+        list
+            List of tuples of the item's local name and it's JSON data.
+        """
+
+        return list(self._item_name.items())
+
     def get_quality_table(self):
         """Returns the JSON dictionary portion containing the quality
         information for items.
@@ -226,7 +284,8 @@ class AoBinData(metaclass=SingletonMeta):
         }
         return quality_names[quality]
 
-    def get_unique_name(self, item_name, enchant=0):
+    @timed('ao_bin_lookup_seconds', method='get_unique_name')
+    def get_unique_name(self, item_name, enchant=0, lang=DEFAULT_LANG):
         """Get an item's unque name from it's local name.
 
         Parameters
@@ -235,6 +294,9 @@ class AoBinData(metaclass=SingletonMeta):
             The item's local name.
         enchant: int
             The item's enchant level to add to the unique name. (default: 0)
+        lang: str
+            Language of the local name. Only 'EN-US' names may leave out
+            the tier. (default: 'EN-US')
 
         Returns
         -------
@@ -243,6 +305,12 @@ class AoBinData(metaclass=SingletonMeta):
             appended after '@'. If the item is not found, None is returned.
         """
 
+        if lang != DEFAULT_LANG:
+            item_name = self.get_local_name(
+                self._localization.get_unique_name(item_name, lang) or ''
+            )
+
+        item_data = None
         if item_name in self._item_name.keys():
             item_data = self._item_name[item_name]
         else:
@@ -260,32 +328,35 @@ class AoBinData(metaclass=SingletonMeta):
             + (f'@{enchant}' if enchant > 0 and enchant < 6 else "")
         )
 
-    def get_local_name(self, item_name):
+    @timed('ao_bin_lookup_seconds', method='get_local_name')
+    def get_local_name(self, item_name, lang=DEFAULT_LANG):
         """Get an item's local name from it's unique name.
 
         Parameters
         ----------
-        item_name: str
+        item_name: str or ItemId
             The item's unique name.
+        lang: str
+            Language of the local name, loaded on first use.
+            (default: 'EN-US')
 
         Returns
         -------
         string
             The item's local name. Returns None if none are found.
         """
-        item_name = item_name.split('@')[0]
-        for k, v in self._item_name.items():
-            if v['@uniquename'] == item_name:
-                return k
+        item_name = ItemId.parse(item_name).base_name
+        if lang == DEFAULT_LANG or item_name not in self._local_name:
+            return self._local_name.get(item_name)
 
-        return None
+        return self._localization.get_local_name(item_name, lang)
 
     def get_item_tier(self, item):
         """Returns a string with the item's tier and enchant level as a string.
 
         Parameters
         ----------
-        item: str
+        item: str or ItemId
             The item's unique name w/ enchant level.
 
         Returns
@@ -296,20 +367,25 @@ class AoBinData(metaclass=SingletonMeta):
             {tier}.{enchant_lvl} e.g. 4.2
         """
 
-        tier = re.compile(TIER_FINDER).search(item)[0][1]
-        enchant_lvl = item.split('@')[-1] if '@' in item else 0
+        item_id = ItemId.parse(item)
         return (
-            f"{tier}" +
-            (f".{enchant_lvl}" if enchant_lvl != 0 else '')
+            f"{item_id.tier}" +
+            (f".{item_id.enchant}" if item_id.enchant != 0 else '')
         )
 
-    def generate_fixture(self):
+    def generate_fixture(self, output_file=None):
         """Generates a Django fixture file ready for import.
 
         This file is formated to work with a specific Django app. The file
         generated will be in a "fixture" folder that can be software linked to
         the app using it.
 
+        Parameters
+        ----------
+        output_file: str
+            Location of the fixture file.
+            (default: fixtures/ao_bin_fixture.json)
+
         Returns
         -------
         boolean
@@ -317,8 +393,7 @@ class AoBinData(metaclass=SingletonMeta):
         """
 
         try:
-            import os
-            output_file = os.sep.join([
+            output_file = output_file or os.sep.join([
                 os.path.dirname(__file__), 'fixtures', 'ao_bin_fixture.json'
             ])
             with open(output_file, 'w') as f:
@@ -364,8 +439,8 @@ class AoBinData(metaclass=SingletonMeta):
 
             return True
 
-        except Exception as e:
-            print(e)
+        except Exception:
+            logger.exception("Failed to generate the fixture")
             raise
 
         return False
@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from ao_bin_utils.ao_bin_data import AoBinData
+
+BASE_DIR = Path(__file__).resolve().parent
+EXPORT_DIR = BASE_DIR / 'exports'
+BATCH_SIZE = 5000
+SEPARATORS = (',', ':')
+
+ITEM_COLUMNS = [
+    'unique_name',
+    'local_name',
+    'tier',
+    'shop_category',
+    'shop_subcategory',
+    'item_power',
+    'mastery_modifier',
+]
+
+
+def get_enchant_item_powers(item: Dict) -> Dict:
+    """Returns the base Item Power of each enchant level of an item.
+
+    Parameters
+    ----------
+    item: dictionary
+        The item's JSON data.
+
+    Returns
+    -------
+    dictionary
+        Integer enchant level to Item Power. 0 is the unenchanted item.
+    """
+
+    enchantments = item.get('enchantments', {}).get('enchantment', [])
+    if isinstance(enchantments, dict):
+        enchantments = [enchantments]
+
+    res = {0: int(item.get('@itempower', 0))}
+    for enchantment in enchantments:
+        enchant = int(enchantment['@enchantmentlevel'])
+        if enchant > 0 and '@itempower' in enchantment:
+            res[enchant] = int(enchantment['@itempower'])
+
+    return res
+
+
+def build_item_rows(ao_data: AoBinData) -> List:
+    """Flattens the item catalog into rows matching ITEM_COLUMNS.
+
+    Parameters
+    ----------
+    ao_data: AoBinData object
+        Pointer to the AoBinData object containing item information.
+
+    Returns
+    -------
+    list
+        List of (unique_name, local_name, tier, shop_category,
+        shop_subcategory, item_power, mastery_modifier, data) tuples where
+        data is the item's JSON data.
+    """
+
+    rows = []
+    for local_name, item in ao_data.get_items():
+        rows.append((
+            item['@uniquename'],
+            local_name,
+            int(item.get('@tier', 0)),
+            item.get('@shopcategory'),
+            item.get('@shopsubcategory1'),
+            int(item.get('@itempower', 0)),
+            float(item.get('@masterymodifier', 0)),
+            item,
+        ))
+
+    return rows
+
+
+def build_quality_rows(ao_data: AoBinData) -> List:
+    """Returns the quality table as (level, item_power_bonus) rows.
+
+    Quality 1 (Normal) is not in the game data and is added with a bonus
+    of 0.
+    """
+
+    rows = [(1, 0)]
+    for quality_level in ao_data.get_quality_table():
+        rows.append((
+            int(quality_level['@level']),
+            int(quality_level['@itempowerbonus']),
+        ))
+
+    return rows
+
+
+def build_item_power_rows(ao_data: AoBinData, quality_rows=None) -> List:
+    """Derives the Item Power of every item/enchant/quality combination.
+
+    This is the same Item Power as get_item_power but read straight from
+    each item's data, so it doesn't look every item up by name again.
+    Mastery is not included, it can be applied afterwards with the item's
+    mastery modifier.
+
+    Parameters
+    ----------
+    ao_data: AoBinData object
+        Pointer to the AoBinData object containing item information.
+    quality_rows: list
+        Rows from build_quality_rows, built if not passed in.
+
+    Returns
+    -------
+    list
+        List of (unique_name, enchant, quality, item_power) tuples.
+    """
+
+    quality_bonus = dict(quality_rows or build_quality_rows(ao_data))
+
+    rows = []
+    for _, item in ao_data.get_items():
+        base_name = item['@uniquename']
+        enchant_item_powers = get_enchant_item_powers(item)
+        for enchant in sorted(enchant_item_powers):
+            item_power = enchant_item_powers[enchant]
+            for quality in range(1, 6):
+                rows.append((
+                    base_name,
+                    enchant,
+                    quality,
+                    item_power + quality_bonus.get(quality, 0),
+                ))
+
+    return rows
+
+
+def build_rows(ao_data: AoBinData) -> Dict:
+    """Builds the rows of every exported table once.
+
+    Returns
+    -------
+    dictionary
+        'items', 'quality_levels' and 'item_powers' mapped to their rows.
+    """
+
+    quality_rows = build_quality_rows(ao_data)
+
+    return {
+        'items': build_item_rows(ao_data),
+        'quality_levels': quality_rows,
+        'item_powers': build_item_power_rows(ao_data, quality_rows),
+    }
+
+
+def _batches(rows: List, size: int = BATCH_SIZE):
+    """Yields successive slices of rows of at most size length."""
+
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def export_sqlite(ao_data: AoBinData, output_file=None, rows=None) -> Path:
+    """Writes the catalog, quality table and Item Power table to SQLite.
+
+    The database is rebuilt from scratch. Rows are inserted in batches
+    inside a single transaction and indexes are created after the load,
+    which is much faster than indexing while inserting.
+
+    Parameters
+    ----------
+    ao_data: AoBinData object
+        Pointer to the AoBinData object containing item information.
+    output_file: str or Path
+        Location of the database. (default: exports/ao_bin.sqlite3)
+    rows: dictionary
+        Rows from build_rows, built if not passed in.
+
+    Returns
+    -------
+    Path
+        Location of the written database.
+    """
+
+    output_file = Path(output_file or EXPORT_DIR / 'ao_bin.sqlite3')
+    rows = rows or build_rows(ao_data)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    if output_file.exists():
+        output_file.unlink()
+
+    con = sqlite3.connect(output_file)
+    try:
+        con.execute('PRAGMA journal_mode = OFF')
+        con.execute('PRAGMA synchronous = OFF')
+        with con:
+            con.execute(
+                'CREATE TABLE items ('
+                'unique_name TEXT PRIMARY KEY, local_name TEXT, tier INTEGER, '
+                'shop_category TEXT, shop_subcategory TEXT, '
+                'item_power INTEGER, mastery_modifier REAL, data TEXT)'
+            )
+            con.execute(
+                'CREATE TABLE quality_levels ('
+                'level INTEGER PRIMARY KEY, item_power_bonus INTEGER)'
+            )
+            con.execute(
+                'CREATE TABLE item_powers ('
+                'unique_name TEXT, enchant INTEGER, quality INTEGER, '
+                'item_power REAL, '
+                'PRIMARY KEY (unique_name, enchant, quality)) WITHOUT ROWID'
+            )
+
+            for batch in _batches(rows['items']):
+                batch = [
+                    row[:-1] + (json.dumps(row[-1], separators=SEPARATORS),)
+                    for row in batch
+                ]
+                con.executemany(
+                    'INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch
+                )
+            con.executemany(
+                'INSERT INTO quality_levels VALUES (?, ?)',
+                rows['quality_levels']
+            )
+            for batch in _batches(rows['item_powers']):
+                con.executemany(
+                    'INSERT INTO item_powers VALUES (?, ?, ?, ?)', batch
+                )
+
+            con.execute('CREATE INDEX ix_items_local ON items (local_name)')
+            con.execute(
+                'CREATE INDEX ix_items_subcategory '
+                'ON items (shop_subcategory, tier)'
+            )
+            con.execute(
+                'CREATE INDEX ix_item_powers_ip ON item_powers (item_power)'
+            )
+    finally:
+        con.close()
+
+    return output_file
+
+
+def _write_jsonl(output_file: Path, columns: List, rows: List) -> None:
+    """Writes rows as newline-delimited JSON objects keyed by columns."""
+
+    with open(output_file, 'w', encoding='utf8') as f:
+        for batch in _batches(rows):
+            f.write(''.join(
+                json.dumps(dict(zip(columns, row)), separators=SEPARATORS)
+                + '\n'
+                for row in batch
+            ))
+
+
+def export_jsonl(ao_data: AoBinData, output_dir=None, rows=None) -> List:
+    """Writes one newline-delimited JSON file per table.
+
+    The files are suitable for COPY style bulk loading, one object per line
+    with no enclosing array.
+
+    Parameters
+    ----------
+    ao_data: AoBinData object
+        Pointer to the AoBinData object containing item information.
+    output_dir: str or Path
+        Folder the files are written to. (default: exports)
+    rows: dictionary
+        Rows from build_rows, built if not passed in.
+
+    Returns
+    -------
+    list
+        Locations of the written files.
+    """
+
+    output_dir = Path(output_dir or EXPORT_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rows = rows or build_rows(ao_data)
+
+    tables = [
+        ('items', ITEM_COLUMNS + ['data']),
+        ('quality_levels', ['level', 'item_power_bonus']),
+        ('item_powers', ['unique_name', 'enchant', 'quality', 'item_power']),
+    ]
+
+    res = []
+    for table, columns in tables:
+        output_file = output_dir / f'{table}.jsonl'
+        _write_jsonl(output_file, columns, rows[table])
+        res.append(output_file)
+
+    return res
+
+
+def export_columnar(ao_data: AoBinData, output_file=None, rows=None) -> Path:
+    """Writes the tables as column arrays to a compressed NumPy archive.
+
+    Each column is stored as its own array named {table}.{column}, e.g.
+    'item_powers.item_power', so a reader can load only what it needs.
+    The item's raw JSON data is not included.
+
+    Parameters
+    ----------
+    ao_data: AoBinData object
+        Pointer to the AoBinData object containing item information.
+    output_file: str or Path
+        Location of the archive. (default: exports/ao_bin.npz)
+    rows: dictionary
+        Rows from build_rows, built if not passed in.
+
+    Returns
+    -------
+    Path
+        Location of the written archive.
+    """
+
+    output_file = Path(output_file or EXPORT_DIR / 'ao_bin.npz')
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    rows = rows or build_rows(ao_data)
+    item_rows = rows['items']
+    quality_rows = rows['quality_levels']
+    item_power_rows = rows['item_powers']
+
+    def column(rows, i, dtype):
+        return np.array([row[i] for row in rows], dtype=dtype)
+
+    arrays = {}
+    for i, name in enumerate(ITEM_COLUMNS):
+        dtype = {
+            'tier': np.int8,
+            'item_power': np.int32,
+            'mastery_modifier': np.float32,
+        }.get(name, np.str_)
+        arrays[f'items.{name}'] = column(item_rows, i, dtype)
+
+    arrays['quality_levels.level'] = column(quality_rows, 0, np.int8)
+    arrays['quality_levels.item_power_bonus'] = column(
+        quality_rows, 1, np.int32
+    )
+
+    # Store names once and reference them by index
+    names, name_index = np.unique(
+        column(item_power_rows, 0, np.str_), return_inverse=True
+    )
+    arrays['item_powers.names'] = names
+    arrays['item_powers.name_index'] = name_index.astype(np.int32)
+    arrays['item_powers.enchant'] = column(item_power_rows, 1, np.int8)
+    arrays['item_powers.quality'] = column(item_power_rows, 2, np.int8)
+    arrays['item_powers.item_power'] = column(
+        item_power_rows, 3, np.float32
+    )
+
+    with open(output_file, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+    return output_file
+
+
+def export_all(ao_data: AoBinData, output_dir=None) -> Dict:
+    """Writes every export format to output_dir.
+
+    The rows are built once and shared by every format.
+
+    Returns
+    -------
+    dictionary
+        'sqlite', 'jsonl' and 'columnar' mapped to the written locations.
+    """
+
+    output_dir = Path(output_dir or EXPORT_DIR)
+    rows = build_rows(ao_data)
+
+    return {
+        'sqlite': export_sqlite(
+            ao_data, output_dir / 'ao_bin.sqlite3', rows
+        ),
+        'jsonl': export_jsonl(ao_data, output_dir, rows),
+        'columnar': export_columnar(ao_data, output_dir / 'ao_bin.npz', rows),
+    }
+
+
+if __name__ == "__main__":
+    export_all(AoBinData())
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from ao_bin_utils.ao_bin_templates import (
+    INST_REF, INST_ROT, INST_X, INST_Z, AoBinTemplateIndex,
+)
+
+BASE_DIR = Path(__file__).resolve().parent
+GEOMETRY_DIR = BASE_DIR / 'cache' / 'geometry'
+
+CELL_SIZE = 32.0
+KIND_INSTANCE = 0
+KIND_OBJECT = 1
+
+RECORD_DTYPE = np.dtype([
+    ('cluster', '<i4'),
+    ('kind', '<i2'),
+    ('type', '<i4'),
+    ('x', '<f4'),
+    ('z', '<f4'),
+    ('rot', '<f4'),
+])
+
+
+def cell_keys(cluster, x, z, cell_size: float = CELL_SIZE):
+    """Returns the int64 grid key of each (cluster, x, z).
+
+    The key sorts by cluster, then cell column, then cell row, so the
+    records of one cell are contiguous once sorted by key.
+    """
+
+    cx = np.floor(np.asarray(x)/cell_size).astype(np.int64) + 32768
+    cz = np.floor(np.asarray(z)/cell_size).astype(np.int64) + 32768
+
+    return (np.asarray(cluster, dtype=np.int64) << 32) | (cx << 16) | cz
+
+
+def build_geometry(
+        template_index: AoBinTemplateIndex = None,
+        output_dir=GEOMETRY_DIR,
+        cell_size: float = CELL_SIZE) -> Path:
+    """Packs every template instance and active object into fixed records.
+
+    Writes three files to output_dir:
+
+        records.bin: RECORD_DTYPE records sorted by grid cell.
+        cells.npy: Sorted grid keys and the [start, end) record range of
+        each cell.
+        names.json: Cluster and type names referenced by index, and the
+        cell size.
+
+    Instances have the template's name as type. Objects have
+    '{tag}/{key}' as type, e.g. 'exit/Cluster'.
+
+    Parameters
+    ----------
+    template_index: AoBinTemplateIndex object
+        Index the clusters are read from. (default: AoBinTemplateIndex())
+    output_dir: str or Path
+        Folder the files are written to.
+    cell_size: float
+        Width of a grid cell in world units.
+
+    Returns
+    -------
+    Path
+        The output folder.
+    """
+
+    template_index = template_index or AoBinTemplateIndex()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    clusters = template_index.clusters()
+    types = {}
+    rows = []
+
+    for cluster_id, cluster in enumerate(clusters):
+        for instance in template_index.get_cluster(cluster)['instances']:
+            type_id = types.setdefault(instance[INST_REF], len(types))
+            rows.append((
+                cluster_id,
+                KIND_INSTANCE,
+                type_id,
+                instance[INST_X],
+                instance[INST_Z],
+                instance[INST_ROT],
+            ))
+        for _, _, _, tag, key, x, z in template_index.get_cluster_objects(
+            cluster
+        ):
+            type_id = types.setdefault(f'{tag}/{key}', len(types))
+            rows.append((cluster_id, KIND_OBJECT, type_id, x, z, 0.0))
+
+    records = np.array(rows, dtype=RECORD_DTYPE)
+    keys = cell_keys(records['cluster'], records['x'], records['z'], cell_size)
+    order = np.argsort(keys, kind='stable')
+    records, keys = records[order], keys[order]
+
+    cell_ids, starts = np.unique(keys, return_index=True)
+    cells = np.empty(len(cell_ids), dtype=[
+        ('key', '<i8'), ('start', '<i8'), ('end', '<i8')
+    ])
+    cells['key'] = cell_ids
+    cells['start'] = starts
+    cells['end'] = np.append(starts[1:], len(records))
+
+    records.tofile(output_dir / 'records.bin')
+    np.save(output_dir / 'cells.npy', cells)
+    with open(output_dir / 'names.json', 'w') as f:
+        json.dump({
+            'cell_size': cell_size,
+            'clusters': clusters,
+            'types': sorted(types, key=types.get),
+        }, f)
+
+    return output_dir
+
+
+class AoBinGeometry():
+    """Radius and bounding box queries over the packed cluster geometry.
+
+    The records and cells are memory-mapped, so loading is immediate and
+    only the pages touched by a query are read. Positions are in cluster
+    coordinates, a query either targets one cluster or repeats the same
+    area in every cluster.
+
+    ...
+
+    Attributes
+    ----------
+    records: numpy memmap
+        RECORD_DTYPE records sorted by grid cell.
+    cells: numpy memmap
+        Grid keys with the record range of each cell.
+    clusters: list
+        Cluster names, indexed by a record's 'cluster'.
+    types: list
+        Type names, indexed by a record's 'type'.
+
+    Methods
+    -------
+    cluster_id(cluster):
+        Returns the index of a cluster name.
+    box(cluster, x_min, z_min, x_max, z_max, kind, type_name):
+        Returns the records within a bounding box.
+    radius(cluster, x, z, r, kind, type_name):
+        Returns the records within a distance of a point.
+    to_dicts(records):
+        Converts records to dictionaries with names resolved.
+    """
+
+    def __init__(self, geometry_dir=GEOMETRY_DIR):
+        """Constructor memory-maps the files written by build_geometry.
+
+        Parameters
+        ----------
+        geometry_dir: str or Path
+            Folder containing the files.
+        """
+
+        geometry_dir = Path(geometry_dir)
+        with open(geometry_dir / 'names.json') as f:
+            names = json.load(f)
+
+        self.cell_size = names['cell_size']
+        self.clusters = names['clusters']
+        self.types = names['types']
+        self._cluster_ids = {x: i for i, x in enumerate(self.clusters)}
+        self._type_ids = {x: i for i, x in enumerate(self.types)}
+
+        self.records = np.memmap(
+            geometry_dir / 'records.bin', dtype=RECORD_DTYPE, mode='r'
+        )
+        self.cells = np.load(geometry_dir / 'cells.npy', mmap_mode='r')
+
+    def cluster_id(self, cluster: str) -> int:
+        """Returns the index of a cluster name. Raises KeyError if unknown."""
+
+        return self._cluster_ids[cluster]
+
+    def box(
+            self,
+            cluster: str,
+            x_min: float,
+            z_min: float,
+            x_max: float,
+            z_max: float,
+            kind: int = None,
+            type_name: str = None) -> np.ndarray:
+        """Returns the records within a bounding box.
+
+        Parameters
+        ----------
+        cluster: str
+            The cluster's name, or None to search every cluster.
+        x_min, z_min, x_max, z_max: float
+            Bounds of the box, inclusive.
+        kind: int
+            KIND_INSTANCE or KIND_OBJECT to only return one kind.
+            (default: None)
+        type_name: str
+            Only return records of this type. (default: None)
+
+        Returns
+        -------
+        numpy array
+            RECORD_DTYPE records.
+        """
+
+        if cluster is None:
+            cluster_ids = range(len(self.clusters))
+        else:
+            cluster_ids = [self.cluster_id(cluster)]
+        cx_min, cx_max = (
+            int(np.floor(v/self.cell_size)) + 32768 for v in (x_min, x_max)
+        )
+        cz_min, cz_max = (
+            int(np.floor(v/self.cell_size)) + 32768 for v in (z_min, z_max)
+        )
+
+        # Cells of one column are contiguous, search each column once
+        keys = self.cells['key']
+        chunks = []
+        for cluster_id in cluster_ids:
+            for cx in range(cx_min, cx_max + 1):
+                prefix = (cluster_id << 32) | (cx << 16)
+                lo = np.searchsorted(keys, prefix | cz_min, side='left')
+                hi = np.searchsorted(keys, prefix | cz_max, side='right')
+                if hi > lo:
+                    chunks.append(self.records[
+                        self.cells['start'][lo]:self.cells['end'][hi - 1]
+                    ])
+
+        if not chunks:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        res = np.concatenate(chunks)
+        mask = (
+            (res['x'] >= x_min) & (res['x'] <= x_max)
+            & (res['z'] >= z_min) & (res['z'] <= z_max)
+        )
+        if kind is not None:
+            mask &= res['kind'] == kind
+        if type_name is not None:
+            mask &= res['type'] == self._type_ids.get(type_name, -1)
+
+        return res[mask]
+
+    def radius(
+            self,
+            cluster: str,
+            x: float,
+            z: float,
+            r: float,
+            kind: int = None,
+            type_name: str = None) -> np.ndarray:
+        """Returns the records within a distance of a point.
+
+        Parameters
+        ----------
+        cluster: str
+            The cluster's name, or None to search every cluster.
+        x, z: float
+            The point, in cluster coordinates.
+        r: float
+            The distance.
+        kind: int
+            KIND_INSTANCE or KIND_OBJECT to only return one kind.
+            (default: None)
+        type_name: str
+            Only return records of this type. (default: None)
+
+        Returns
+        -------
+        numpy array
+            RECORD_DTYPE records.
+        """
+
+        res = self.box(cluster, x - r, z - r, x + r, z + r, kind, type_name)
+
+        return res[(res['x'] - x)**2 + (res['z'] - z)**2 <= r*r]
+
+    def to_dicts(self, records: np.ndarray) -> List:
+        """Converts records to dictionaries with names resolved."""
+
+        return [
+            {
+                'cluster': self.clusters[x['cluster']],
+                'kind': int(x['kind']),
+                'type': self.types[x['type']],
+                'x': float(x['x']),
+                'z': float(x['z']),
+                'rot': float(x['rot']),
+            }
+            for x in records
+        ]
+
+
+if __name__ == "__main__":
+    print(build_geometry())
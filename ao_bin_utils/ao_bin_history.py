@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import os
+import zlib
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+HISTORY_DIR = BASE_DIR / 'history'
+
+BLOCK_ROWS = 1 << 20
+COMPRESS_LEVEL = 6
+SEGMENT_DTYPE = np.dtype([
+    ('item', '<i4'),
+    ('rows', '<i4'),
+    ('min_ts', '<i8'),
+    ('max_ts', '<i8'),
+    ('offset', '<i8'),
+    ('size', '<i8'),
+])
+# Column dtypes of a segment, in the order they are stored
+COLUMNS = [
+    ('timestamp', np.dtype('<i8')),
+    ('quality', np.dtype('<i1')),
+    ('city', np.dtype('<i1')),
+    ('price', np.dtype('<i8')),
+]
+
+
+def encode_segment(timestamps, qualities, cities, prices) -> bytes:
+    """Returns the compressed columns of one item's rows.
+
+    The rows must be sorted by timestamp. Timestamps and prices are delta
+    encoded, so a segment is mostly small numbers and repeated bytes,
+    then every column is compressed together.
+    """
+
+    columns = [
+        np.diff(timestamps, prepend=0),
+        qualities,
+        cities,
+        np.diff(prices, prepend=0),
+    ]
+
+    return zlib.compress(b''.join(
+        np.ascontiguousarray(x, dtype=dtype).tobytes()
+        for x, (_, dtype) in zip(columns, COLUMNS)
+    ), COMPRESS_LEVEL)
+
+
+def decode_segment(data, rows: int) -> Dict:
+    """Returns the columns of a segment written by encode_segment."""
+
+    data = zlib.decompress(data)
+    res = {}
+    offset = 0
+    for name, dtype in COLUMNS:
+        res[name] = np.frombuffer(data, dtype, rows, offset)
+        offset += rows*dtype.itemsize
+
+    res['timestamp'] = np.cumsum(res['timestamp'])
+    res['price'] = np.cumsum(res['price'])
+
+    return res
+
+
+def _read_names(fp: Path) -> List:
+    try:
+        with open(fp, encoding='utf8') as f:
+            return [x for x in f.read().split('\n') if x]
+    except OSError:
+        return []
+
+
+class AoBinPriceHistory():
+    """Append-only store of market price observations.
+
+    Rows of (timestamp, item, quality, city, price) are buffered in memory
+    and written in blocks of block_rows. A block is sorted by item and
+    time, and each item's rows in it are a segment: its columns are delta
+    encoded and compressed on their own, so a read only decodes the
+    segments of the item it asks for.
+
+    The history folder holds:
+
+        data.bin: the compressed segments, one after the other
+        segments.bin: a fixed width SEGMENT_DTYPE record per segment, with
+            the item, time range, row count and location in data.bin
+        items.txt, cities.txt: item and city names, one per line, whose
+            line number is their id in the segments
+
+    Every file is only appended to. Segments are written to data.bin
+    before their records, and opening the history drops whatever an
+    interrupted flush left behind, so it loses its block but nothing
+    else.
+
+    Reads find an item's segments through an index sorted by item, keep
+    the ones overlapping the time range and decode them. data.bin is
+    memory mapped unless use_mmap is false. Rows that haven't been
+    flushed are included in reads.
+
+    ...
+
+    Attributes
+    ----------
+    history_dir: Path
+        Folder the history is stored in.
+    block_rows: int
+        Number of buffered rows that triggers a flush.
+    items: list
+        Item unique names, the position is the item's id.
+    cities: list
+        City names, the position is the city's id.
+
+    Methods
+    -------
+    append(items, qualities, cities, prices, timestamps):
+        Buffers price observations and flushes full blocks.
+    append_records(records):
+        Buffers the sell prices of a market API response.
+    flush():
+        Writes the buffered rows as a block.
+    read(item, start, end, quality, city):
+        Returns an item's observations in a time range.
+    """
+
+    def __init__(self, history_dir=HISTORY_DIR, block_rows: int = BLOCK_ROWS,
+                 use_mmap: bool = True):
+        """Constructor opens, or creates, a history folder.
+
+        Parameters
+        ----------
+        history_dir: str or Path
+            Folder the history is stored in.
+        block_rows: int
+            Number of buffered rows that triggers a flush.
+        use_mmap: bool
+            If true, data.bin is memory mapped for reads, otherwise
+            segments are read from the file.
+        """
+
+        self.history_dir = Path(history_dir)
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        self.block_rows = block_rows
+        self.use_mmap = use_mmap
+
+        self._data_file = self.history_dir / 'data.bin'
+        self._segments_file = self.history_dir / 'segments.bin'
+        self._data_file.touch()
+        self._segments_file.touch()
+
+        self.items = _read_names(self.history_dir / 'items.txt')
+        self.cities = _read_names(self.history_dir / 'cities.txt')
+        self._item_ids = {x: i for i, x in enumerate(self.items)}
+        self._city_ids = {x: i for i, x in enumerate(self.cities)}
+
+        self._lock = Lock()
+        self._buffer = []
+        self._buffered = 0
+        self._mmap = None
+        self._index = None
+
+        self._segments = self._recover()
+
+    def _recover(self) -> np.ndarray:
+        """Returns the written segments, dropping an interrupted flush.
+
+        A flush interrupted part way leaves data or a partial record past
+        the last complete segment. Both files are truncated to the last
+        complete segment so later flushes append after it.
+        """
+
+        data_size = self._data_file.stat().st_size
+        segments = np.fromfile(self._segments_file, dtype=np.uint8)
+        segments = segments[
+            :len(segments) - len(segments) % SEGMENT_DTYPE.itemsize
+        ].view(SEGMENT_DTYPE)
+        ends = segments['offset'] + segments['size']
+        invalid = np.flatnonzero(ends > data_size)
+        if len(invalid):
+            segments = segments[:invalid[0]]
+            ends = ends[:invalid[0]]
+
+        data_end = int(ends[-1]) if len(ends) else 0
+        if data_end != data_size:
+            os.truncate(self._data_file, data_end)
+        if segments.nbytes != self._segments_file.stat().st_size:
+            os.truncate(self._segments_file, segments.nbytes)
+
+        return segments.copy()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def _add_names(self, names, ids: Dict, values: List,
+                   file_name: str) -> np.ndarray:
+        """Returns the id of each name, adding new names to the file."""
+
+        new = [x for x in dict.fromkeys(names) if x not in ids]
+        if new:
+            with open(self.history_dir / file_name, 'a',
+                      encoding='utf8') as f:
+                f.write(''.join(f'{x}\n' for x in new))
+            for x in new:
+                ids[x] = len(values)
+                values.append(x)
+
+        return np.array([ids[x] for x in names], dtype=np.int32)
+
+    def append(self, items, qualities, cities, prices, timestamps) -> None:
+        """Buffers price observations and flushes full blocks.
+
+        Parameters
+        ----------
+        items: list of str
+            Item unique names, with the enchant level if enchanted.
+        qualities: list of int
+            Quality of each observation.
+        cities: list of str
+            City of each observation.
+        prices: list of int
+            Price of each observation, in silver.
+        timestamps: array
+            Time of each observation, as datetime64 or Unix seconds.
+        """
+
+        timestamps = np.asarray(timestamps)
+        if np.issubdtype(timestamps.dtype, np.datetime64):
+            timestamps = timestamps.astype('datetime64[s]')
+        timestamps = timestamps.astype(np.int64)
+
+        with self._lock:
+            rows = (
+                timestamps,
+                self._add_names(
+                    [str(x) for x in items], self._item_ids, self.items,
+                    'items.txt'
+                ),
+                np.asarray(qualities, dtype=np.int8),
+                self._add_names(
+                    list(cities), self._city_ids, self.cities, 'cities.txt'
+                ).astype(np.int8),
+                np.asarray(prices, dtype=np.int64),
+            )
+            self._buffer.append(rows)
+            self._buffered += len(timestamps)
+
+            if self._buffered >= self.block_rows:
+                self._flush()
+
+    def append_records(self, records: List) -> int:
+        """Buffers the sell prices of a market API response.
+
+        Parameters
+        ----------
+        records: list
+            Dictionaries with 'item_id', 'quality', 'city',
+            'sell_price_min' and 'sell_price_min_date' keys. Records
+            without a sell order are skipped.
+
+        Returns
+        -------
+        int
+            Number of observations buffered.
+        """
+
+        records = [x for x in records if (x.get('sell_price_min') or 0) > 0]
+        if records:
+            self.append(
+                [x['item_id'] for x in records],
+                [x['quality'] for x in records],
+                [x['city'] for x in records],
+                [x['sell_price_min'] for x in records],
+                np.array(
+                    [x['sell_price_min_date'] for x in records],
+                    dtype='datetime64[s]'
+                ),
+            )
+
+        return len(records)
+
+    def _concat_buffer(self) -> tuple:
+        return tuple(np.concatenate(x) for x in zip(*self._buffer))
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+
+        timestamps, items, qualities, cities, prices = self._concat_buffer()
+        order = np.lexsort((timestamps, items))
+        timestamps, items, qualities, cities, prices = (
+            x[order] for x in (timestamps, items, qualities, cities, prices)
+        )
+
+        bounds = np.flatnonzero(np.diff(items)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(items)]])
+
+        segments = np.zeros(len(starts), dtype=SEGMENT_DTYPE)
+        chunks = []
+        offset = self._data_file.stat().st_size
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            chunk = encode_segment(
+                timestamps[start:end],
+                qualities[start:end],
+                cities[start:end],
+                prices[start:end],
+            )
+            segments[i] = (
+                items[start], end - start, timestamps[start],
+                timestamps[end - 1], offset, len(chunk),
+            )
+            offset += len(chunk)
+            chunks.append(chunk)
+
+        # Data first, so a record never points past the end of data.bin
+        with open(self._data_file, 'ab') as f:
+            f.write(b''.join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._segments_file, 'ab') as f:
+            f.write(segments.tobytes())
+
+        self._segments = np.concatenate([self._segments, segments])
+        self._buffer = []
+        self._buffered = 0
+        self._mmap = None
+        self._index = None
+
+    def flush(self) -> None:
+        """Writes the buffered rows as a block."""
+
+        with self._lock:
+            self._flush()
+
+    def _get_index(self) -> tuple:
+        """Returns the segments sorted by item and each item's first one.
+
+        The sort is stable, so an item's segments stay in the order they
+        were written. Rebuilt after a flush.
+        """
+
+        if self._index is None:
+            order = np.argsort(self._segments['item'], kind='stable')
+            starts = np.searchsorted(
+                self._segments['item'][order],
+                np.arange(len(self.items) + 1)
+            )
+            self._index = (order, starts)
+
+        return self._index
+
+    def _read_segment(self, segment) -> Dict:
+        offset, size = int(segment['offset']), int(segment['size'])
+        if self.use_mmap:
+            if self._mmap is None:
+                self._mmap = (
+                    np.memmap(self._data_file, dtype=np.uint8, mode='r')
+                    if self._data_file.stat().st_size else
+                    np.zeros(0, dtype=np.uint8)
+                )
+            data = self._mmap[offset:offset + size]
+        else:
+            with open(self._data_file, 'rb') as f:
+                f.seek(offset)
+                data = f.read(size)
+
+        return decode_segment(data, int(segment['rows']))
+
+    def read(self, item: str, start=None, end=None, quality: int = None,
+             city: str = None) -> Dict:
+        """Returns an item's observations in a time range.
+
+        Parameters
+        ----------
+        item: str
+            Item unique name, with the enchant level if enchanted.
+        start, end: datetime64, str or int
+            Inclusive time range, as datetime64, ISO 8601 strings or Unix
+            seconds. (default: unbounded)
+        quality: int
+            Only return this quality. (default: every quality)
+        city: str
+            Only return this city. (default: every city)
+
+        Returns
+        -------
+        dictionary
+            'timestamp' (datetime64[s]), 'quality', 'city' (names) and
+            'price' arrays, sorted by time.
+        """
+
+        def to_seconds(value, default):
+            if value is None:
+                return default
+            if isinstance(value, (int, np.integer)):
+                return int(value)
+            return int(np.datetime64(value, 's').astype(np.int64))
+
+        start = to_seconds(start, np.iinfo(np.int64).min)
+        end = to_seconds(end, np.iinfo(np.int64).max)
+
+        with self._lock:
+            item_id = self._item_ids.get(str(item))
+            parts = []
+            order, starts = self._get_index()
+            if item_id is not None and item_id + 1 < len(starts):
+                segments = self._segments[
+                    order[starts[item_id]:starts[item_id + 1]]
+                ]
+                segments = segments[
+                    (segments['max_ts'] >= start)
+                    & (segments['min_ts'] <= end)
+                ]
+                parts = [self._read_segment(x) for x in segments]
+
+            if item_id is not None and self._buffer:
+                timestamps, items, qualities, cities, prices = (
+                    self._concat_buffer()
+                )
+                mask = items == item_id
+                parts.append({
+                    'timestamp': timestamps[mask],
+                    'quality': qualities[mask],
+                    'city': cities[mask],
+                    'price': prices[mask],
+                })
+            city_id = self._city_ids.get(city, -1)
+            city_names = np.array(self.cities or [''])
+
+        if not parts:
+            parts = [{
+                name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS
+            }]
+        res = {
+            name: np.concatenate([x[name] for x in parts])
+            for name, _ in COLUMNS
+        }
+
+        mask = (res['timestamp'] >= start) & (res['timestamp'] <= end)
+        if quality is not None:
+            mask &= res['quality'] == quality
+        if city is not None:
+            mask &= res['city'] == city_id
+        order = np.argsort(res['timestamp'][mask], kind='stable')
+        res = {k: v[mask][order] for k, v in res.items()}
+
+        res['timestamp'] = res['timestamp'].astype('datetime64[s]')
+        res['city'] = city_names[res['city']]
+
+        return res
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import math
+from typing import List
+
+import numpy as np
+
+from ao_bin_utils.ao_bin_data import AoBinData
+from ao_bin_utils.ao_bin_export import build_item_power_rows
+from ao_bin_utils.ao_bin_item_id import ItemId
+
+
+class AoBinIpIndex():
+    """Item Power range index over every item/enchant/quality combination.
+
+    Item Powers are grouped by the item's @shopsubcategory1 and @slottype,
+    then by its @masterymodifier, and sorted. Mastery adds the same amount
+    to every Item Power with the same modifier, so a group stays sorted at
+    any mastery and a range query is one bisection per modifier. Groups
+    are also kept for every subcategory, every slot and the whole catalog,
+    so leaving either filter out costs the same.
+
+    ...
+
+    Attributes
+    ----------
+    version: int
+        Version of the AoBinData the index was built from.
+    _names: list
+        Unique name, with enchant level, of each row.
+    _qualities: numpy array
+        Quality of each row.
+    _groups: dictionary
+        (subcategory, slot) to a list of (mastery modifier, sorted Item
+        Powers, rows) tuples. None stands for any subcategory or slot.
+
+    Methods
+    -------
+    query(subcategory, slot, min_ip, max_ip, mastery, limit):
+        Returns the items with an Item Power in a range.
+    subcategories():
+        Returns the shop subcategories in the index.
+    slots():
+        Returns the slot types in the index.
+    """
+
+    def __init__(self, ao_data: AoBinData):
+        """Constructor builds the index from the item data.
+
+        Parameters
+        ----------
+        ao_data: AoBinData object
+            Pointer to the AoBinData object containing item information.
+        """
+
+        self.version = ao_data.version
+        items = {v['@uniquename']: v for _, v in ao_data.get_items()}
+
+        names = []
+        qualities = []
+        item_powers = []
+        keys = []
+        for unique_name, enchant, quality, item_power in (
+            build_item_power_rows(ao_data)
+        ):
+            item = items[unique_name]
+            names.append(
+                ItemId.parse(unique_name).with_enchant(enchant).name
+            )
+            qualities.append(quality)
+            item_powers.append(item_power)
+            keys.append((
+                item.get('@shopsubcategory1'),
+                item.get('@slottype'),
+                float(item.get('@masterymodifier', 0)),
+            ))
+
+        self._names = names
+        self._qualities = np.array(qualities, dtype=np.int8)
+        item_powers = np.array(item_powers, dtype=np.float64)
+
+        rows = {}
+        for i, (subcategory, slot, mod) in enumerate(keys):
+            for group in (
+                (subcategory, slot), (subcategory, None), (None, slot),
+                (None, None),
+            ):
+                rows.setdefault(group, {}).setdefault(mod, []).append(i)
+
+        self._groups = {}
+        for group, mods in rows.items():
+            self._groups[group] = []
+            for mod, group_rows in sorted(mods.items()):
+                group_rows = np.array(group_rows, dtype=np.int32)
+                order = np.argsort(item_powers[group_rows], kind='stable')
+                group_rows = group_rows[order]
+                self._groups[group].append(
+                    (mod, item_powers[group_rows], group_rows)
+                )
+
+    def subcategories(self) -> List:
+        """Returns the shop subcategories in the index."""
+
+        return sorted(
+            x for x, slot in self._groups
+            if x is not None and slot is None
+        )
+
+    def slots(self) -> List:
+        """Returns the slot types in the index."""
+
+        return sorted(
+            x for subcategory, x in self._groups
+            if x is not None and subcategory is None
+        )
+
+    def query(
+            self,
+            subcategory: str = None,
+            slot: str = None,
+            min_ip: float = -math.inf,
+            max_ip: float = math.inf,
+            mastery: int = 0,
+            limit: int = None) -> List:
+        """Returns the items with an Item Power in a range.
+
+        Parameters
+        ----------
+        subcategory: str
+            The items' @shopsubcategory1, e.g. 'shield'. (default: any)
+        slot: str
+            The items' @slottype, e.g. 'offhand'. (default: any)
+        min_ip, max_ip: float
+            Inclusive Item Power range, with mastery applied.
+        mastery: int
+            Bonus from item mastery, scaled by each item's
+            @masterymodifier the same way as get_item_power.
+        limit: int
+            Most items to return, the ones with the lowest Item Power.
+            Building the result is most of a query's cost, so a limit
+            keeps wide ranges fast. (default: no limit)
+
+        Returns
+        -------
+        list
+            (unique_name, quality, item_power) tuples sorted by Item Power.
+            The unique name has the enchant level if enchanted.
+        """
+
+        matches = []
+        for mod, item_powers, rows in self._groups.get(
+            (subcategory, slot), []
+        ):
+            bonus = mastery*(1 + mod)
+            lo = item_powers.searchsorted(min_ip - bonus, 'left')
+            hi = item_powers.searchsorted(max_ip - bonus, 'right')
+            if limit is not None:
+                hi = min(hi, lo + limit)
+            if hi > lo:
+                matches.append((rows[lo:hi], item_powers[lo:hi] + bonus))
+
+        if not matches:
+            return []
+
+        if len(matches) == 1:
+            rows, item_powers = matches[0]
+        else:
+            rows = np.concatenate([x[0] for x in matches])
+            item_powers = np.concatenate([x[1] for x in matches])
+            order = np.argsort(item_powers, kind='stable')[:limit]
+            rows = rows[order]
+            item_powers = item_powers[order]
+
+        names = self._names
+
+        return [
+            (names[row], quality, item_power)
+            for row, quality, item_power in zip(
+                rows.tolist(),
+                self._qualities[rows].tolist(),
+                item_powers.tolist(),
+            )
+        ]
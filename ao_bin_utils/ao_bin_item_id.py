@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import re
+from threading import Lock
+from typing import List
+
+TIER_FINDER = re.compile(r"^T(\d)_")
+MAX_TIER = 8
+MAX_ENCHANT = 4
+
+
+class ItemId():
+    """An item's unique name split into its tier, family and enchant level.
+
+    ItemIds are interned, there is a single instance for each (tier, base,
+    enchant) so they compare and hash by identity. A parsed name is cached,
+    parsing the same name again is a dictionary lookup. ItemIds are
+    immutable, with_tier and with_enchant return the interned variant.
+
+    ...
+
+    Attributes
+    ----------
+    tier: int
+        The item's tier, 0 if the name has no tier.
+    base: str
+        The item's family, e.g. 'OFF_SHIELD'.
+    enchant: int
+        The item's enchant level, 0 if not enchanted.
+    base_name: str
+        Unique name without the enchant level, e.g. 'T5_OFF_SHIELD'.
+    name: str
+        Unique name with the enchant level, e.g. 'T5_OFF_SHIELD@1'.
+
+    Methods
+    -------
+    parse(name):
+        Returns the ItemId of a unique name or ItemId.
+    with_tier(tier):
+        Returns the same item at another tier.
+    with_enchant(enchant):
+        Returns the same item at another enchant level.
+    variants(min_tier):
+        Returns every tier/enchant version of the item from min_tier.
+    """
+
+    __slots__ = ('tier', 'base', 'enchant', 'base_name', 'name')
+
+    _interned = {}
+    _parsed = {}
+    _lock = Lock()
+
+    def __new__(cls, tier: int, base: str, enchant: int = 0):
+        key = (tier, base, enchant)
+        res = cls._interned.get(key)
+        if res is not None:
+            return res
+
+        res = object.__new__(cls)
+        base_name = f'T{tier}_{base}' if tier else base
+        for attr, value in (
+            ('tier', tier),
+            ('base', base),
+            ('enchant', enchant),
+            ('base_name', base_name),
+            ('name', base_name + (f'@{enchant}' if enchant else '')),
+        ):
+            object.__setattr__(res, attr, value)
+
+        with cls._lock:
+            return cls._interned.setdefault(key, res)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError('ItemId is immutable')
+
+    def __delattr__(self, attr):
+        raise AttributeError('ItemId is immutable')
+
+    def __reduce__(self):
+        return (ItemId, (self.tier, self.base, self.enchant))
+
+    def __repr__(self) -> str:
+        return f'ItemId({self.name!r})'
+
+    def __str__(self) -> str:
+        return self.name
+
+    @classmethod
+    def parse(cls, name) -> ItemId:
+        """Returns the ItemId of a unique name, e.g. 'T5_OFF_SHIELD@1'.
+
+        Parameters
+        ----------
+        name: str or ItemId
+            The unique name, with '@' and the enchant level if enchanted.
+            An ItemId is returned as is.
+        """
+
+        if type(name) is ItemId:
+            return name
+
+        res = cls._parsed.get(name)
+        if res is not None:
+            return res
+
+        base, _, enchant = name.partition('@')
+        match = TIER_FINDER.match(base)
+        tier = 0
+        if match:
+            tier = int(match[1])
+            base = base[match.end():]
+
+        res = ItemId(tier, base, int(enchant) if enchant else 0)
+        cls._parsed[name] = res
+
+        return res
+
+    def with_tier(self, tier: int) -> ItemId:
+        """Returns the same item at another tier."""
+
+        return ItemId(tier, self.base, self.enchant)
+
+    def with_enchant(self, enchant: int) -> ItemId:
+        """Returns the same item at another enchant level."""
+
+        return ItemId(self.tier, self.base, enchant)
+
+    def variants(self, min_tier: int) -> List[ItemId]:
+        """Returns every tier/enchant version of the item.
+
+        Returns
+        -------
+        list
+            ItemIds from tier min_tier to MAX_TIER and enchant level 0 to
+            MAX_ENCHANT, ordered by tier then enchant level.
+        """
+
+        return [
+            ItemId(tier, self.base, enchant)
+            for tier in range(min_tier, MAX_TIER + 1)
+            for enchant in range(0, MAX_ENCHANT + 1)
+        ]
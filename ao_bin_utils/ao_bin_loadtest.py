@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+from ao_bin_utils.ao_bin_benchmark import BENCH_ITEMS, ApiReplay
+from ao_bin_utils.ao_bin_service import HOST, read_head, serve_http
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR.parent
+STARTUP_TIMEOUT = 60
+
+
+class PriceStub():
+    """Local stand-in for the market API, see ApiReplay.synthetic.
+
+    ...
+
+    Attributes
+    ----------
+    latency: float
+        Seconds each response is delayed by, to mimic the real API.
+    requests: int
+        Number of requests answered.
+
+    Methods
+    -------
+    handle(method, target, headers):
+        Returns the response to a price request.
+    """
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.requests = 0
+
+    async def handle(self, method: str, target: str, headers: Dict):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        url = urlsplit(target)
+        body = json.dumps(
+            ApiReplay.synthetic(url.path, dict(parse_qsl(url.query)))
+        ).encode()
+
+        return HTTPStatus.OK, {'Content-Type': 'application/json'}, body
+
+
+async def http_get(reader, writer, target: str,
+                   headers: Dict = None) -> tuple:
+    """Sends a GET request on a keep-alive connection.
+
+    Returns
+    -------
+    tuple
+        (status code, headers dictionary with lower case names, body).
+    """
+
+    lines = [f'GET {target} HTTP/1.1', f'Host: {HOST}']
+    lines.extend(f'{k}: {v}' for k, v in (headers or {}).items())
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin1'))
+    await writer.drain()
+
+    head = await read_head(reader)
+    if head is None:
+        raise ConnectionError('Connection closed')
+    line, header_lines = head
+    res_headers = {}
+    for x in header_lines:
+        name, _, value = x.decode('latin1').partition(':')
+        res_headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(
+        int(res_headers.get('content-length', 0))
+    )
+
+    return int(line.split()[1]), res_headers, body
+
+
+def get_targets() -> List:
+    """Returns the request mix, price queries share items on purpose."""
+
+    targets = []
+    for item in BENCH_ITEMS:
+        base = item.split('_', 1)[1]
+        variants = ','.join(f'T{tier}_{base}' for tier in range(4, 9))
+        targets.extend([
+            f'/item?name={item}',
+            f'/ip?name={item}@1&quality=3&mastery=100',
+            f'/items_above_ip?name={item}&ip=1100&mastery=100',
+            f'/price?names={variants}&location=Lymhurst',
+            f'/price?names={item}&location=Lymhurst&max_age=30',
+        ])
+
+    return targets
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(port: int, process: subprocess.Popen) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('The service exited while starting')
+        try:
+            reader, writer = await asyncio.open_connection(HOST, port)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        try:
+            await http_get(reader, writer, '/metrics')
+            return
+        finally:
+            writer.close()
+
+    raise RuntimeError('The service did not start')
+
+
+async def _client(port: int, targets: List, deadline: float,
+                  results: List) -> None:
+    reader, writer = await asyncio.open_connection(HOST, port)
+    etags = {}
+    try:
+        while time.monotonic() < deadline:
+            target = random.choice(targets)
+            headers = {}
+            if target in etags:
+                headers['If-None-Match'] = etags[target]
+            start = time.perf_counter()
+            status, res_headers, _ = await http_get(
+                reader, writer, target, headers
+            )
+            results.append((
+                urlsplit(target).path, status, time.perf_counter() - start
+            ))
+            if 'etag' in res_headers:
+                etags[target] = res_headers['etag']
+    finally:
+        writer.close()
+
+
+def summarize(results: List, duration: float) -> Dict:
+    """Returns the throughput, latency percentiles and status counts."""
+
+    latencies = sorted(x[2] for x in results)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p*len(latencies)))]
+
+    statuses = {}
+    paths = {}
+    for path, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        paths[path] = paths.get(path, 0) + 1
+
+    return {
+        'requests': len(results),
+        'requests_per_second': len(results)/duration,
+        'latency_ms': {
+            'mean': statistics.fmean(latencies)*1000,
+            'p50': percentile(0.50)*1000,
+            'p95': percentile(0.95)*1000,
+            'p99': percentile(0.99)*1000,
+        } if latencies else {},
+        'statuses': statuses,
+        'paths': paths,
+    }
+
+
+async def run(concurrency: int = 32, duration: float = 10,
+              stub_latency: float = 0.05, targets: List = None) -> Dict:
+    """Starts a price stub and the service, then loads the service.
+
+    Parameters
+    ----------
+    concurrency: int
+        Number of clients, each with its own keep-alive connection.
+    duration: float
+        Seconds to send requests for.
+    stub_latency: float
+        Seconds the price stub delays each response by.
+    targets: list
+        Request targets to pick from at random. (default: get_targets())
+
+    Returns
+    -------
+    dictionary
+        summarize's results, plus the number of 'price_api_requests' the
+        service made and its 'service_metrics' in Prometheus format.
+    """
+
+    stub = PriceStub(stub_latency)
+    stub_server = await serve_http(stub.handle, HOST, 0)
+    stub_port = stub_server.sockets[0].getsockname()[1]
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        AO_BIN_PRICE_URL=f'http://{HOST}:{stub_port}/api/v2/stats/prices/',
+        PYTHONPATH=os.pathsep.join(
+            [str(DATA_DIR), os.environ.get('PYTHONPATH', '')]
+        ),
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'ao_bin_utils.ao_bin_service',
+         '--port', str(port)],
+        env=env, stderr=subprocess.DEVNULL,
+    )
+    try:
+        await _wait_ready(port, process)
+
+        results = []
+        start = time.monotonic()
+        await asyncio.gather(*[
+            _client(port, targets or get_targets(), start + duration, results)
+            for _ in range(concurrency)
+        ])
+        res = summarize(results, time.monotonic() - start)
+
+        reader, writer = await asyncio.open_connection(HOST, port)
+        try:
+            _, _, body = await http_get(reader, writer, '/metrics')
+        finally:
+            writer.close()
+    finally:
+        process.terminate()
+        process.wait()
+        stub_server.close()
+
+    res['price_api_requests'] = stub.requests
+    res['service_metrics'] = body.decode()
+
+    return res
+
+
+def main(argv: List = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Load test the query service against a price stub.'
+    )
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument(
+        '--stub-latency', type=float, default=0.05,
+        help='seconds the price stub delays each response by'
+    )
+    parser.add_argument(
+        '--metrics', action='store_true', help="include the service metrics"
+    )
+    args = parser.parse_args(argv)
+
+    res = asyncio.run(run(args.concurrency, args.duration, args.stub_latency))
+    if not args.metrics:
+        del res['service_metrics']
+    print(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import json
+import sys
+from threading import Lock
+from typing import List
+
+from ao_bin_utils.ao_bin_names import NAME_FILE, load_item_names
+
+DEFAULT_LANG = 'EN-US'
+
+
+def load_names(name_file=NAME_FILE) -> List:
+    """Returns the localization entries of a formatted items file.
+
+    Parameters
+    ----------
+    name_file: str
+        Location of the formatted items.json, or of items.txt which only
+        holds EN-US names.
+
+    Returns
+    -------
+    list
+        List of dictionaries with 'UniqueName' and 'LocalizedNames' keys.
+    """
+
+    if name_file.endswith('.txt'):
+        return load_item_names(name_file)
+
+    with open(name_file, encoding='utf8') as json_file:
+        return json.load(json_file)
+
+
+class AoBinLocalization():
+    """Local item names in every language, loaded one language at a time.
+
+    Every unique name gets an item id. A language is a list of local names
+    indexed by item id, built the first time the language is asked for.
+    Names are interned so a name shared by several items or languages is
+    stored once.
+
+    ...
+
+    Attributes
+    ----------
+    _unique_names: list
+        Unique name of each item id.
+    _ids: dictionary
+        Unique name to item id.
+    _columns: dictionary
+        Language to list of local names indexed by item id.
+    _reverse: dictionary
+        Language to local name -> item id dictionary, built on first use.
+
+    Methods
+    -------
+    languages():
+        Returns the languages the name file holds.
+    load(langs):
+        Loads several languages with a single read of the name file.
+    get_local_name(unique_name, lang):
+        Returns an item's local name.
+    get_unique_name(local_name, lang):
+        Returns the unique name of the item with a local name.
+    """
+
+    def __init__(self, name_file=NAME_FILE, names: List = None):
+        """Constructor builds the item ids.
+
+        Parameters
+        ----------
+        name_file: str
+            Location of the formatted items.json or items.txt file.
+        names: list
+            The file's entries if they are already loaded. Their DEFAULT_LANG
+            names are kept so the file isn't read again for it.
+        """
+
+        self._name_file = name_file
+        self._lock = Lock()
+
+        if names is None:
+            names = load_names(name_file)
+
+        self._unique_names = list(dict.fromkeys(
+            sys.intern(x['UniqueName']) for x in names
+        ))
+        self._ids = {x: i for i, x in enumerate(self._unique_names)}
+
+        self._languages = []
+        for x in names:
+            for lang in (x['LocalizedNames'] or {}):
+                if lang not in self._languages:
+                    self._languages.append(lang)
+
+        self._columns = {}
+        self._reverse = {}
+        self._add_columns(names, [DEFAULT_LANG])
+
+    def _add_columns(self, names: List, langs: List) -> None:
+        """Extracts the languages from the file's entries."""
+
+        columns = {lang: [None]*len(self._unique_names) for lang in langs}
+        for x in names:
+            i = self._ids.get(x['UniqueName'])
+            localized = x['LocalizedNames']
+            if i is None or not localized:
+                continue
+            for lang, column in columns.items():
+                local_name = localized.get(lang)
+                if local_name is not None and column[i] is None:
+                    column[i] = sys.intern(local_name)
+
+        self._columns.update(columns)
+
+    def languages(self) -> List:
+        """Returns the languages the name file holds."""
+
+        return list(self._languages)
+
+    def load(self, langs: List) -> None:
+        """Loads several languages with a single read of the name file.
+
+        Parameters
+        ----------
+        langs: list of str
+            Languages to load, e.g. ['DE-DE', 'FR-FR'].
+        """
+
+        for lang in langs:
+            if lang not in self._languages:
+                raise KeyError(lang)
+
+        with self._lock:
+            missing = [x for x in langs if x not in self._columns]
+            if missing:
+                self._add_columns(load_names(self._name_file), missing)
+
+    def _column(self, lang: str) -> List:
+        """Returns the local names of a language, loading it if necessary."""
+
+        column = self._columns.get(lang)
+        if column is None:
+            self.load([lang])
+            column = self._columns[lang]
+
+        return column
+
+    def get_local_name(self, unique_name: str, lang: str = DEFAULT_LANG):
+        """Returns an item's local name.
+
+        Parameters
+        ----------
+        unique_name: str
+            The item's unique name, without enchant level.
+        lang: str
+            Language of the local name. Raises KeyError if the name file
+            doesn't hold it.
+
+        Returns
+        -------
+        string
+            The local name. None if the item or its name isn't found.
+        """
+
+        i = self._ids.get(unique_name)
+        if i is None:
+            return None
+
+        return self._column(lang)[i]
+
+    def get_unique_name(self, local_name: str, lang: str = DEFAULT_LANG):
+        """Returns the unique name of the item with a local name.
+
+        Parameters
+        ----------
+        local_name: str
+            The item's local name.
+        lang: str
+            Language of the local name.
+
+        Returns
+        -------
+        string
+            The unique name of the first item with this local name. None if
+            none are found.
+        """
+
+        column = self._column(lang)
+        reverse = self._reverse.get(lang)
+        if reverse is None:
+            reverse = {}
+            for i, x in enumerate(column):
+                if x is not None:
+                    reverse.setdefault(x, i)
+            self._reverse[lang] = reverse
+
+        i = reverse.get(local_name)
+
+        return self._unique_names[i] if i is not None else None
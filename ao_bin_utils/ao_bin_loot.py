@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+
+import ao_bin_utils.ao_bin_utilities as abu
+from ao_bin_utils.ao_bin_catalog import AoBinCatalog, as_list
+
+
+def parse_amount(amount: str) -> tuple:
+    """Returns the (min, max) of an '@amount' such as '1-3' or '2'."""
+
+    low, _, high = (amount or '1').partition('-')
+    return int(low), int(high or low)
+
+
+def loot_item_name(item: Dict) -> str:
+    """Returns the unique name of a loot Item, with its enchant level."""
+
+    enchant = int(item.get('@enchantmentlevel', 0))
+    return item['@type'] + (f'@{enchant}' if enchant > 0 else '')
+
+
+class AoBinLoot():
+    """Expected drops and drop simulation for the lists in loot.json.
+
+    A Lootlist rolls each of its children independently. An 'AND' does the
+    same, an 'OR' picks one child by '@weight' and a 'LootListReference'
+    rolls another Lootlist. Every node can have a '@chance' to be rolled
+    at all, a chance above 1 is the average number of times it is rolled.
+    Items drop a uniform random '@amount' in their range.
+
+    Lists are compiled once into nested tuples:
+
+        ('item', chance, weight, name, min, max)
+        ('and' or 'or', chance, weight, children)
+        ('ref', chance, weight, name)
+
+    ...
+
+    Attributes
+    ----------
+    _lists: dictionary
+        Loot list name to its compiled node.
+    _expected: dictionary
+        Memoized loot list name to expected drops.
+    missing_references: set
+        Names of referenced loot lists that don't exist.
+
+    Methods
+    -------
+    expected(name):
+        Returns the expected amount of each item dropped by a loot list.
+    compile_all():
+        Computes the expected drops of every loot list.
+    expected_value(name, prices):
+        Returns the expected value of a loot list given item prices.
+    expected_silver(name, location, max_age):
+        Returns the expected value of a loot list at a market.
+    simulate(name, rolls, prices, seed):
+        Rolls a loot list many times with vectorized sampling.
+    """
+
+    def __init__(self, catalog: AoBinCatalog = None):
+        """Constructor compiles every Lootlist in loot.json.
+
+        Parameters
+        ----------
+        catalog: AoBinCatalog object
+            Catalog the loot table is read from. (default: AoBinCatalog())
+        """
+
+        catalog = catalog or AoBinCatalog()
+
+        self._lists = {}
+        for tag, _, record in catalog.get_table('loot').records:
+            if tag == 'Lootlist':
+                self._lists[record['@name']] = self._compile_node(
+                    'AND', record
+                )
+
+        self._expected = {}
+        self.missing_references = set()
+
+    def _compile_node(self, tag: str, node: Dict) -> tuple:
+        """Compiles a loot node and its children into nested tuples."""
+
+        chance = float(node.get('@chance', 1))
+        weight = float(node.get('@weight', 1))
+
+        if tag == 'Item':
+            low, high = parse_amount(node.get('@amount'))
+            return ('item', chance, weight, loot_item_name(node), low, high)
+
+        if tag == 'LootListReference':
+            return ('ref', chance, weight, node['@name'])
+
+        children = [
+            self._compile_node(child_tag, child)
+            for child_tag, values in node.items() if not child_tag.startswith('@')
+            for child in as_list(values)
+        ]
+        return (tag.lower(), chance, weight, children)
+
+    def _expected_node(self, node: tuple, visiting: List) -> Dict:
+        """Returns the expected drops of a compiled node."""
+
+        kind, chance = node[0], node[1]
+        res = {}
+
+        if kind == 'item':
+            res[node[3]] = (node[4] + node[5])/2
+
+        elif kind == 'ref':
+            res = dict(self._expected_list(node[3], visiting))
+
+        elif kind == 'and':
+            for child in node[3]:
+                for k, v in self._expected_node(child, visiting).items():
+                    res[k] = res.get(k, 0) + v
+
+        else:
+            total_weight = sum(child[2] for child in node[3])
+            if total_weight <= 0:
+                return {}
+            for child in node[3]:
+                child_weight = child[2]/total_weight
+                for k, v in self._expected_node(child, visiting).items():
+                    res[k] = res.get(k, 0) + v*child_weight
+
+        if chance != 1:
+            res = {k: v*chance for k, v in res.items()}
+
+        return res
+
+    def _expected_list(self, name: str, visiting: List) -> Dict:
+        """Returns the memoized expected drops of a loot list.
+
+        Raises ValueError if the list references itself, directly or
+        through other lists.
+        """
+
+        if name in self._expected:
+            return self._expected[name]
+
+        if name not in self._lists:
+            self.missing_references.add(name)
+            return {}
+
+        if name in visiting:
+            cycle = visiting[visiting.index(name):] + [name]
+            raise ValueError(f"Loot list cycle: {' -> '.join(cycle)}")
+
+        visiting.append(name)
+        res = self._expected_node(self._lists[name], visiting)
+        visiting.pop()
+
+        self._expected[name] = res
+        return res
+
+    def expected(self, name: str) -> Dict:
+        """Returns the expected amount of each item dropped by a loot list.
+
+        Parameters
+        ----------
+        name: str
+            The loot list's '@name'.
+
+        Returns
+        -------
+        dictionary
+            Item unique name (with enchant level) to the expected amount
+            dropped per roll of the list.
+        """
+
+        return self._expected_list(name, [])
+
+    def compile_all(self) -> Dict:
+        """Computes the expected drops of every loot list.
+
+        Returns
+        -------
+        dictionary
+            Loot list name to expected drops.
+        """
+
+        for name in self._lists:
+            self._expected_list(name, [])
+
+        return self._expected
+
+    def expected_value(self, name: str, prices: Dict) -> float:
+        """Returns the expected value of a loot list given item prices.
+
+        Parameters
+        ----------
+        name: str
+            The loot list's '@name'.
+        prices: dictionary
+            Item unique name to price. Items without a price count as 0.
+
+        Returns
+        -------
+        float
+            Sum of expected amount times price for every item.
+        """
+
+        return sum(
+            v*prices.get(k, 0) for k, v in self.expected(name).items()
+        )
+
+    def expected_silver(self, name: str, location: str, max_age: int) -> float:
+        """Returns the expected value of a loot list at a market.
+
+        Every item is priced at Normal quality with a single call to
+        get_item_price.
+
+        Parameters
+        ----------
+        name: str
+            The loot list's '@name'.
+        location: str
+            Name of the market whose price should be used.
+        max_age: int
+            Max age of a price in minutes that is acceptable.
+
+        Returns
+        -------
+        float
+            Expected silver per roll of the list.
+        """
+
+        item_names = list(self.expected(name).keys())
+        price_data = abu.get_item_price(
+            item_names, [1]*len(item_names), location, max_age
+        )
+
+        return self.expected_value(name, {x[0]: x[2] for x in price_data})
+
+    def _simulate_node(self, node, rolls, rng, res, visiting) -> None:
+        """Adds the drops of a node for every roll index in rolls."""
+
+        kind, chance = node[0], node[1]
+        if chance > 1:
+            # A chance above 1 rolls the node that many times on average,
+            # repeated rolls show up as repeated indices
+            repeats, chance = divmod(chance, 1)
+            counts = int(repeats) + (rng.random(rolls.shape[0]) < chance)
+            rolls = np.repeat(rolls, counts)
+        elif chance < 1:
+            rolls = rolls[rng.random(rolls.shape[0]) < chance]
+        if rolls.shape[0] == 0:
+            return
+
+        if kind == 'item':
+            amounts = rng.integers(node[4], node[5] + 1, rolls.shape[0])
+            name = node[3]
+            res['drops'][name] = res['drops'].get(name, 0) + amounts.sum()
+            price = res['prices'].get(name, 0)
+            if price:
+                np.add.at(res['values'], rolls, amounts*price)
+
+        elif kind == 'ref':
+            name = node[3]
+            if name not in self._lists:
+                self.missing_references.add(name)
+                return
+            if name in visiting:
+                cycle = visiting[visiting.index(name):] + [name]
+                raise ValueError(f"Loot list cycle: {' -> '.join(cycle)}")
+            visiting.append(name)
+            self._simulate_node(self._lists[name], rolls, rng, res, visiting)
+            visiting.pop()
+
+        elif kind == 'and':
+            for child in node[3]:
+                self._simulate_node(child, rolls, rng, res, visiting)
+
+        else:
+            weights = np.array([child[2] for child in node[3]], dtype=float)
+            if weights.sum() <= 0:
+                return
+            choice = rng.choice(
+                len(weights), size=rolls.shape[0], p=weights/weights.sum()
+            )
+            # Group the rolls by chosen child with one sort
+            order = np.argsort(choice, kind='stable')
+            bounds = np.cumsum(np.bincount(choice, minlength=len(weights)))
+            start = 0
+            for child, end in zip(node[3], bounds):
+                if end > start:
+                    self._simulate_node(
+                        child, rolls[order[start:end]], rng, res, visiting
+                    )
+                start = end
+
+    def simulate(
+            self,
+            name: str,
+            rolls: int,
+            prices: Dict = None,
+            seed=None) -> Dict:
+        """Rolls a loot list many times with vectorized sampling.
+
+        Each node is sampled once for all of the rolls that reach it, so
+        the cost depends on the size of the list rather than the number
+        of rolls.
+
+        Parameters
+        ----------
+        name: str
+            The loot list's '@name'.
+        rolls: int
+            The number of times to roll the list.
+        prices: dictionary
+            Item unique name to price, used for the value of each roll.
+            (default: None)
+        seed: int
+            Seed for the random generator. (default: None)
+
+        Returns
+        -------
+        dictionary
+            'drops': Item unique name to the mean amount dropped per roll.
+            Items that never dropped are not included.
+            'values': Array with the value of each roll. All zeros if no
+            prices are passed in.
+        """
+
+        rng = np.random.default_rng(seed)
+        res = {
+            'drops': {},
+            'values': np.zeros(rolls),
+            'prices': prices or {},
+        }
+        self._simulate_node(
+            ('ref', 1, 1, name), np.arange(rolls), rng, res, []
+        )
+
+        return {
+            'drops': {k: v/rolls for k, v in res['drops'].items()},
+            'values': res['values'],
+        }
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import functools
+import math
+import os
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from typing import Dict
+
+# Upper bounds in seconds, the last bucket is +Inf
+LATENCY_BUCKETS = (
+    0.00001, 0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0,
+    math.inf,
+)
+
+
+def _label_key(labels: Dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    labels = key + extra
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == math.inf else repr(bound)
+
+
+class AoBinMetrics():
+    """Counters and latency histograms for lookups and API calls.
+
+    Recording is off unless the AO_BIN_METRICS environment variable is set
+    or enable() is called. While off, instrumented code only checks the
+    enabled flag.
+
+    ...
+
+    Attributes
+    ----------
+    enabled: bool
+        If false, nothing is recorded.
+    _counters: dictionary
+        Name to label key to value.
+    _histograms: dictionary
+        Name to label key to [bucket counts, sum, count].
+
+    Methods
+    -------
+    enable(), disable(), reset():
+        Turns recording on or off, or clears what was recorded.
+    inc(name, value, **labels):
+        Adds value to a counter.
+    observe(name, value, **labels):
+        Adds a value to a histogram.
+    timer(name, **labels):
+        Context manager observing the time spent in its block.
+    to_json():
+        Returns everything recorded as a dictionary.
+    to_prometheus():
+        Returns everything recorded in Prometheus text format.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Adds value to a counter, if enabled."""
+
+        if not self.enabled:
+            return
+
+        key = _label_key(labels)
+        with self._lock:
+            counter = self._counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Adds a value to a histogram with LATENCY_BUCKETS, if enabled."""
+
+        if not self.enabled:
+            return
+
+        key = _label_key(labels)
+        i = bisect_left(LATENCY_BUCKETS, value)
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {})
+            if key not in histogram:
+                histogram[key] = [[0]*len(LATENCY_BUCKETS), 0.0, 0]
+            buckets = histogram[key]
+            buckets[0][i] += 1
+            buckets[1] += value
+            buckets[2] += 1
+
+    def timer(self, name: str, **labels) -> _Timer:
+        """Context manager observing the time spent in its block."""
+
+        return _Timer(self, name, labels)
+
+    def to_json(self) -> Dict:
+        """Returns everything recorded as a dictionary.
+
+        Returns
+        -------
+        dictionary
+            'counters': name to list of {'labels', 'value'}.
+            'histograms': name to list of {'labels', 'buckets', 'sum',
+            'count'} where buckets are the non-cumulative counts for each
+            of LATENCY_BUCKETS.
+        """
+
+        with self._lock:
+            return {
+                'counters': {
+                    name: [
+                        {'labels': dict(key), 'value': value}
+                        for key, value in values.items()
+                    ]
+                    for name, values in self._counters.items()
+                },
+                'histograms': {
+                    name: [
+                        {
+                            'labels': dict(key),
+                            'buckets': list(buckets),
+                            'sum': total,
+                            'count': count,
+                        }
+                        for key, (buckets, total, count) in values.items()
+                    ]
+                    for name, values in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """Returns everything recorded in Prometheus text format."""
+
+        lines = []
+        with self._lock:
+            for name, values in sorted(self._counters.items()):
+                lines.append(f'# TYPE {name} counter')
+                for key, value in values.items():
+                    lines.append(f'{name}{_format_labels(key)} {value}')
+
+            for name, values in sorted(self._histograms.items()):
+                lines.append(f'# TYPE {name} histogram')
+                for key, (buckets, total, count) in values.items():
+                    cumulative = 0
+                    for bound, n in zip(LATENCY_BUCKETS, buckets):
+                        cumulative += n
+                        le = (('le', _format_bound(bound)),)
+                        lines.append(
+                            f'{name}_bucket{_format_labels(key, le)} '
+                            f'{cumulative}'
+                        )
+                    lines.append(f'{name}_sum{_format_labels(key)} {total}')
+                    lines.append(f'{name}_count{_format_labels(key)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class _Timer():
+    """Context manager returned by AoBinMetrics.timer."""
+
+    __slots__ = ('_metrics', '_name', '_labels', '_start')
+
+    def __init__(self, metrics: AoBinMetrics, name: str, labels: Dict):
+        self._metrics = metrics
+        self._name = name
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe(
+            self._name, perf_counter() - self._start, **self._labels
+        )
+        return False
+
+
+METRICS = AoBinMetrics(enabled=bool(os.environ.get('AO_BIN_METRICS')))
+
+
+def timed(name: str, **labels):
+    """Decorator observing each call's run time in the METRICS histogram.
+
+    Parameters
+    ----------
+    name: str
+        Name of the histogram, e.g. 'ao_bin_lookup_seconds'.
+    labels:
+        Labels of the histogram, e.g. method='get_item'.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe(name, perf_counter() - start, **labels)
+
+        return wrapper
+
+    return decorator
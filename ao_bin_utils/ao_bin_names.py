@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Tuple
+
+NAME_FILE = os.path.join(
+    os.path.dirname(__file__), '..', 'formatted', 'items.txt'
+)
+
+# Lines look like '   2: T3_2H_TOOL_TRACKING<padding> : Journeyman's...'
+# The index column widens past 9999, the name column is fixed.
+INDEX_SEPARATOR = b': '
+NAME_WIDTH = 65
+NAME_SEPARATOR = b' : '
+
+
+def read_item_names(name_file=NAME_FILE) -> List[Tuple[int, str, str]]:
+    """Parses the formatted items.txt dump in one pass.
+
+    Columns are sliced at fixed offsets, only the index column's width is
+    found per line. Names that overflow their column fall back to a split
+    on the separator.
+
+    Parameters
+    ----------
+    name_file: str
+        Location of the items.txt file.
+
+    Returns
+    -------
+    list
+        List of (index, unique_name, local_name) tuples in file order.
+        local_name is None if the item has no localized name.
+    """
+
+    with open(name_file, 'rb') as f:
+        data = f.read()
+
+    res = []
+    for line in data.splitlines():
+        colon = line.find(INDEX_SEPARATOR)
+        if colon < 0:
+            continue
+
+        start = colon + len(INDEX_SEPARATOR)
+        end = start + NAME_WIDTH
+        if line[end:end + len(NAME_SEPARATOR)] == NAME_SEPARATOR:
+            unique_name = line[start:end]
+            local_name = line[end + len(NAME_SEPARATOR):]
+        else:
+            unique_name, _, local_name = line[start:].partition(
+                NAME_SEPARATOR
+            )
+
+        res.append((
+            int(line[:colon]),
+            unique_name.rstrip().decode('utf8'),
+            local_name.strip().decode('utf8') or None,
+        ))
+
+    return res
+
+
+def load_item_names(name_file=NAME_FILE) -> List[Dict]:
+    """Returns items.txt in the shape of the formatted items.json.
+
+    Only the fields AoBinData uses are filled, with EN-US as the only
+    language.
+
+    Parameters
+    ----------
+    name_file: str
+        Location of the items.txt file.
+
+    Returns
+    -------
+    list
+        List of dictionaries with 'Index', 'UniqueName' and
+        'LocalizedNames' keys. 'LocalizedNames' is None if the item has
+        no localized name.
+    """
+
+    return [
+        {
+            'Index': str(index),
+            'UniqueName': unique_name,
+            'LocalizedNames': (
+                {'EN-US': local_name} if local_name is not None else None
+            ),
+        }
+        for index, unique_name, local_name in read_item_names(name_file)
+    ]
+
+
+def get_name_maps(name_file=NAME_FILE) -> Tuple[Dict, Dict]:
+    """Returns the unique to local and local to unique name maps.
+
+    Parameters
+    ----------
+    name_file: str
+        Location of the items.txt file.
+
+    Returns
+    -------
+    tuple
+        (unique_to_local, local_to_unique) dictionaries. Items without a
+        localized name are left out. If several items share a local name
+        the first one in the file is kept.
+    """
+
+    unique_to_local = {}
+    local_to_unique = {}
+    for _, unique_name, local_name in read_item_names(name_file):
+        if local_name is not None:
+            unique_to_local[unique_name] = local_name
+            local_to_unique.setdefault(local_name, unique_name)
+
+    return unique_to_local, local_to_unique
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+
+from ao_bin_utils.ao_bin_catalog import AoBinCatalog, as_list
+
+
+def _unwrap(value, scalar: bool):
+    """Returns a NumPy result as a Python number if the input was one."""
+
+    return value.item() if scalar else value
+
+
+class AoBinProgression():
+    """Fame and level lookups for the tables in progressiontables.json.
+
+    Each table lists, per '@level', the total '@points' (fame) needed to
+    reach the level and the '@seasonpoints' awarded for reaching it. The
+    tables are compiled once into NumPy arrays, with level 0 at 0 fame
+    prepended:
+
+        levels: the levels in increasing order
+        points: total fame needed to reach each level
+        season_points: total season points awarded up to each level
+
+    Every lookup is then a binary search over a table's arrays. Fame and
+    level arguments can be numbers or arrays, so a batch of players is
+    looked up with a single call, and the result has the same shape.
+
+    ...
+
+    Attributes
+    ----------
+    _tables: dictionary
+        Table '@uniquename' to its (levels, points, season_points) arrays.
+
+    Methods
+    -------
+    tables():
+        Returns the names of every progression table.
+    max_level(name):
+        Returns the highest level of a table.
+    level(name, fame):
+        Returns the level reached with an amount of fame.
+    fame_for_level(name, level):
+        Returns the total fame needed to reach a level.
+    fame_to_level(name, fame, level):
+        Returns the fame still needed to reach a level.
+    hours_to_level(name, fame, level, fame_per_hour):
+        Returns the hours needed to reach a level at a fame rate.
+    season_points(name, fame):
+        Returns the season points awarded up to the level reached.
+    """
+
+    def __init__(self, catalog: AoBinCatalog = None):
+        """Constructor compiles every table in progressiontables.json.
+
+        Parameters
+        ----------
+        catalog: AoBinCatalog object
+            Catalog the progression tables are read from.
+            (default: AoBinCatalog())
+
+        Raises ValueError if a table's fame decreases from one level to the
+        next.
+        """
+
+        catalog = catalog or AoBinCatalog()
+
+        self._tables = {}
+        for tag, _, record in catalog.get_table('progressiontables').records:
+            if tag == 'table':
+                self._tables[record['@uniquename']] = self._compile_table(
+                    record
+                )
+
+    @staticmethod
+    def _compile_table(record) -> tuple:
+        """Compiles a table's progression into sorted NumPy arrays."""
+
+        rows = sorted(
+            (
+                int(x['@level']),
+                int(x.get('@points', 0)),
+                int(x.get('@seasonpoints', 0)),
+            )
+            for x in as_list(record.get('progression'))
+        )
+        if not rows or rows[0][0] > 0:
+            rows.insert(0, (0, 0, 0))
+        levels, points, season_points = (
+            np.array(x, dtype=np.int64) for x in zip(*rows)
+        )
+
+        if (np.diff(points) < 0).any():
+            raise ValueError(
+                f"Progression table {record['@uniquename']} needs less fame "
+                "for a higher level"
+            )
+
+        return levels, points, np.cumsum(season_points)
+
+    def _get(self, name: str) -> tuple:
+        try:
+            return self._tables[name]
+        except KeyError:
+            raise KeyError(f"No progression table {name}") from None
+
+    def _index(self, name: str, level) -> np.ndarray:
+        """Returns the array index of each level of a table."""
+
+        levels = self._get(name)[0]
+        level = np.asarray(level)
+        index = levels.searchsorted(level)
+        if (
+            (index >= levels.shape[0]).any()
+            or (levels[np.minimum(index, levels.shape[0] - 1)] != level).any()
+        ):
+            raise ValueError(f"Level out of range for {name}")
+
+        return index
+
+    def tables(self) -> List:
+        """Returns the names of every progression table."""
+
+        return list(self._tables)
+
+    def max_level(self, name: str) -> int:
+        """Returns the highest level of a table."""
+
+        return int(self._get(name)[0][-1])
+
+    def level(self, name: str, fame):
+        """Returns the level reached with an amount of fame.
+
+        Parameters
+        ----------
+        name: str
+            The table's '@uniquename', e.g. 'PROGRESSION_PVE'.
+        fame: int or array
+            Total fame of one or more players.
+
+        Returns
+        -------
+        int or array
+            The highest level whose fame is at most fame, 0 below level 1.
+        """
+
+        levels, points, _ = self._get(name)
+        index = points.searchsorted(fame, 'right') - 1
+
+        return _unwrap(levels[np.maximum(index, 0)], np.ndim(fame) == 0)
+
+    def fame_for_level(self, name: str, level):
+        """Returns the total fame needed to reach a level.
+
+        Parameters
+        ----------
+        name: str
+            The table's '@uniquename'.
+        level: int or array
+            One or more levels. Raises ValueError if one isn't in the
+            table.
+
+        Returns
+        -------
+        int or array
+            Total fame needed for each level.
+        """
+
+        points = self._get(name)[1]
+
+        return _unwrap(points[self._index(name, level)], np.ndim(level) == 0)
+
+    def fame_to_level(self, name: str, fame, level):
+        """Returns the fame still needed to reach a level.
+
+        Parameters
+        ----------
+        name: str
+            The table's '@uniquename'.
+        fame: int or array
+            Total fame of one or more players.
+        level: int or array
+            Target level, the same for every player or one per player.
+
+        Returns
+        -------
+        int or array
+            Fame needed for each player, 0 if already reached.
+        """
+
+        points = self._get(name)[1]
+        res = np.maximum(points[self._index(name, level)] - fame, 0)
+
+        return _unwrap(res, np.ndim(res) == 0)
+
+    def hours_to_level(self, name: str, fame, level, fame_per_hour):
+        """Returns the hours needed to reach a level at a fame rate.
+
+        Parameters
+        ----------
+        name: str
+            The table's '@uniquename'.
+        fame: int or array
+            Total fame of one or more players.
+        level: int or array
+            Target level, the same for every player or one per player.
+        fame_per_hour: float or array
+            Fame earned per hour, the same for every player or one per
+            player.
+
+        Returns
+        -------
+        float or array
+            Hours needed for each player. 0 if the level is already
+            reached, inf if it isn't and the rate isn't positive.
+        """
+
+        needed = np.asarray(
+            self.fame_to_level(name, fame, level), dtype=np.float64
+        )
+        rate = np.asarray(fame_per_hour, dtype=np.float64)
+        res = np.full(np.broadcast(needed, rate).shape, np.inf)
+        np.divide(needed, rate, out=res, where=rate > 0)
+        res[np.broadcast_to(needed, res.shape) == 0] = 0
+
+        return _unwrap(res, np.ndim(res) == 0)
+
+    def season_points(self, name: str, fame):
+        """Returns the season points awarded up to the level reached.
+
+        Parameters
+        ----------
+        name: str
+            The table's '@uniquename'.
+        fame: int or array
+            Total fame of one or more players.
+
+        Returns
+        -------
+        int or array
+            Sum of the '@seasonpoints' of every level reached.
+        """
+
+        _, points, season_points = self._get(name)
+        index = points.searchsorted(fame, 'right') - 1
+
+        return _unwrap(
+            season_points[np.maximum(index, 0)], np.ndim(fame) == 0
+        )
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import logging
+import os
+from threading import Event, Lock, Thread
+from typing import List
+
+from ao_bin_utils.ao_bin_data import AoBinData
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(files: List) -> tuple:
+    """Returns the (mtime, size) of each file, None for missing files."""
+
+    res = []
+    for fp in files:
+        try:
+            stat = os.stat(fp)
+        except OSError:
+            res.append(None)
+        else:
+            res.append((stat.st_mtime_ns, stat.st_size))
+
+    return tuple(res)
+
+
+class AoBinDataReloader():
+    """Reloads AoBinData when its data files change.
+
+    Each load builds a new AoBinData which is never modified afterwards.
+    It then replaces the current one with a single reference assignment, so
+    readers don't lock. A reader that keeps the AoBinData it got from data
+    sees the same data until it asks again. The AoBinData singleton is
+    replaced too, so AoBinData() returns the latest data.
+
+    If a load fails, e.g. because a new dump is only partly written, the
+    current data is kept and the files are loaded again once they change.
+
+    ...
+
+    Attributes
+    ----------
+    data: AoBinData object
+        The latest loaded data.
+    version: int
+        Incremented on every reload. Caches built from data can keep the
+        version they were built for and rebuild when it changes.
+    interval: float
+        Seconds between polls of the data files' mtimes.
+
+    Methods
+    -------
+    check():
+        Reloads the data if its files changed since the last load.
+    reload():
+        Loads the data files and swaps in the new data.
+    start():
+        Starts polling the data files in a background thread.
+    stop():
+        Stops the polling thread.
+    """
+
+    def __init__(self, interval: float = 5.0, data: AoBinData = None,
+                 **kwargs):
+        """Constructor takes the current data, loading it if necessary.
+
+        Parameters
+        ----------
+        interval: float
+            Seconds between polls of the data files' mtimes.
+        data: AoBinData object
+            The current data. (default: the AoBinData singleton)
+        kwargs:
+            Arguments AoBinData is built with on a reload.
+        """
+
+        self.interval = interval
+        self._kwargs = kwargs
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+        self._data = data if data is not None else AoBinData(**kwargs)
+        self._signature = file_signature(self._data.data_files)
+
+    @property
+    def data(self) -> AoBinData:
+        return self._data
+
+    @property
+    def version(self) -> int:
+        return self._data.version
+
+    def check(self) -> bool:
+        """Reloads the data if its files changed since the last load.
+
+        Returns
+        -------
+        boolean
+            True if new data was swapped in.
+        """
+
+        if file_signature(self._data.data_files) == self._signature:
+            return False
+
+        return self.reload() is not None
+
+    def reload(self) -> AoBinData:
+        """Loads the data files and swaps in the new data.
+
+        Only one reload runs at a time. Readers keep using the current data
+        while the new data is built.
+
+        Returns
+        -------
+        AoBinData object
+            The new data, None if loading failed.
+        """
+
+        with self._lock:
+            signature = file_signature(self._data.data_files)
+            try:
+                data = AoBinData.__new__(AoBinData)
+                data.__init__(**self._kwargs)
+            except Exception:
+                logger.exception("Failed to reload AoBin data")
+                self._signature = signature
+                return None
+
+            data.version = self._data.version + 1
+            self._signature = signature
+            self._data = data
+            AoBinData.replace_instance(data)
+
+        logger.info("Reloaded AoBin data, version %d", data.version)
+
+        return data
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self) -> None:
+        """Starts polling the data files in a background thread."""
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = Thread(
+            target=self._poll, name='AoBinDataReloader', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the polling thread."""
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,420 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+
+from ao_bin_utils.ao_bin_catalog import AoBinCatalog, as_list
+from ao_bin_utils.ao_bin_item_id import MAX_TIER
+
+DEFAULT_DISTRIBUTION = 'DEFAULT'
+DENSITIES = ('high', 'medium', 'low')
+PRESET_FILTERS = {
+    'tier': '@tier',
+    'biome': '@biome',
+    'continent': '@continent',
+    'cluster_type': '@type',
+    'cluster_quality': '@clusterquality',
+}
+
+
+def preset_distribution(preset: Dict) -> str:
+    """Returns the rare resource distribution a preset spawns with.
+
+    Outlands presets have a '@clusterquality' such as 'Q3' which selects
+    the 'OUT_Q3' distribution. Other presets get theirs from the cluster
+    they are used in, e.g. its zone color or Mists difficulty, and fall
+    back to DEFAULT_DISTRIBUTION.
+    """
+
+    quality = preset.get('@clusterquality')
+
+    return f'OUT_{quality}' if quality else DEFAULT_DISTRIBUTION
+
+
+class AoBinResources():
+    """Resource node counts and enchant odds joined across three tables.
+
+    resourcedistpresets.json gives the number of nodes of each resource
+    and tier a cluster preset spawns, rareresourcedistribution.json the
+    weights of each enchant level ('RareState') by tier, and
+    harvestables.json which tiers of a resource can be enchanted at all.
+    A node whose harvestable has no RareState for the rolled state stays
+    unenchanted.
+
+    The join is computed once into dense arrays, indexed by preset,
+    resource, tier and state:
+
+        _amounts[P, R, T]: nodes spawned by each preset
+        _probs[D, R, T, S]: odds of each state under each distribution
+        _cdf[D, R, T, S]: cumulative _probs, for sampling
+        _expected[P, R, T, S]: expected nodes of each state per preset
+
+    so queries are array indexing and reductions, and can be asked for
+    many presets or tiers at once.
+
+    ...
+
+    Attributes
+    ----------
+    resources: list
+        Resource names as used by the presets, e.g. 'wood'.
+    distributions: list
+        Rare resource distribution names.
+    presets: list
+        Preset names.
+    _attributes: dictionary
+        Preset attribute, e.g. '@biome', to an array of each preset's value.
+    _items: dictionary
+        (resource, tier, state) to the harvested item's unique name.
+
+    Methods
+    -------
+    find_presets(**filters):
+        Returns the indexes of the presets matching every filter.
+    expected_nodes(resource, tier, presets, distribution):
+        Returns the expected nodes of each enchant state per preset.
+    expected_by_biome(resource, tier, min_state, distribution, **filters):
+        Returns the expected enchanted nodes per cluster of each biome.
+    sample_states(distribution, resource, tier, size, seed):
+        Draws the enchant state of individual nodes.
+    sample_nodes(preset, resource, tier, runs, distribution, seed):
+        Draws the number of nodes of each state a preset spawns.
+    item_name(resource, tier, state):
+        Returns the unique name of the item a node yields.
+    """
+
+    def __init__(self, catalog: AoBinCatalog = None):
+        """Constructor joins the three tables.
+
+        Parameters
+        ----------
+        catalog: AoBinCatalog object
+            Catalog the tables are read from. (default: AoBinCatalog())
+        """
+
+        catalog = catalog or AoBinCatalog()
+
+        harvestables = [
+            record
+            for tag, _, record in catalog.get_table('harvestables').records
+            if tag == 'Harvestable'
+            and record.get('@name') == record.get('@resource')
+        ]
+        presets = [
+            record
+            for tag, _, record in catalog.get_table(
+                'resourcedistpresets'
+            ).records
+            if tag == 'preset'
+        ]
+        distributions = [
+            record
+            for tag, _, record in catalog.get_table(
+                'rareresourcedistribution'
+            ).records
+            if tag == 'RareResourceDistribution'
+        ]
+
+        self.resources = [x['@resource'].lower() for x in harvestables]
+        self.distributions = [x['@name'] for x in distributions]
+        self.presets = [x['@name'] for x in presets]
+
+        resource_index = {x: i for i, x in enumerate(self.resources)}
+        n_tiers = MAX_TIER + 1
+
+        # Enchant state weights by distribution and tier
+        weights = {}
+        n_states = 1
+        for d, record in enumerate(distributions):
+            for tier in as_list(record.get('Tier')):
+                row = {
+                    int(x['@state']): float(x['@weight'])
+                    for x in as_list(tier.get('RareState'))
+                }
+                n_states = max([n_states] + [x + 1 for x in row])
+                weights[d, tier.get('@value')] = row
+
+        dist_weights = np.zeros((len(distributions), n_tiers, n_states))
+        for d in range(len(distributions)):
+            for t in range(n_tiers):
+                row = weights.get((d, str(t)), weights.get((d, None), {}))
+                for state, weight in row.items():
+                    dist_weights[d, t, state] = weight
+
+        # States each resource tier can be harvested in
+        self._items = {}
+        enchantable = np.zeros(
+            (len(self.resources), n_tiers, n_states), dtype=bool
+        )
+        enchantable[:, :, 0] = True
+        for r, record in enumerate(harvestables):
+            for tier in as_list(record.get('Tier')):
+                t = int(tier['@tier'])
+                self._items[self.resources[r], t, 0] = tier.get('@item')
+                for x in as_list(tier.get('RareState')):
+                    state = int(x['@state'])
+                    if state < n_states:
+                        enchantable[r, t, state] = True
+                        self._items[self.resources[r], t, state] = x.get(
+                            '@item'
+                        )
+
+        # States a resource can't be harvested in fall back to unenchanted
+        probs = dist_weights[:, None, :, :]*enchantable[None]
+        probs[..., 0] += (
+            dist_weights[:, None, :, :]*~enchantable[None]
+        ).sum(axis=-1)
+        totals = probs.sum(axis=-1, keepdims=True)
+        probs = np.divide(
+            probs, totals, out=np.zeros_like(probs), where=totals > 0
+        )
+        probs[..., 0][totals[..., 0] == 0] = 1
+        self._probs = probs
+        self._cdf = np.cumsum(probs, axis=-1)
+
+        # Nodes spawned by each preset, over every density
+        self._amounts = np.zeros((len(presets), len(self.resources), n_tiers))
+        for p, record in enumerate(presets):
+            for density in DENSITIES:
+                nodes = record.get(density)
+                if not isinstance(nodes, dict):
+                    continue
+                for resource, values in nodes.items():
+                    r = resource_index.get(resource)
+                    if r is None:
+                        continue
+                    for x in as_list(values):
+                        self._amounts[p, r, int(x['@tier'])] += float(
+                            x['@amount']
+                        )
+
+        self._attributes = {
+            key: np.array([x.get(key, '') for x in presets])
+            for key in PRESET_FILTERS.values()
+        }
+        self._distribution_index = {
+            x: i for i, x in enumerate(self.distributions)
+        }
+        self._preset_distributions = np.array([
+            self._distribution_index.get(
+                preset_distribution(x),
+                self._distribution_index.get(DEFAULT_DISTRIBUTION, 0)
+            )
+            for x in presets
+        ], dtype=np.int32)
+        self._expected = self._amounts[..., None]*self._probs[
+            self._preset_distributions
+        ]
+
+    def _resource(self, resource: str) -> int:
+        try:
+            return self.resources.index(resource.lower())
+        except ValueError:
+            raise KeyError(f"No harvestable resource {resource}") from None
+
+    def _distribution(self, distribution: str) -> int:
+        try:
+            return self._distribution_index[distribution]
+        except KeyError:
+            raise KeyError(
+                f"No rare resource distribution {distribution}"
+            ) from None
+
+    def find_presets(self, **filters) -> np.ndarray:
+        """Returns the indexes of the presets matching every filter.
+
+        Parameters
+        ----------
+        filters:
+            Any of tier, biome, continent, cluster_type and cluster_quality,
+            e.g. biome='Forest', tier=5. A value can also be a list of
+            values to match any of.
+
+        Returns
+        -------
+        numpy array
+            Indexes into presets.
+        """
+
+        mask = np.ones(len(self.presets), dtype=bool)
+        for name, value in filters.items():
+            if value is None:
+                continue
+            values = [str(x) for x in as_list(value)]
+            mask &= np.isin(self._attributes[PRESET_FILTERS[name]], values)
+
+        return np.flatnonzero(mask)
+
+    def expected_nodes(
+            self,
+            resource: str,
+            tier,
+            presets=None,
+            distribution: str = None) -> np.ndarray:
+        """Returns the expected nodes of each enchant state per preset.
+
+        Parameters
+        ----------
+        resource: str
+            Resource name, e.g. 'wood' or 'ORE'.
+        tier: int or array
+            Node tier, or one tier per preset.
+        presets: array
+            Preset indexes, e.g. from find_presets. (default: every preset)
+        distribution: str
+            Rare resource distribution to use instead of each preset's
+            own, e.g. 'RED' or 'MISTS_E2'. (default: None)
+
+        Returns
+        -------
+        numpy array
+            (presets, states) array of expected nodes.
+        """
+
+        r = self._resource(resource)
+        if presets is None:
+            presets = np.arange(len(self.presets))
+
+        if distribution is None:
+            return self._expected[presets, r, tier]
+
+        d = self._distribution(distribution)
+        amounts = self._amounts[presets, r, tier]
+
+        return amounts[..., None]*self._probs[d, r, tier]
+
+    def expected_by_biome(
+            self,
+            resource: str,
+            tier: int,
+            min_state: int = 1,
+            distribution: str = None,
+            **filters) -> Dict:
+        """Returns the expected enchanted nodes per cluster of each biome.
+
+        Parameters
+        ----------
+        resource: str
+            Resource name, e.g. 'wood'.
+        tier: int
+            Node tier.
+        min_state: int
+            Lowest enchant state counted. (default: 1)
+        distribution: str
+            See expected_nodes. (default: each preset's own)
+        filters:
+            Preset filters, see find_presets, e.g. continent='Outlands'.
+
+        Returns
+        -------
+        dictionary
+            Biome to expected nodes with a state of at least min_state,
+            averaged over the biome's matching presets.
+        """
+
+        presets = self.find_presets(**filters)
+        if presets.shape[0] == 0:
+            return {}
+
+        nodes = self.expected_nodes(
+            resource, tier, presets, distribution
+        )[:, min_state:].sum(axis=1)
+        biomes, index = np.unique(
+            self._attributes['@biome'][presets], return_inverse=True
+        )
+        totals = np.bincount(index, weights=nodes, minlength=len(biomes))
+        counts = np.bincount(index, minlength=len(biomes))
+
+        return {
+            biome: total/count
+            for biome, total, count in zip(
+                biomes.tolist(), totals.tolist(), counts.tolist()
+            )
+        }
+
+    def sample_states(
+            self,
+            distribution: str,
+            resource: str,
+            tier: int,
+            size: int,
+            seed=None) -> np.ndarray:
+        """Draws the enchant state of individual nodes.
+
+        Parameters
+        ----------
+        distribution: str
+            Rare resource distribution, e.g. 'OUT_Q1'.
+        resource: str
+            Resource name, e.g. 'wood'.
+        tier: int
+            Node tier.
+        size: int
+            Number of nodes.
+        seed: int or numpy Generator
+            Seed for the random generator. (default: None)
+
+        Returns
+        -------
+        numpy array
+            The state of each node.
+        """
+
+        rng = np.random.default_rng(seed)
+        cdf = self._cdf[
+            self._distribution(distribution), self._resource(resource), tier
+        ]
+
+        return np.minimum(
+            cdf.searchsorted(rng.random(size), 'right'), cdf.shape[0] - 1
+        )
+
+    def sample_nodes(
+            self,
+            preset,
+            resource: str,
+            tier: int,
+            runs: int,
+            distribution: str = None,
+            seed=None) -> np.ndarray:
+        """Draws the number of nodes of each state a preset spawns.
+
+        Parameters
+        ----------
+        preset: str or int
+            Preset name or index.
+        resource: str
+            Resource name, e.g. 'wood'.
+        tier: int
+            Node tier.
+        runs: int
+            Number of times the preset is spawned.
+        distribution: str
+            See expected_nodes. (default: the preset's own)
+        seed: int or numpy Generator
+            Seed for the random generator. (default: None)
+
+        Returns
+        -------
+        numpy array
+            (runs, states) array of node counts.
+        """
+
+        rng = np.random.default_rng(seed)
+        p = self.presets.index(preset) if isinstance(preset, str) else preset
+        r = self._resource(resource)
+        d = (
+            self._preset_distributions[p] if distribution is None
+            else self._distribution(distribution)
+        )
+
+        return rng.multinomial(
+            int(round(self._amounts[p, r, tier])), self._probs[d, r, tier],
+            size=runs
+        )
+
+    def item_name(self, resource: str, tier: int, state: int = 0) -> str:
+        """Returns the unique name of the item a node yields, or None."""
+
+        return self._items.get((resource.lower(), tier, state))
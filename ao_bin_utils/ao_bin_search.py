@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from ao_bin_utils.ao_bin_catalog import AoBinCatalog, AoBinTable, load_dump
+from ao_bin_utils.ao_bin_names import NAME_FILE, read_item_names
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR.parent
+WORLD_NAME_FILE = DATA_DIR / 'formatted' / 'world.json'
+SEARCH_FILE = BASE_DIR / 'cache' / 'search_index.npz'
+
+ITEMS_SOURCE = 'items'
+CLUSTERS_SOURCE = 'clusters'
+CAMEL_FINDER = r"(?<=[a-z])(?=[A-Z])"
+TOKEN_FINDER = r"[0-9a-z]+"
+NGRAM = 3
+EXACT_WEIGHT = 2
+PARTIAL_WEIGHT = 1
+
+# Saved array name to AoBinSearch attribute
+CACHED_ARRAYS = {
+    'terms': 'terms',
+    'indptr': 'indptr',
+    'postings': 'postings',
+    'ngrams': '_ngrams',
+    'ngram_indptr': '_ngram_indptr',
+    'ngram_terms': '_ngram_terms',
+    'sources': 'sources',
+    'unique_names': 'unique_names',
+    'local_names': 'local_names',
+    'tags': '_tags',
+    'indexes': '_indexes',
+    'lengths': '_lengths',
+}
+
+
+def fold(text: str) -> str:
+    """Lower cases text and strips its accents and apostrophes.
+
+    e.g. "Adept's Élan" is 'adepts elan'.
+    """
+
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(x for x in text if not unicodedata.combining(x))
+
+    return text.casefold().replace("'", '').replace('\u2019', '')
+
+
+def tokenize(text: str) -> List:
+    """Splits a name or unique name into folded tokens.
+
+    Words are split on anything but letters and digits, and camel case
+    words on their capitals, e.g. 'T4_2H_BloodLetter' is ['t4', '2h',
+    'blood', 'letter'].
+    """
+
+    return re.findall(TOKEN_FINDER, fold(re.sub(CAMEL_FINDER, ' ', text)))
+
+
+def ngrams(token: str) -> set:
+    """Returns the distinct n-grams of a token, empty if it is shorter."""
+
+    return {token[i:i + NGRAM] for i in range(len(token) - NGRAM + 1)}
+
+
+def to_csr(groups: List) -> tuple:
+    """Packs lists of integers into (indptr, values) int32 arrays."""
+
+    indptr = np.zeros(len(groups) + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum([len(x) for x in groups])
+    values = np.fromiter(
+        (x for group in groups for x in group), dtype=np.int32,
+        count=int(indptr[-1])
+    )
+
+    return indptr, values
+
+
+def collect_documents(
+        catalog: AoBinCatalog,
+        name_file=NAME_FILE,
+        world_name_file=WORLD_NAME_FILE) -> List:
+    """Gathers the unique names of every table and their localized names.
+
+    A document is made for each distinct '@uniquename' of a table,
+    including nested ones, addressed by the first record it occurs in. The
+    EN-US names of formatted/items.txt are attached to every document of
+    the same unique name, and the items and clusters that have a localized
+    name are documents of their own under ITEMS_SOURCE and
+    CLUSTERS_SOURCE. Tables are read directly rather than through
+    get_table so the scan does not evict tables that are in use.
+
+    Returns
+    -------
+    list
+        List of [source, unique_name, local_name, tag, index] documents,
+        local_name is '' if there is none, tag '' and index -1 if the
+        document isn't from a table.
+    """
+
+    names = {}
+    if name_file is not None and Path(name_file).exists():
+        for _, unique_name, local_name in read_item_names(name_file):
+            if local_name:
+                names.setdefault(unique_name, local_name)
+
+    cluster_names = {}
+    if world_name_file is not None and Path(world_name_file).exists():
+        with open(world_name_file, encoding='utf8') as f:
+            cluster_names = {x['Index']: x['UniqueName'] for x in json.load(f)}
+
+    res = []
+    seen = set()
+
+    def walk(node, name, tag, i):
+        if isinstance(node, dict):
+            key = node.get('@uniquename')
+            if isinstance(key, str) and (name, key) not in seen:
+                seen.add((name, key))
+                res.append([name, key, names.get(key, ''), tag, i])
+            for v in node.values():
+                if not isinstance(v, str):
+                    walk(v, name, tag, i)
+        elif isinstance(node, list):
+            for x in node:
+                walk(x, name, tag, i)
+
+    for name, fp in catalog._paths.items():
+        table = AoBinTable(name, load_dump(fp))
+        for tag, i, record in table.records:
+            walk(record, name, tag, i)
+
+    for key, local_name in names.items():
+        if (ITEMS_SOURCE, key) not in seen:
+            res.append([ITEMS_SOURCE, key, local_name, '', -1])
+    for key, local_name in cluster_names.items():
+        res.append([CLUSTERS_SOURCE, key, local_name, '', -1])
+
+    return res
+
+
+class AoBinSearch():
+    """Full-text search over unique names and localized names.
+
+    Documents are the unique names of every table and the items and
+    clusters with a localized name, see collect_documents. Both the
+    unique name and the localized name are tokenized and folded, see
+    tokenize, and the index keeps two levels of postings as CSR int32
+    arrays:
+
+        terms: the sorted vocabulary
+        postings: for each term, the sorted documents it occurs in
+        ngram_terms: for each n-gram, the sorted terms containing it
+
+    A query token matches a term exactly, or partially if it occurs
+    within the term. Partial terms are found by intersecting the term
+    lists of the token's n-grams, or by a prefix range of the vocabulary
+    for tokens shorter than an n-gram. Documents are ranked by the number
+    of query tokens they match, then by the weight of the matches, exact
+    ones counting more, and shorter documents first.
+
+    The index is cached to SEARCH_FILE and rebuilt when a table or a name
+    file changes.
+
+    ...
+
+    Attributes
+    ----------
+    sources: numpy array
+        Table, ITEMS_SOURCE or CLUSTERS_SOURCE of each document.
+    unique_names, local_names: numpy array
+        Unique name and localized name, '' if none, of each document.
+    terms: numpy array
+        The sorted vocabulary.
+    _term_ids: dictionary
+        Term to its index in terms.
+
+    Methods
+    -------
+    search(query, limit, sources):
+        Returns the best matching documents.
+    expand(token):
+        Returns the terms a query token matches and whether exactly.
+    """
+
+    def __init__(
+            self,
+            catalog: AoBinCatalog = None,
+            name_file=NAME_FILE,
+            world_name_file=WORLD_NAME_FILE,
+            search_file=SEARCH_FILE):
+        """Constructor loads the cached index or builds it.
+
+        Parameters
+        ----------
+        catalog: AoBinCatalog object
+            Catalog whose tables are indexed. (default: AoBinCatalog())
+        name_file: str or Path
+            Location of formatted/items.txt, None to index no item names.
+        world_name_file: str or Path
+            Location of formatted/world.json, None to index no clusters.
+        search_file: str or Path
+            Location of the cached index, None to not cache it.
+        """
+
+        catalog = catalog or AoBinCatalog()
+
+        signature = catalog._signature()
+        name_files = {
+            'formatted/items': name_file, 'formatted/world': world_name_file
+        }
+        for key, fp in name_files.items():
+            if fp is not None and Path(fp).exists():
+                stat = Path(fp).stat()
+                signature[key] = [stat.st_mtime_ns, stat.st_size]
+        signature = json.dumps(signature, sort_keys=True)
+
+        if not self._load(search_file, signature):
+            self._build(
+                collect_documents(catalog, name_file, world_name_file)
+            )
+            if search_file is not None:
+                self._save(search_file, signature)
+
+        self._term_ids = {x: i for i, x in enumerate(self.terms.tolist())}
+        self._ngram_ids = {x: i for i, x in enumerate(self._ngrams.tolist())}
+        self._n_docs = self.unique_names.shape[0]
+
+    def _build(self, documents: List) -> None:
+        """Tokenizes the documents and builds the postings."""
+
+        term_docs = {}
+        lengths = []
+        for doc, (_, unique_name, local_name, _, _) in enumerate(documents):
+            tokens = set(tokenize(unique_name)) | set(tokenize(local_name))
+            lengths.append(len(tokens))
+            for token in tokens:
+                term_docs.setdefault(token, []).append(doc)
+
+        terms = sorted(term_docs)
+        self.indptr, self.postings = to_csr([term_docs[x] for x in terms])
+
+        ngram_terms = {}
+        for i, term in enumerate(terms):
+            for ngram in ngrams(term):
+                ngram_terms.setdefault(ngram, []).append(i)
+        ngram_keys = sorted(ngram_terms)
+        self._ngram_indptr, self._ngram_terms = to_csr(
+            [ngram_terms[x] for x in ngram_keys]
+        )
+
+        self.terms = np.array(terms, dtype=str)
+        self._ngrams = np.array(ngram_keys, dtype=str)
+        self.sources = np.array([x[0] for x in documents], dtype=str)
+        self.unique_names = np.array([x[1] for x in documents], dtype=str)
+        self.local_names = np.array([x[2] for x in documents], dtype=str)
+        self._tags = np.array([x[3] for x in documents], dtype=str)
+        self._indexes = np.array([x[4] for x in documents], dtype=np.int32)
+        self._lengths = np.array(lengths, dtype=np.int32)
+
+    def _load(self, search_file, signature: str) -> bool:
+        """Loads the cached index, returns false if it is missing or stale."""
+
+        try:
+            with np.load(search_file) as cached:
+                if cached['signature'].item() != signature:
+                    return False
+                for key, attribute in CACHED_ARRAYS.items():
+                    setattr(self, attribute, cached[key])
+        except (OSError, KeyError, ValueError, TypeError):
+            return False
+
+        return True
+
+    def _save(self, search_file, signature: str) -> None:
+        search_file = Path(search_file)
+        search_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(search_file, 'wb') as f:
+            np.savez(
+                f,
+                signature=np.array(signature),
+                **{
+                    key: getattr(self, attribute)
+                    for key, attribute in CACHED_ARRAYS.items()
+                },
+            )
+
+    def _docs(self, term: int) -> np.ndarray:
+        return self.postings[self.indptr[term]:self.indptr[term + 1]]
+
+    def expand(self, token: str) -> tuple:
+        """Returns the terms a query token matches.
+
+        Parameters
+        ----------
+        token: str
+            A folded token, see tokenize.
+
+        Returns
+        -------
+        tuple
+            The index of the term equal to token, None if there is none,
+            and an array of the indexes of the other terms containing it.
+        """
+
+        exact = self._term_ids.get(token)
+
+        if len(token) < NGRAM:
+            # Prefix range of the sorted vocabulary
+            start = self.terms.searchsorted(token)
+            stop = self.terms.searchsorted(token + '\uffff')
+            partial = np.arange(start, stop, dtype=np.int32)
+        else:
+            partial = None
+            for ngram in ngrams(token):
+                i = self._ngram_ids.get(ngram)
+                if i is None:
+                    return exact, np.zeros(0, dtype=np.int32)
+                found = self._ngram_terms[
+                    self._ngram_indptr[i]:self._ngram_indptr[i + 1]
+                ]
+                partial = found if partial is None else np.intersect1d(
+                    partial, found, assume_unique=True
+                )
+            # Sharing every n-gram doesn't make token a substring
+            if len(token) > NGRAM:
+                partial = partial[
+                    [token in x for x in self.terms[partial].tolist()]
+                ]
+
+        if exact is not None:
+            partial = partial[partial != exact]
+
+        return exact, partial
+
+    def search(
+            self,
+            query: str,
+            limit: int = 20,
+            sources: List = None) -> List:
+        """Returns the documents best matching a query.
+
+        Parameters
+        ----------
+        query: str
+            Words to look for, e.g. 'hellion' or "adept's bloodletter".
+        limit: int
+            Maximum number of results. (default: 20)
+        sources: list
+            Table names, ITEMS_SOURCE or CLUSTERS_SOURCE to restrict the
+            results to. (default: every source)
+
+        Returns
+        -------
+        list
+            List of dictionaries, best match first, with keys:
+            'source': str, the table or other source of the document.
+            'unique_name': str
+            'local_name': str, '' if there is none.
+            'address': [table, tag, index] of the first record with the
+            unique name, None if the document isn't from a table.
+            'matched': int, the number of query tokens matched.
+            'score': int, the summed weight of the matches.
+        """
+
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        scores = np.zeros(self._n_docs, dtype=np.int32)
+        matched = np.zeros(self._n_docs, dtype=np.int32)
+        for token in tokens:
+            exact, partial = self.expand(token)
+            best = np.zeros(self._n_docs, dtype=np.int8)
+            if partial.shape[0]:
+                best[np.concatenate([self._docs(x) for x in partial])] = (
+                    PARTIAL_WEIGHT
+                )
+            if exact is not None:
+                best[self._docs(exact)] = EXACT_WEIGHT
+            scores += best
+            matched += best > 0
+
+        if sources is not None:
+            matched[~np.isin(self.sources, sources)] = 0
+
+        docs = np.flatnonzero(matched)
+        order = np.lexsort((
+            docs, self._lengths[docs], -scores[docs], -matched[docs]
+        ))[:limit]
+
+        res = []
+        for doc in docs[order].tolist():
+            index = int(self._indexes[doc])
+            res.append({
+                'source': str(self.sources[doc]),
+                'unique_name': str(self.unique_names[doc]),
+                'local_name': str(self.local_names[doc]),
+                'address': [
+                    str(self.sources[doc]), str(self._tags[doc]), index
+                ] if index >= 0 else None,
+                'matched': int(matched[doc]),
+                'score': int(scores[doc]),
+            })
+
+        return res
@@ -0,0 +1,522 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from threading import Lock
+from typing import Callable, Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+import ao_bin_utils.ao_bin_tools as aot
+import ao_bin_utils.ao_bin_utilities as abu
+from ao_bin_utils.ao_bin_localization import DEFAULT_LANG
+from ao_bin_utils.ao_bin_metrics import METRICS
+from ao_bin_utils.ao_bin_reload import AoBinDataReloader
+
+HOST = '127.0.0.1'
+PORT = 8765
+PRICE_TTL = 60
+MAX_PRICES = 100000
+STATIC_CACHE_SIZE = 4096
+SEPARATORS = (',', ':')
+
+logger = logging.getLogger(__name__)
+
+
+def read_request(line: bytes, header_lines: List) -> tuple:
+    """Parses an HTTP request line and its header lines.
+
+    Returns
+    -------
+    tuple
+        (method, target, version, headers) where headers is a dictionary
+        with lower case names.
+    """
+
+    method, target, version = line.decode('latin1').split()
+    headers = {}
+    for x in header_lines:
+        name, _, value = x.decode('latin1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    return method, target, version, headers
+
+
+async def read_head(reader: asyncio.StreamReader) -> tuple:
+    """Reads a request or status line and its headers, None at EOF."""
+
+    line = await reader.readline()
+    if not line.strip():
+        return None
+
+    header_lines = []
+    while True:
+        x = await reader.readline()
+        if x in (b'\r\n', b'\n', b''):
+            break
+        header_lines.append(x)
+
+    return line, header_lines
+
+
+async def serve_http(handler: Callable, host: str, port: int):
+    """Starts a keep-alive HTTP/1.1 server for GET and HEAD requests.
+
+    Parameters
+    ----------
+    handler: coroutine function
+        Called with (method, target, headers), returns (status, headers,
+        body) where status is an HTTPStatus and body is bytes.
+    host: str
+        Address to listen on.
+    port: int
+        Port to listen on, 0 for any free port.
+
+    Returns
+    -------
+    asyncio Server
+        The started server.
+    """
+
+    async def on_connection(reader, writer):
+        try:
+            while True:
+                head = await read_head(reader)
+                if head is None:
+                    break
+                method, target, version, headers = read_request(*head)
+                length = int(headers.get('content-length', 0))
+                if length:
+                    await reader.readexactly(length)
+
+                status, res_headers, body = await handler(
+                    method, target, headers
+                )
+
+                keep_alive = (
+                    version == 'HTTP/1.1'
+                    and headers.get('connection', '').lower() != 'close'
+                )
+                lines = [f'HTTP/1.1 {status.value} {status.phrase}']
+                lines.extend(f'{k}: {v}' for k, v in res_headers.items())
+                lines.append(f'Content-Length: {len(body)}')
+                if not keep_alive:
+                    lines.append('Connection: close')
+                writer.write(
+                    ('\r\n'.join(lines) + '\r\n\r\n').encode('latin1')
+                    + (body if method != 'HEAD' else b'')
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(on_connection, host, port)
+
+
+class PriceCache():
+    """get_item_price with each price kept for ttl seconds.
+
+    Prices are cached per (item, quality, location, max_age). Items whose
+    price wasn't found are cached too, so they aren't looked up again until
+    they expire. Only the items that aren't cached are requested.
+
+    ...
+
+    Attributes
+    ----------
+    ttl: float
+        Seconds a price is kept.
+
+    Methods
+    -------
+    get_item_price(item_unique_name, quality, location, max_age):
+        Same as ao_bin_utilities.get_item_price, served from the cache.
+    """
+
+    def __init__(self, ttl: float = PRICE_TTL, get_price: Callable = None):
+        """Constructor for the class.
+
+        Parameters
+        ----------
+        ttl: float
+            Seconds a price is kept.
+        get_price: function
+            Looks up the prices that aren't cached.
+            (default: ao_bin_utilities.get_item_price)
+        """
+
+        self.ttl = ttl
+        self._get_price = get_price
+        self._prices = {}
+        self._lock = Lock()
+
+    def get_item_price(self, item_unique_name, quality, location,
+                       max_age: int) -> List:
+        """Same as ao_bin_utilities.get_item_price, served from the cache.
+
+        Returns
+        -------
+        list
+            (item_name, quality, price) for each item with a price, in the
+            order they were passed in.
+        """
+
+        keys = [
+            (str(name), q, location, max_age)
+            for name, q in zip(item_unique_name, quality)
+        ]
+
+        now = time.monotonic()
+        with self._lock:
+            cached = {}
+            for key in keys:
+                value = self._prices.get(key)
+                if value is not None and value[0] > now:
+                    cached[key] = value[1]
+        missing = list(dict.fromkeys(x for x in keys if x not in cached))
+        METRICS.inc('ao_bin_price_cache_hits_total', len(keys) - len(missing))
+
+        if missing:
+            METRICS.inc('ao_bin_price_cache_misses_total', len(missing))
+            get_price = self._get_price or abu.get_item_price
+            found = {
+                (name, q): price
+                for name, q, price in get_price(
+                    [x[0] for x in missing], [x[1] for x in missing],
+                    location, max_age
+                )
+            }
+
+            expires = time.monotonic() + self.ttl
+            with self._lock:
+                if len(self._prices) + len(missing) > MAX_PRICES:
+                    self._prices = {
+                        k: v for k, v in self._prices.items() if v[0] > now
+                    }
+                for key in missing:
+                    price = found.get(key[:2])
+                    self._prices[key] = (expires, price)
+                    cached[key] = price
+
+        return [
+            (key[0], key[1], cached[key])
+            for key in keys if cached[key] is not None
+        ]
+
+
+def _as_list(value: str, cast: Callable = str) -> List:
+    return [cast(x) for x in value.split(',') if x]
+
+
+class AoBinService():
+    """HTTP service answering item and price queries from shared data.
+
+    Every request is served from the same AoBinData and PriceCache. Item
+    lookups and Item Power are static for a given data version, so their
+    responses are cached and have an ETag, and a request with a matching
+    If-None-Match gets 304 Not Modified. Identical requests that arrive
+    while one is in flight share its result. Queries run in a thread pool
+    so slow price lookups don't hold up other requests.
+
+    Endpoints, all GET with query string parameters:
+        /item?name=T4_BAG[&local=1][&lang=EN-US]
+        /ip?name=T5_OFF_SHIELD@1[&quality=1][&mastery=0]
+        /items_above_ip?name=T4_BAG&ip=1000[&mastery=0][&min_tier=4]
+        /price?names=T4_BAG,T5_BAG[&qualities=1,1][&location=Lymhurst]
+            [&max_age=60]
+        /eip?items=T4_BAG,T4_2H_BOW&target_ip=1000,1000[&mastery=0,0]
+            [&min_tiers=4,4][&location=Lymhurst]
+        /metrics
+
+    ...
+
+    Attributes
+    ----------
+    prices: PriceCache object
+        Cache every price lookup goes through.
+
+    Methods
+    -------
+    handle(method, target, headers):
+        Returns the (status, headers, body) response to a request.
+    serve(host, port):
+        Starts the HTTP server.
+    """
+
+    def __init__(self, reloader: AoBinDataReloader = None,
+                 prices: PriceCache = None):
+        """Constructor for the class.
+
+        Parameters
+        ----------
+        reloader: AoBinDataReloader object
+            Provides the current data. Built from the AoBinData singleton
+            on the first request that needs data if not passed in.
+        prices: PriceCache object
+            Cache for price lookups. (default: a new PriceCache)
+        """
+
+        self._reloader = reloader
+        self._reloader_lock = None
+        self.prices = prices or PriceCache()
+        self._inflight = {}
+        self._static = OrderedDict()
+        # Path to (function, needs data, static)
+        self._routes = {
+            '/item': (self._item, True, True),
+            '/ip': (self._ip, True, True),
+            '/items_above_ip': (self._items_above_ip, True, True),
+            '/price': (self._price, False, False),
+            '/eip': (self._eip, True, False),
+        }
+
+    async def _get_reloader(self) -> AoBinDataReloader:
+        """Returns the reloader, loading the data on first use."""
+
+        if self._reloader is None:
+            if self._reloader_lock is None:
+                self._reloader_lock = asyncio.Lock()
+            async with self._reloader_lock:
+                if self._reloader is None:
+                    self._reloader = await asyncio.get_running_loop(
+                    ).run_in_executor(None, AoBinDataReloader)
+
+        return self._reloader
+
+    @staticmethod
+    def _item(data, query: Dict):
+        return data.get_item(
+            query['name'],
+            unique=query.get('local', '0') in ('0', 'false'),
+            lang=query.get('lang', DEFAULT_LANG),
+        )
+
+    @staticmethod
+    def _ip(data, query: Dict):
+        return {
+            'name': query['name'],
+            'item_power': abu.get_item_power(
+                query['name'],
+                int(query.get('quality', 1)),
+                int(query.get('mastery', 0)),
+                data,
+            ),
+        }
+
+    @staticmethod
+    def _items_above_ip(data, query: Dict):
+        return abu.get_items_above_ip(
+            query['name'],
+            int(query['ip']),
+            int(query.get('mastery', 0)),
+            int(query.get('min_tier', 4)),
+            data,
+        )
+
+    def _price(self, data, query: Dict):
+        names = _as_list(query['names'])
+        return self.prices.get_item_price(
+            names,
+            _as_list(query['qualities'], int)
+            if 'qualities' in query else [1]*len(names),
+            query.get('location', 'Lymhurst'),
+            int(query.get('max_age', 60)),
+        )
+
+    def _eip(self, data, query: Dict):
+        items = _as_list(query['items'])
+
+        def per_item(name, default):
+            if name not in query:
+                return [default]*len(items)
+            values = _as_list(query[name], int)
+            return values*len(items) if len(values) == 1 else values
+
+        return aot.EfficientItemPower(
+            per_item('target_ip', 0),
+            items,
+            per_item('mastery', 0),
+            per_item('min_tiers', 4),
+            query.get('location', 'Lymhurst'),
+            self.prices.get_item_price,
+        ).algorithm(data)
+
+    async def _run(self, key: tuple, func: Callable, query: Dict,
+                   needs_data: bool) -> object:
+        """Runs func in the thread pool, sharing the result with identical
+        requests that arrive while it runs.
+
+        Returns
+        -------
+        tuple
+            (data version, result), the version is None if func doesn't
+            need data.
+        """
+
+        task = self._inflight.get(key)
+        if task is not None:
+            METRICS.inc('ao_bin_service_coalesced_total')
+            return await asyncio.shield(task)
+
+        async def run():
+            data = None
+            if needs_data:
+                data = (await self._get_reloader()).data
+            res = await asyncio.get_running_loop().run_in_executor(
+                None, func, data, query
+            )
+            return (data.version if data is not None else None), res
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    async def handle(self, method: str, target: str, headers: Dict) -> tuple:
+        """Returns the response to a request.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method, only GET and HEAD are allowed.
+        target: str
+            Path and query string, e.g. '/ip?name=T4_BAG&quality=2'.
+        headers: dictionary
+            Request headers with lower case names.
+
+        Returns
+        -------
+        tuple
+            (HTTPStatus, headers dictionary, body bytes).
+        """
+
+        start = time.perf_counter()
+        url = urlsplit(target)
+        status, res_headers, body = await self._respond(
+            method, url.path, dict(parse_qsl(url.query)), headers
+        )
+        METRICS.inc(
+            'ao_bin_service_requests_total', path=url.path, status=status.value
+        )
+        METRICS.observe(
+            'ao_bin_service_request_seconds', time.perf_counter() - start,
+            path=url.path,
+        )
+
+        return status, res_headers, body
+
+    async def _respond(self, method: str, path: str, query: Dict,
+                       headers: Dict) -> tuple:
+        json_type = {'Content-Type': 'application/json'}
+
+        def error(status, message):
+            return status, json_type, json.dumps({'error': message}).encode()
+
+        if method not in ('GET', 'HEAD'):
+            return error(HTTPStatus.METHOD_NOT_ALLOWED, method)
+
+        if path == '/metrics':
+            return (
+                HTTPStatus.OK,
+                {'Content-Type': 'text/plain; version=0.0.4'},
+                METRICS.to_prometheus().encode(),
+            )
+
+        if path not in self._routes:
+            return error(HTTPStatus.NOT_FOUND, path)
+        func, needs_data, static = self._routes[path]
+
+        key = (path, tuple(sorted(query.items())))
+        if static and self._reloader is not None:
+            key += (self._reloader.version,)
+            cached = self._static.get(key)
+            if cached is not None:
+                self._static.move_to_end(key)
+                return self._static_response(*cached, headers)
+
+        try:
+            version, res = await self._run(key, func, query, needs_data)
+        except KeyError as e:
+            return error(HTTPStatus.BAD_REQUEST, f'missing {e.args[0]}')
+        except ValueError as e:
+            return error(HTTPStatus.BAD_REQUEST, str(e))
+        except Exception as e:
+            logger.exception("Failed to answer %s", path)
+            return error(HTTPStatus.SERVICE_UNAVAILABLE, repr(e))
+
+        if res is None:
+            return error(HTTPStatus.NOT_FOUND, 'not found')
+
+        body = json.dumps(res, separators=SEPARATORS).encode()
+        if not static:
+            return HTTPStatus.OK, json_type, body
+
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        key = key[:2] + (version,)
+        self._static[key] = (etag, body)
+        if len(self._static) > STATIC_CACHE_SIZE:
+            self._static.popitem(last=False)
+
+        return self._static_response(etag, body, headers)
+
+    @staticmethod
+    def _static_response(etag: str, body: bytes, headers: Dict) -> tuple:
+        res_headers = {'Content-Type': 'application/json', 'ETag': etag}
+        if headers.get('if-none-match') == etag:
+            return HTTPStatus.NOT_MODIFIED, res_headers, b''
+
+        return HTTPStatus.OK, res_headers, body
+
+    async def serve(self, host: str = HOST, port: int = PORT):
+        """Starts the HTTP server, see serve_http."""
+
+        return await serve_http(self.handle, host, port)
+
+
+def main(argv: List = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Serve item and price queries over HTTP.'
+    )
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument(
+        '--price-ttl', type=float, default=PRICE_TTL,
+        help='seconds a price is cached'
+    )
+    parser.add_argument(
+        '--reload-interval', type=float, default=0,
+        help='seconds between checks for new data files, 0 to not reload'
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    METRICS.enable()
+
+    async def run():
+        reloader = None
+        if args.reload_interval > 0:
+            reloader = AoBinDataReloader(interval=args.reload_interval)
+            reloader.start()
+        service = AoBinService(reloader, PriceCache(args.price_ttl))
+        server = await service.serve(args.host, args.port)
+        logger.info(
+            "Serving on %s", server.sockets[0].getsockname()[:2]
+        )
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
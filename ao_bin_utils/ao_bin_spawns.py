@@ -0,0 +1,512 @@
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from ao_bin_utils.ao_bin_catalog import AoBinCatalog, as_list
+from ao_bin_utils.ao_bin_world import to_csr
+
+BASE_DIR = Path(__file__).resolve().parent
+SPAWN_FILE = BASE_DIR / 'cache' / 'spawn_behaviors.npz'
+
+TABLE = 'randomspawnbehaviors'
+MOB_TIER_FINDER = r"^T(\d)_(.+)$"
+DEFAULT_TIER = 0
+NO_MOB = -1
+
+# Saved array name to AoBinSpawns attribute
+CACHED_ARRAYS = {
+    'behaviors': 'behaviors',
+    'final_boss': 'final_boss',
+    'mobs': 'mobs',
+    'mob_types': 'mob_types',
+    'mob_tiers': 'mob_tiers',
+    'variant_behaviors': 'variant_behaviors',
+    'variant_tiers': 'variant_tiers',
+    'variant_continents': 'variant_continents',
+    'variant_charges': 'variant_charges',
+    'variant_respawn': 'variant_respawn',
+    'indptr': 'indptr',
+    'candidate_variants': 'candidate_variants',
+    'candidate_mobs': 'candidate_mobs',
+    'weights': 'weights',
+    'probs': 'probs',
+    'cdf': 'cdf',
+    'upgrade_levels': 'upgrade_levels',
+    'only_as_upgrade': 'only_as_upgrade',
+    'type_indptr': '_type_indptr',
+    'type_rows': '_type_rows',
+    'mob_tier_indptr': '_mob_tier_indptr',
+    'mob_tier_rows': '_mob_tier_rows',
+    'tier_indptr': '_tier_indptr',
+    'tier_variants': '_tier_variants',
+}
+
+
+def parse_mob_name(name: str) -> tuple:
+    """Splits a mob's unique name into its tier and type.
+
+    e.g. 'T4_MOB_CRITTER_HIDE_MISTCOUGAR' is
+    (4, 'MOB_CRITTER_HIDE_MISTCOUGAR'). Mobs without a tier, like
+    'MOB_WOLF', have tier 0.
+    """
+
+    match = re.match(MOB_TIER_FINDER, name)
+    if match is None:
+        return 0, name
+
+    return int(match[1]), match[2]
+
+
+class AoBinSpawns():
+    """Compiled spawn behaviors from randomspawnbehaviors.json.
+
+    A spawn behavior has a 'clustertype' variant per cluster tier, some
+    restricted to a continent, and a 'default' variant used when none
+    applies. Each variant lists the mobs it can spawn with their weights.
+    The tree is compiled once into flat arrays:
+
+        variants, indexed by variant: behavior, tier (DEFAULT_TIER for the
+        default), continent ('' for any), charges and respawn times
+        candidates, grouped by variant through indptr: mob, weight,
+        normalized probability and cumulative probability
+
+    Mobs flagged 'onlyAsUpgrade' only spawn when a spawn point upgrades,
+    so they keep their weight but have no probability in the regular
+    roll. Mobs without a weight are equally likely. Reverse indexes map a
+    mob type and a mob tier to their candidates and a cluster tier to its
+    variants, all as CSR int32 arrays.
+
+    The arrays are cached to SPAWN_FILE and rebuilt when the table
+    changes, so only a rebuild reads the table.
+
+    ...
+
+    Attributes
+    ----------
+    behaviors: numpy array
+        Spawn behavior names.
+    mobs, mob_types, mob_tiers: numpy array
+        Sorted mob unique names, and their type and tier, see
+        parse_mob_name.
+    variant_behaviors, variant_tiers, variant_continents: numpy array
+        Behavior, cluster tier and continent of each variant.
+    indptr: numpy array
+        Each variant's candidates are indptr[v]:indptr[v + 1].
+    candidate_variants, candidate_mobs: numpy array
+        Variant and mob of each candidate.
+    weights, probs, cdf: numpy array
+        Weight, probability and cumulative probability within its variant
+        of each candidate.
+
+    Methods
+    -------
+    variant(behavior, tier, continent):
+        Returns the variant a behavior uses in a cluster.
+    candidates(behavior, tier, continent):
+        Returns the mobs a behavior can spawn and their odds.
+    find_behaviors(mob_type, mob_tier, tier):
+        Returns the behaviors that can spawn a mob.
+    sample(variants, size, seed):
+        Draws the mob spawned by each of many variants.
+    sample_mobs(behavior, size, tier, continent, seed):
+        Draws the mobs spawned by a behavior.
+    """
+
+    def __init__(
+            self,
+            catalog: AoBinCatalog = None,
+            spawn_file=SPAWN_FILE):
+        """Constructor loads the cached arrays or compiles the table.
+
+        Parameters
+        ----------
+        catalog: AoBinCatalog object
+            Catalog the table is read from. (default: AoBinCatalog())
+        spawn_file: str or Path
+            Location of the cached arrays, None to not cache them.
+        """
+
+        catalog = catalog or AoBinCatalog()
+        signature = catalog._signature()[TABLE]
+
+        if not self._load(spawn_file, signature):
+            self._build([
+                record for tag, _, record in catalog.get_table(TABLE).records
+                if tag == 'spawnbehavior'
+            ])
+            if spawn_file is not None:
+                self._save(spawn_file, signature)
+
+        self._behavior_index = {
+            x: i for i, x in enumerate(self.behaviors.tolist())
+        }
+        self._mob_type_ids = {
+            x: i for i, x in enumerate(np.unique(self.mob_types).tolist())
+        }
+        # Cumulative probabilities offset by variant, increasing over every
+        # candidate, so one search draws from many variants at once
+        self._global_cdf = self.cdf + self.candidate_variants
+        self._rolls = np.zeros(len(self.variant_tiers), dtype=bool)
+        self._rolls[self.candidate_variants[self.probs > 0]] = True
+
+    def _build(self, records: List) -> None:
+        """Compiles the spawn behaviors into the arrays."""
+
+        variants = []
+        candidates = []
+        for b, record in enumerate(records):
+            for tag in ['clustertype', 'default']:
+                for x in as_list(record.get(tag)):
+                    v = len(variants)
+                    variants.append((
+                        b,
+                        int(x.get('@tier', DEFAULT_TIER)),
+                        x.get('@continents', ''),
+                        int(x.get('@charges', 0)),
+                        float(x.get('@respawntimesecondsmin', 0)),
+                        float(x.get('@respawntimesecondsmax', 0)),
+                    ))
+                    for mob in as_list(x.get('mob')):
+                        candidates.append((
+                            v,
+                            mob.get('@name', ''),
+                            float(mob.get('@weight', 1)),
+                            int(mob.get('@mobUpgradeLevelIndex', 0)),
+                            mob.get('@onlyAsUpgrade') == 'true',
+                        ))
+
+        self.behaviors = np.array(
+            [x['@name'] for x in records], dtype=str
+        )
+        self.final_boss = np.array(
+            [x.get('@isfinalboss') == 'true' for x in records], dtype=bool
+        )
+
+        n_variants = len(variants)
+        columns = list(zip(*variants)) if variants else [()]*6
+        self.variant_behaviors = np.array(columns[0], dtype=np.int32)
+        self.variant_tiers = np.array(columns[1], dtype=np.int8)
+        self.variant_continents = np.array(columns[2], dtype=str)
+        self.variant_charges = np.array(columns[3], dtype=np.int32)
+        self.variant_respawn = np.array(
+            columns[4:], dtype=np.float64
+        ).reshape(2, -1).T
+
+        names = [x[1] for x in candidates]
+        self.mobs = np.unique(np.array(names, dtype=str))
+        mob_info = [parse_mob_name(x) for x in self.mobs.tolist()]
+        self.mob_tiers = np.array([x[0] for x in mob_info], dtype=np.int8)
+        self.mob_types = np.array([x[1] for x in mob_info], dtype=str)
+
+        self.candidate_variants = np.array(
+            [x[0] for x in candidates], dtype=np.int32
+        )
+        self.candidate_mobs = self.mobs.searchsorted(
+            np.array(names, dtype=str)
+        ).astype(np.int32)
+        self.weights = np.array([x[2] for x in candidates], dtype=np.float64)
+        self.upgrade_levels = np.array(
+            [x[3] for x in candidates], dtype=np.int8
+        )
+        self.only_as_upgrade = np.array(
+            [x[4] for x in candidates], dtype=bool
+        )
+        self.indptr = np.zeros(n_variants + 1, dtype=np.int32)
+        np.cumsum(
+            np.bincount(self.candidate_variants, minlength=n_variants),
+            out=self.indptr[1:]
+        )
+
+        # Normalized within each variant, over the regular roll
+        rolled = np.where(self.only_as_upgrade, 0, self.weights)
+        totals = np.bincount(
+            self.candidate_variants, weights=rolled, minlength=n_variants
+        )
+        self.probs = np.divide(
+            rolled, totals[self.candidate_variants],
+            out=np.zeros_like(rolled),
+            where=totals[self.candidate_variants] > 0
+        )
+        cumulative = np.cumsum(self.probs)
+        starts = np.concatenate([[0], cumulative])[
+            self.indptr[self.candidate_variants]
+        ]
+        self.cdf = np.minimum(cumulative - starts, 1)
+        # The last rolled candidate closes its variant at exactly 1
+        rolled = np.flatnonzero(self.probs > 0)
+        last = np.ones(rolled.shape[0], dtype=bool)
+        last[:-1] = np.diff(self.candidate_variants[rolled]) != 0
+        self.cdf[rolled[last]] = 1
+
+        rows = np.arange(len(candidates))
+        mob_types, type_ids = np.unique(self.mob_types, return_inverse=True)
+        self._type_indptr, self._type_rows = to_csr(
+            len(mob_types),
+            np.stack([type_ids[self.candidate_mobs], rows], axis=1)
+        )
+        self._mob_tier_indptr, self._mob_tier_rows = to_csr(
+            int(self.mob_tiers.max(initial=0)) + 1,
+            np.stack([self.mob_tiers[self.candidate_mobs], rows], axis=1)
+        )
+        self._tier_indptr, self._tier_variants = to_csr(
+            int(self.variant_tiers.max(initial=0)) + 1,
+            np.stack([self.variant_tiers, np.arange(n_variants)], axis=1)
+        )
+
+    def _load(self, spawn_file, signature: List) -> bool:
+        """Loads the cached arrays, returns false if missing or stale."""
+
+        try:
+            with np.load(spawn_file) as cached:
+                if cached['signature'].tolist() != signature:
+                    return False
+                for key, attribute in CACHED_ARRAYS.items():
+                    setattr(self, attribute, cached[key])
+        except (OSError, KeyError, ValueError, TypeError):
+            return False
+
+        return True
+
+    def _save(self, spawn_file, signature: List) -> None:
+        spawn_file = Path(spawn_file)
+        spawn_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(spawn_file, 'wb') as f:
+            np.savez(
+                f,
+                signature=np.array(signature, dtype=np.int64),
+                **{
+                    key: getattr(self, attribute)
+                    for key, attribute in CACHED_ARRAYS.items()
+                },
+            )
+
+    def _behavior(self, behavior: str) -> int:
+        try:
+            return self._behavior_index[behavior]
+        except KeyError:
+            raise KeyError(f"No spawn behavior {behavior}") from None
+
+    def variant(
+            self,
+            behavior: str,
+            tier: int = DEFAULT_TIER,
+            continent: str = None) -> int:
+        """Returns the variant a behavior uses in a cluster.
+
+        Parameters
+        ----------
+        behavior: str
+            Spawn behavior name, e.g. 'HUNT_TEST_SPAWN'.
+        tier: int
+            Cluster tier. (default: DEFAULT_TIER, the default variant)
+        continent: str
+            Cluster continent, e.g. 'Outlands'. Variants restricted to
+            another continent are skipped, ones restricted to this one are
+            preferred. (default: None, only unrestricted variants)
+
+        Returns
+        -------
+        int
+            Index of the clustertype variant for the tier, or of the
+            default variant if there is none.
+        """
+
+        b = self._behavior(behavior)
+        variants = np.flatnonzero(self.variant_behaviors == b)
+        found = variants[
+            (self.variant_tiers[variants] == tier)
+            & np.isin(self.variant_continents[variants], ['', continent])
+        ]
+        if found.shape[0] == 0:
+            default = variants[self.variant_tiers[variants] == DEFAULT_TIER]
+            return int(default[-1])
+
+        restricted = found[self.variant_continents[found] != '']
+
+        return int((restricted if restricted.shape[0] else found)[0])
+
+    def candidates(
+            self,
+            behavior: str,
+            tier: int = DEFAULT_TIER,
+            continent: str = None) -> List:
+        """Returns the mobs a behavior can spawn and their odds.
+
+        Parameters
+        ----------
+        behavior, tier, continent:
+            See variant.
+
+        Returns
+        -------
+        list
+            List of dictionaries with keys:
+            'mob': str, the mob's unique name.
+            'weight': float
+            'probability': float, 0 for upgrade only mobs.
+            'upgrade_level': int, the '@mobUpgradeLevelIndex'.
+            'only_as_upgrade': bool
+        """
+
+        v = self.variant(behavior, tier, continent)
+        rows = range(self.indptr[v], self.indptr[v + 1])
+
+        return [
+            {
+                'mob': str(self.mobs[self.candidate_mobs[i]]),
+                'weight': float(self.weights[i]),
+                'probability': float(self.probs[i]),
+                'upgrade_level': int(self.upgrade_levels[i]),
+                'only_as_upgrade': bool(self.only_as_upgrade[i]),
+            }
+            for i in rows
+        ]
+
+    def find_behaviors(
+            self,
+            mob_type: str = None,
+            mob_tier: int = None,
+            tier: int = None) -> List:
+        """Returns the behaviors that can spawn a mob.
+
+        Parameters
+        ----------
+        mob_type: str
+            Mob name without its tier, e.g. 'MOB_ROAMING_HERETIC_MAGE'. A
+            full unique name like 'T3_MOB_ROAMING_HERETIC_MAGE' is split
+            and its tier used as mob_tier.
+        mob_tier: int
+            Mob tier. (default: None, any tier)
+        tier: int
+            Cluster tier of the variant, DEFAULT_TIER for default variants.
+            (default: None, any variant)
+
+        Returns
+        -------
+        list
+            List of dictionaries, one per candidate, with keys:
+            'behavior': str
+            'tier': int, the variant's cluster tier.
+            'continent': str, '' if the variant isn't restricted.
+            'mob': str, the mob's unique name.
+            'probability': float
+        """
+
+        rows = None
+        if mob_type is not None:
+            name_tier, mob_type = parse_mob_name(mob_type)
+            if name_tier:
+                mob_tier = name_tier
+            i = self._mob_type_ids.get(mob_type)
+            if i is None:
+                return []
+            rows = self._type_rows[
+                self._type_indptr[i]:self._type_indptr[i + 1]
+            ]
+        if mob_tier is not None:
+            if not 0 <= mob_tier < len(self._mob_tier_indptr) - 1:
+                return []
+            found = self._mob_tier_rows[
+                self._mob_tier_indptr[mob_tier]:
+                self._mob_tier_indptr[mob_tier + 1]
+            ]
+            rows = found if rows is None else np.intersect1d(
+                rows, found, assume_unique=True
+            )
+        if tier is not None:
+            if not 0 <= tier < len(self._tier_indptr) - 1:
+                return []
+            variants = self._tier_variants[
+                self._tier_indptr[tier]:self._tier_indptr[tier + 1]
+            ]
+            if rows is None:
+                rows = np.arange(len(self.candidate_variants))
+            rows = rows[np.isin(self.candidate_variants[rows], variants)]
+        if rows is None:
+            rows = np.arange(len(self.candidate_variants))
+
+        variants = self.candidate_variants[rows]
+
+        return [
+            {
+                'behavior': behavior,
+                'tier': tier,
+                'continent': continent,
+                'mob': mob,
+                'probability': probability,
+            }
+            for behavior, tier, continent, mob, probability in zip(
+                self.behaviors[self.variant_behaviors[variants]].tolist(),
+                self.variant_tiers[variants].tolist(),
+                self.variant_continents[variants].tolist(),
+                self.mobs[self.candidate_mobs[rows]].tolist(),
+                self.probs[rows].tolist(),
+            )
+        ]
+
+    def sample(self, variants, size: int = None, seed=None) -> np.ndarray:
+        """Draws the mob spawned by each of many variants.
+
+        Parameters
+        ----------
+        variants: int or array
+            Variant indexes, e.g. from variant.
+        size: int
+            Number of draws per variant. (default: None, one)
+        seed: int or numpy Generator
+            Seed for the random generator. (default: None)
+
+        Returns
+        -------
+        numpy array
+            Indexes into mobs, with the shape of variants and a last axis
+            of size if given. NO_MOB for variants that spawn nothing.
+        """
+
+        rng = np.random.default_rng(seed)
+        variants = np.asarray(variants, dtype=np.int64)
+        if size is not None:
+            variants = np.repeat(variants[..., None], size, axis=-1)
+
+        rows = self._global_cdf.searchsorted(
+            variants + rng.random(variants.shape), 'right'
+        )
+        rows = np.minimum(rows, self.indptr[variants + 1] - 1)
+
+        return np.where(
+            self._rolls[variants], self.candidate_mobs[rows], NO_MOB
+        )
+
+    def sample_mobs(
+            self,
+            behavior: str,
+            size: int,
+            tier: int = DEFAULT_TIER,
+            continent: str = None,
+            seed=None) -> np.ndarray:
+        """Draws the mobs spawned by a behavior.
+
+        Parameters
+        ----------
+        behavior, tier, continent:
+            See variant.
+        size: int
+            Number of draws.
+        seed: int or numpy Generator
+            Seed for the random generator. (default: None)
+
+        Returns
+        -------
+        numpy array
+            Mob unique names, '' for draws that spawn nothing.
+        """
+
+        mobs = self.sample(self.variant(behavior, tier, continent), size, seed)
+
+        return np.where(
+            mobs == NO_MOB, '', self.mobs[np.maximum(mobs, 0)]
+        )
@@ -0,0 +1,489 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import math
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR.parent
+CACHE_DIR = BASE_DIR / 'cache'
+INDEX_FILE = CACHE_DIR / 'template_index.json'
+
+TEMPLATE_SUFFIX = '.template.xml'
+CLUSTER_SUFFIX = '.cluster.xml'
+TILE_TAGS = ('tile', 'compoundtile')
+KEY_ATTRIBUTES = [
+    'nodetype',
+    'behavior',
+    'spawnbehavior',
+    'type',
+    'spell',
+    'shrinetype',
+    'reference',
+    'gatetype',
+    'agenttype',
+    'kind',
+]
+
+# Object row fields
+OBJ_LAYER, OBJ_TILE, OBJ_X, OBJ_Y, OBJ_Z, OBJ_ROT, OBJ_TAG, OBJ_KEY = range(8)
+# Instance row fields
+INST_ID, INST_REF, INST_X, INST_Y, INST_Z, INST_ROT, INST_LAYERS = range(7)
+
+
+def parse_vector(value: str, length: int = 3) -> List:
+    """Returns the floats of a space separated attribute like '1 0 -2.5'."""
+
+    res = [float(x) for x in (value or '').split()]
+    return (res + [0.0]*length)[:length]
+
+
+def file_hash(data: bytes) -> str:
+    """Returns the content hash used to detect changed files."""
+
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def parse_template(data: bytes) -> Dict:
+    """Parses the functional objects of a template with a streaming parser.
+
+    Only tiles that carry a component (exit, resourcenode, mobspawnpoint,
+    ...) are kept. Decoration tiles are dropped as soon as they are read.
+
+    Parameters
+    ----------
+    data: bytes
+        Content of a *.template.xml file.
+
+    Returns
+    -------
+    dictionary
+        'layers': Layer id to layer name.
+        'objects': List of [layer, tile, x, y, z, roty, tag, key] rows. The
+        layer is '' for objects outside of a layer and key is the value
+        of the component's first KEY_ATTRIBUTES attribute, or ''.
+    """
+
+    layers = {}
+    objects = []
+    layer_stack = ['']
+
+    for event, elem in ET.iterparse(io.BytesIO(data), events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'layer':
+                layers[elem.get('id')] = elem.get('name', '')
+                layer_stack.append(elem.get('id'))
+            elif elem.tag == 'criticalscenemember':
+                layer_stack.append(elem.get('layerId', ''))
+            continue
+
+        if elem.tag in TILE_TAGS:
+            components = [x for x in elem if x.tag not in TILE_TAGS]
+            if components:
+                x, y, z = parse_vector(elem.get('pos'))
+                for component in components:
+                    key = next(
+                        (
+                            component.get(k) for k in KEY_ATTRIBUTES
+                            if component.get(k)
+                        ),
+                        ''
+                    )
+                    objects.append([
+                        layer_stack[-1],
+                        elem.get('name', ''),
+                        x,
+                        y,
+                        z,
+                        float(elem.get('roty', 0)),
+                        component.tag,
+                        key,
+                    ])
+            elem.clear()
+
+        elif elem.tag in ('layer', 'criticalscenemember'):
+            layer_stack.pop()
+            elem.clear()
+
+    return {'layers': layers, 'objects': objects}
+
+
+def parse_cluster(data: bytes) -> Dict:
+    """Parses the template instances of a cluster.
+
+    Parameters
+    ----------
+    data: bytes
+        Content of a *.cluster.xml file.
+
+    Returns
+    -------
+    dictionary
+        'origin' and 'size': [x, z] of the cluster's bounds.
+        'instances': List of [id, ref, x, y, z, rot, active_layers] rows.
+    """
+
+    res = {'origin': [0.0, 0.0], 'size': [0.0, 0.0], 'instances': []}
+
+    for event, elem in ET.iterparse(io.BytesIO(data), events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'cluster':
+                res['origin'] = parse_vector(elem.get('origin'), 2)
+                res['size'] = parse_vector(elem.get('size'), 2)
+            continue
+
+        if elem.tag == 'templateinstance':
+            x, y, z = parse_vector(elem.get('pos'))
+            res['instances'].append([
+                elem.get('id', ''),
+                elem.get('ref', ''),
+                x,
+                y,
+                z,
+                float(elem.get('rot', 0)),
+                [layer.get('id') for layer in elem.iter('activelayer')],
+            ])
+            elem.clear()
+
+    return res
+
+
+def _parse_file(args) -> tuple:
+    """Process pool worker, parses a file unless its hash is unchanged."""
+
+    fp, kind, old_hash = args
+    data = Path(fp).read_bytes()
+    new_hash = file_hash(data)
+    if new_hash == old_hash:
+        return fp, new_hash, None
+
+    parser = parse_template if kind == 'template' else parse_cluster
+    return fp, new_hash, parser(data)
+
+
+def to_world(instance: List, x: float, z: float) -> tuple:
+    """Returns the cluster position of a point inside a template instance.
+
+    The point is rotated clockwise by the instance's rot, in degrees, and
+    moved to the instance's position.
+    """
+
+    angle = math.radians(instance[INST_ROT])
+    cos, sin = math.cos(angle), math.sin(angle)
+
+    return (
+        instance[INST_X] + x*cos + z*sin,
+        instance[INST_Z] - x*sin + z*cos,
+    )
+
+
+class AoBinTemplateIndex():
+    """Persistent index of the template and cluster XML files.
+
+    Templates share a name across the biome folders (DEAD, GREEN, NONE and
+    RED) and clusters refer to them by name only, so templates are keyed
+    by name and then by folder.
+
+    The index is saved to INDEX_FILE. update() only re-parses files whose
+    content hash changed since the last update, files whose mtime and
+    size are unchanged aren't read at all.
+
+    ...
+
+    Attributes
+    ----------
+    _files: dictionary
+        Relative file path to {'stat', 'hash', 'kind', 'data'}.
+    _templates: dictionary
+        Template name to {folder: parsed template}.
+    _clusters: dictionary
+        Cluster name to parsed cluster.
+
+    Methods
+    -------
+    update(workers):
+        Parses new and changed files and saves the index.
+    get_template(ref, folder):
+        Returns a parsed template.
+    get_cluster(cluster):
+        Returns a parsed cluster.
+    clusters():
+        Returns the names of every indexed cluster.
+    templates_with_object(name):
+        Returns the templates containing an object.
+    clusters_with_template(ref):
+        Returns the clusters that instantiate a template.
+    clusters_with_object(name):
+        Returns the clusters containing an object on an active layer.
+    get_cluster_objects(cluster, folder):
+        Returns the active objects of a cluster in cluster coordinates.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, index_file=INDEX_FILE):
+        """Constructor loads the saved index if there is one.
+
+        Parameters
+        ----------
+        data_dir: str or Path
+            Folder containing the 'templates' and 'cluster' folders.
+        index_file: str or Path
+            Location the index is saved to.
+        """
+
+        self._data_dir = Path(data_dir)
+        self._index_file = Path(index_file)
+        self._files = {}
+
+        try:
+            with open(self._index_file) as f:
+                self._files = json.load(f)['files']
+
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self._build_lookups()
+
+    def _discover(self) -> Dict:
+        """Returns relative path to kind for every template and cluster."""
+
+        res = {}
+        templates = self._data_dir.glob(f'templates/*/*{TEMPLATE_SUFFIX}')
+        for fp in sorted(templates):
+            res[fp.relative_to(self._data_dir).as_posix()] = 'template'
+        for fp in sorted(self._data_dir.glob(f'cluster/*{CLUSTER_SUFFIX}')):
+            res[fp.relative_to(self._data_dir).as_posix()] = 'cluster'
+
+        return res
+
+    def update(self, workers: int = None) -> Dict:
+        """Parses new and changed files across a process pool.
+
+        Parameters
+        ----------
+        workers: int
+            Number of worker processes. (default: one per CPU)
+
+        Returns
+        -------
+        dictionary
+            'parsed', 'unchanged' and 'removed' file counts.
+        """
+
+        discovered = self._discover()
+        stats = {'parsed': 0, 'unchanged': 0, 'removed': 0}
+
+        for rel_path in list(self._files):
+            if rel_path not in discovered:
+                del self._files[rel_path]
+                stats['removed'] += 1
+
+        jobs = []
+        for rel_path, kind in discovered.items():
+            stat = (self._data_dir / rel_path).stat()
+            stat = [stat.st_mtime_ns, stat.st_size]
+            entry = self._files.get(rel_path)
+            if entry is not None and entry['stat'] == stat:
+                stats['unchanged'] += 1
+                continue
+            self._files[rel_path] = {
+                'stat': stat,
+                'hash': entry['hash'] if entry else None,
+                'kind': kind,
+                'data': entry['data'] if entry else None,
+            }
+            jobs.append((
+                str(self._data_dir / rel_path),
+                kind,
+                self._files[rel_path]['hash'],
+            ))
+
+        if jobs:
+            with ProcessPoolExecutor(workers) as executor:
+                for fp, new_hash, data in executor.map(
+                    _parse_file, jobs, chunksize=16
+                ):
+                    entry = self._files[
+                        Path(fp).relative_to(self._data_dir).as_posix()
+                    ]
+                    entry['hash'] = new_hash
+                    if data is None:
+                        stats['unchanged'] += 1
+                    else:
+                        entry['data'] = data
+                        stats['parsed'] += 1
+
+        if jobs or stats['removed'] or not self._index_file.exists():
+            self._index_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._index_file, 'w') as f:
+                json.dump({'files': self._files}, f, separators=(',', ':'))
+
+            self._build_lookups()
+
+        return stats
+
+    def _build_lookups(self) -> None:
+        """Builds the in memory lookups from the indexed files."""
+
+        self._templates = {}
+        self._clusters = {}
+        for rel_path, entry in self._files.items():
+            name = rel_path.split('/')[-1]
+            if entry['kind'] == 'template':
+                folder = rel_path.split('/')[-2]
+                self._templates.setdefault(
+                    name[:-len(TEMPLATE_SUFFIX)], {}
+                )[folder] = entry['data']
+            else:
+                self._clusters[name[:-len(CLUSTER_SUFFIX)]] = entry['data']
+
+        # Object name -> template -> layers the object is on
+        self._object_templates = {}
+        for ref, folders in self._templates.items():
+            for template in folders.values():
+                for obj in template['objects']:
+                    for name in {obj[OBJ_TILE], obj[OBJ_TAG], obj[OBJ_KEY]}:
+                        if name:
+                            self._object_templates.setdefault(
+                                name, {}
+                            ).setdefault(ref, set()).add(obj[OBJ_LAYER])
+
+        # Template name -> cluster -> active layers of each instance
+        self._template_clusters = {}
+        for cluster, data in self._clusters.items():
+            for instance in data['instances']:
+                self._template_clusters.setdefault(
+                    instance[INST_REF], {}
+                ).setdefault(cluster, []).append(set(instance[INST_LAYERS]))
+
+    def get_template(self, ref: str, folder: str = None) -> Dict:
+        """Returns a parsed template.
+
+        Parameters
+        ----------
+        ref: str
+            The template's name, as used by a cluster's 'ref'.
+        folder: str
+            The biome folder. If None, the first folder in alphabetical
+            order that has the template is used.
+
+        Returns
+        -------
+        dictionary
+            The parsed template, see parse_template. None if not found.
+        """
+
+        folders = self._templates.get(ref, {})
+        if folder is None:
+            folder = min(folders, default=None)
+
+        return folders.get(folder)
+
+    def get_cluster(self, cluster: str) -> Dict:
+        """Returns a parsed cluster, see parse_cluster. None if not found."""
+
+        return self._clusters.get(cluster)
+
+    def clusters(self) -> List:
+        """Returns the names of every indexed cluster."""
+
+        return sorted(self._clusters)
+
+    def templates_with_object(self, name: str) -> List:
+        """Returns the templates containing an object.
+
+        Parameters
+        ----------
+        name: str
+            A tile name, component tag or component key, e.g.
+            'Exit', 'mobspawnpoint' or a resource node type.
+
+        Returns
+        -------
+        list
+            Sorted template names.
+        """
+
+        return sorted(self._object_templates.get(name, {}))
+
+    def clusters_with_template(self, ref: str) -> List:
+        """Returns the sorted names of the clusters that use a template."""
+
+        return sorted(self._template_clusters.get(ref, {}))
+
+    def clusters_with_object(self, name: str) -> List:
+        """Returns the clusters containing an object on an active layer.
+
+        An object outside of any layer is always active, otherwise its
+        layer has to be one of the instance's active layers.
+
+        Parameters
+        ----------
+        name: str
+            A tile name, component tag or component key.
+
+        Returns
+        -------
+        list
+            Sorted cluster names.
+        """
+
+        res = set()
+        for ref, layers in self._object_templates.get(name, {}).items():
+            for cluster, instances in self._template_clusters.get(
+                ref, {}
+            ).items():
+                if any('' in layers or layers & x for x in instances):
+                    res.add(cluster)
+
+        return sorted(res)
+
+    def get_cluster_objects(self, cluster: str, folder: str = None) -> List:
+        """Returns the active objects of a cluster in cluster coordinates.
+
+        Parameters
+        ----------
+        cluster: str
+            The cluster's name, e.g. '0201_WRL_SW_AUTO_T5_KPR_ROY'.
+        folder: str
+            The biome folder of the templates, see get_template.
+
+        Returns
+        -------
+        list
+            List of (instance_id, ref, tile, tag, key, x, z) tuples.
+        """
+
+        data = self.get_cluster(cluster)
+        if data is None:
+            return []
+
+        res = []
+        for instance in data['instances']:
+            template = self.get_template(instance[INST_REF], folder)
+            if template is None:
+                continue
+            active = set(instance[INST_LAYERS])
+            for obj in template['objects']:
+                if obj[OBJ_LAYER] and obj[OBJ_LAYER] not in active:
+                    continue
+                x, z = to_world(instance, obj[OBJ_X], obj[OBJ_Z])
+                res.append((
+                    instance[INST_ID],
+                    instance[INST_REF],
+                    obj[OBJ_TILE],
+                    obj[OBJ_TAG],
+                    obj[OBJ_KEY],
+                    x,
+                    z,
+                ))
+
+        return res
+
+
+if __name__ == "__main__":
+    print(AoBinTemplateIndex().update())
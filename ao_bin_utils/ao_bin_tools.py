@@ -1,9 +1,13 @@
 from __future__ import annotations
 from ao_bin_utils.ao_bin_data import AoBinData
+from ao_bin_utils.ao_bin_metrics import METRICS
 import ao_bin_utils.ao_bin_utilities as abu
 
 from abc import ABC, abstractmethod
-from typing import Dict, List
+import logging
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
 
 
 class AoBinTools():
@@ -112,6 +116,8 @@ class EfficientItemPower(Strategy):
         A list of integers that are the bonus IP for each item.
     location: str
         The name of the market to use
+    get_price: function
+        Looks up prices, with the signature of get_item_price.
 
     Methods
     -------
@@ -125,7 +131,8 @@ class EfficientItemPower(Strategy):
             items: List,
             mastery: List,
             min_tiers: List,
-            location: str,):
+            location: str,
+            get_price: Callable = None):
         """Constructor for the class.
 
         Parameters
@@ -142,6 +149,9 @@ class EfficientItemPower(Strategy):
             considered.
         location: str
             The name of the market to use
+        get_price: function
+            Looks up prices, with the signature of get_item_price, e.g. a
+            cached version of it. (default: get_item_price)
         """
 
         self._target_ip = target_ip
@@ -149,6 +159,7 @@ class EfficientItemPower(Strategy):
         self._mastery = mastery
         self._min_tiers = min_tiers
         self._location = location
+        self._get_price = get_price
 
     def algorithm(self, ao_data: AoBinData) -> Dict:
         """Concrete implementation of the abstract method inherited from Strategy.
@@ -180,6 +191,8 @@ class EfficientItemPower(Strategy):
             Prices will be 0 for items whose price couldn't be found.
         """
 
+        get_price = self._get_price or abu.get_item_price
+
         res = {
             'item_names': [],
             'qualities': [],
@@ -202,17 +215,20 @@ class EfficientItemPower(Strategy):
 
             item_names = [x[0] for x in candidate_items]
             qualities = [x[1] for x in candidate_items]
-            price_data = abu.get_item_price(
+            price_data = get_price(
                 item_names, qualities, self._location, 10
             )
+            fallback = 'fresh'
 
             if len(price_data) == 0:
                 # Handle when failing to find prices
-                price_data = abu.get_item_price(
+                fallback = 'stale'
+                price_data = get_price(
                     item_names, qualities, self._location, 60
                 )
 
                 if len(price_data) == 0:
+                    fallback = 'any_ip'
 
                     candidate_items = abu.get_items_above_ip(
                         item,
@@ -224,17 +240,25 @@ class EfficientItemPower(Strategy):
 
                     item_names = [x[0] for x in candidate_items]
                     qualities = [x[1] for x in candidate_items]
-                    price_data = abu.get_item_price(
+                    price_data = get_price(
                         item_names, qualities, self._location, 60*23
                     )
 
                     if len(price_data) == 0:
+                        METRICS.inc('ao_bin_eip_fallback_total', tier='none')
+                        logger.warning(
+                            "No price found for any version of %s", item
+                        )
                         res['item_names'].append(item_names[-1])
                         res['qualities'].append(1)
                         res['item_powers'].append(0)
                         res['prices'].append(0)
                         continue
 
+            METRICS.inc('ao_bin_eip_fallback_total', tier=fallback)
+            if fallback != 'fresh':
+                logger.info("Used %s prices for %s", fallback, item)
+
             cheapest_item = sorted(price_data, key=lambda x: x[2])[0]
 
             if target_ip < 0:
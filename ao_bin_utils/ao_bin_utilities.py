@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import logging
 import math
-import re
+import os
 from datetime import datetime, timezone
 from pathlib import Path
 from time import sleep
@@ -11,9 +12,19 @@ import pytz
 import requests
 
 from ao_bin_utils.ao_bin_data import AoBinData
+from ao_bin_utils.ao_bin_item_id import ItemId
+from ao_bin_utils.ao_bin_metrics import METRICS, timed
 
-TIER_FINDER = r"T\d_"
 BASE_DIR = Path(__file__).resolve().parent
+PRICE_SLEEP = 0.250
+PRICE_URL = os.environ.get(
+    'AO_BIN_PRICE_URL',
+    'https://www.albion-online-data.com/api/v2/stats/prices/'
+)
+# AoBinPriceHistory every price response is recorded to, if set
+PRICE_HISTORY = None
+
+logger = logging.getLogger(__name__)
 
 
 def make_sublists(a: list, n: int) -> list:
@@ -39,6 +50,7 @@ def calculate_ema(prices: list, smoothing: float, days: int) -> int:
     return result
 
 
+@timed('ao_bin_utility_seconds', function='get_item_price')
 def get_item_price(item_unique_name, quality, location, max_age: int) -> List:
     """Utility function to get an item's cheapest sell price at a given location.
 
@@ -51,14 +63,17 @@ def get_item_price(item_unique_name, quality, location, max_age: int) -> List:
         4. Check if the quality can be removed from the list of qualites.
         5. Repeat 1-4 until item_unique_name is empty.
 
-    This method pauses for 1 second between GET requests.
+    This method pauses for PRICE_SLEEP seconds between GET requests.
+
+    Every price in the responses is recorded to PRICE_HISTORY if it is
+    set, e.g. to an AoBinPriceHistory.
 
     Additionally, if the item can't be found at the location after a number of
     tries, all cities will be included in the search.
 
     Parameters
     ----------
-    item_unique_name: list of str
+    item_unique_name: list of str or ItemId
         Unique names of the items to be found. Same length as quality.
     quality: list of int
         Quality levels of the items (1 = Normal, 2 = Good, etc).
@@ -78,7 +93,7 @@ def get_item_price(item_unique_name, quality, location, max_age: int) -> List:
         If a non-zero price is not found for an item, it will not be in
         the results.
     """
-    names = item_unique_name.copy()
+    names = [str(x) for x in item_unique_name]
     quality_copy = quality.copy()
 
     res = []
@@ -88,10 +103,7 @@ def get_item_price(item_unique_name, quality, location, max_age: int) -> List:
     while len(names) > 0 and (item_found or len(res) == 0):
         item_found = False
 
-        url = (
-            f"https://www.albion-online-data.com/api/v2/stats/prices/"
-            f"{','.join(remove_dupes(names))}"
-        )
+        url = f"{PRICE_URL}{','.join(remove_dupes(names))}"
 
         quality_no_dupes = remove_dupes(quality_copy)
         params = {
@@ -99,16 +111,26 @@ def get_item_price(item_unique_name, quality, location, max_age: int) -> List:
             'qualities': ','.join([str(x) for x in quality_no_dupes]),
         }
         if fail_count > 2:
-            print('/')
-            print(remove_dupes(names))
+            logger.warning(
+                "No fresh price found at %s for %s",
+                location, remove_dupes(names)
+            )
             return res
 
-        response = requests.get(url, params=params)
-        print(
-            '.' if response.status_code == 200 else '!',
-            end=''
+        with METRICS.timer('ao_bin_http_request_seconds', endpoint='prices'):
+            response = requests.get(url, params=params)
+        METRICS.inc('ao_bin_http_requests_total', status=response.status_code)
+        if METRICS.enabled:
+            METRICS.inc(
+                'ao_bin_http_response_bytes_total', len(response.content)
+            )
+        logger.debug(
+            "GET prices for %d items at %s: status %s",
+            len(names), location, response.status_code
         )
         response = response.json()
+        if PRICE_HISTORY is not None:
+            PRICE_HISTORY.append_records(response)
 
         item_index_offset = 0
         for item_index in range(len(names)):
@@ -145,30 +167,16 @@ def get_item_price(item_unique_name, quality, location, max_age: int) -> List:
                     fail_count = 0
                     break
 
-                if False:
-                    if not name_matches:
-                        continue
-                    elif not quality_matches:
-                        continue
-                    elif not price_valid:
-                        item_result = "!P"
-                    elif not price_fresh:
-                        item_result = f"!F: {data_age.seconds/60}"
-                    else:
-                        item_result = 'M'
-
-                    time_now = datetime.now()
-                    with open(BASE_DIR / 'responses' / f"{item['item_id']}.csv", 'a') as fp:
-                        fp.write(
-                            f"{time_now},{item['item_id']},{item['city']},{item['quality']},{item['sell_price_min']},{item['sell_price_min_date']},{item_result}\n"
-                        )
-
-        (item_found or len(res) == 0) and \
-            sleep(0.250)  # Pause if another request
+        if item_found or len(res) == 0:
+            sleep(PRICE_SLEEP)  # Pause if another request
+            METRICS.inc('ao_bin_sleep_seconds_total', PRICE_SLEEP)
 
         if not item_found:
-            print('*')
             fail_count += 1
+            METRICS.inc('ao_bin_price_retries_total')
+            logger.debug(
+                "No price matched at %s, attempt %d", location, fail_count
+            )
 
     return res
 
@@ -194,6 +202,7 @@ def remove_dupes(input_list):
     return sorted(res)
 
 
+@timed('ao_bin_utility_seconds', function='get_item_power')
 def get_item_power(
         item_unique_name,
         quality,
@@ -203,7 +212,7 @@ def get_item_power(
 
     Parameters
     ----------
-    item_unique_name: str
+    item_unique_name: str or ItemId
         Unique name of the item to be found. An item with '@' character is
         added to the end for enchant level.
     quality: int
@@ -219,20 +228,20 @@ def get_item_power(
         The item's Item Power. If the item is not found, -1 is returned.
     """
 
-    # Enchantment Level
-    if '@' in item_unique_name:
-        base_item_name, enchant_lvl = item_unique_name.split('@')
-    else:
-        base_item_name, enchant_lvl = item_unique_name, None
-
-    item_data = ao_data.get_item(base_item_name)
+    item_id = ItemId.parse(item_unique_name)
+    item_data = ao_data.get_item(item_id.base_name)
 
     if not item_data:
         return -1
 
+    # Enchantment Level
     item_power_data = {}
-    if enchant_lvl is not None and 'enchantments' in item_data:
-        for enchantment in item_data['enchantments']['enchantment']:
+    if item_id.enchant > 0 and 'enchantments' in item_data:
+        enchant_lvl = str(item_id.enchant)
+        enchantments = item_data['enchantments']['enchantment']
+        if isinstance(enchantments, dict):
+            enchantments = [enchantments]
+        for enchantment in enchantments:
             if enchantment['@enchantmentlevel'] == enchant_lvl:
                 item_power_data = enchantment
                 break
@@ -259,6 +268,7 @@ def get_item_power(
     return res
 
 
+@timed('ao_bin_utility_seconds', function='get_items_above_ip')
 def get_items_above_ip(
         unique_item_name,
         ip,
@@ -277,7 +287,7 @@ def get_items_above_ip(
 
     Parameters
     ----------
-    unique_item_name: str
+    unique_item_name: str or ItemId
         The unique item name of the item type. Only the base item matters.
     ip: int
         The IP above which items will be returned.
@@ -297,26 +307,39 @@ def get_items_above_ip(
 
         The item's name will have the enchant level if present.
     """
-    pattern = re.compile(TIER_FINDER)
-
-    unique_item_name = unique_item_name.split('@')[0]
-
     ip = abs(ip)
 
     res = []
 
-    for tier in range(min_tier, 9):
-        for enchant in range(0, 5):
-            item_name = (
-                f"T{tier}_" + pattern.split(unique_item_name)[-1]
-                + (f"@{enchant}" if enchant > 0 and enchant < 5 else '')
-            )
-
-            for quality in range(1, 6):
-                curr_ip = get_item_power(item_name, quality, mastery, ao_data)
-                if curr_ip >= ip:
-                    res.append(
-                        (item_name, quality)
-                    )
+    for item_id in ItemId.parse(unique_item_name).variants(min_tier):
+        for quality in range(1, 6):
+            curr_ip = get_item_power(item_id, quality, mastery, ao_data)
+            if curr_ip >= ip:
+                res.append(
+                    (item_id.name, quality)
+                )
 
     return res
+
+
+def get_item_variants(unique_item_name, min_tier) -> List:
+    """Return the unique names of every tier/enchant version of an item.
+
+    Parameters
+    ----------
+    unique_item_name: str or ItemId
+        The unique item name of the item type. Only the base item matters.
+    min_tier: int
+        The lowest tier to include.
+
+    Returns
+    -------
+    list
+        Unique names from tier min_tier to 8 and enchant level 0 to 4,
+        ordered by tier then enchant level, e.g.
+
+        ['T7_OFF_SHIELD', 'T7_OFF_SHIELD@1', ..., 'T8_OFF_SHIELD@4']
+    """
+    return [
+        x.name for x in ItemId.parse(unique_item_name).variants(min_tier)
+    ]
@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+import json
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+from xml.parsers import expat
+
+from ao_bin_utils.ao_bin_convert import find_pairs, write_json
+from ao_bin_utils.ao_bin_templates import (
+    CLUSTER_SUFFIX, INST_ID, INST_REF, TEMPLATE_SUFFIX, file_hash,
+    parse_cluster
+)
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR.parent
+MANIFEST_FILE = BASE_DIR / 'cache' / 'validate_manifest.json'
+
+PATCH_SUFFIX = '_patch.xml'
+PATCH_OPERATIONS = ('add', 'replace', 'remove')
+PATCH_FINDER = r"^(.+?)(_[a-z]+)?_patch\.xml$"
+BARE_VALUE_FINDER = r"(\[@[\w:.-]+=)([^'\"\]]+)\]"
+
+
+def find_patch_base(patch_file) -> Path:
+    """Returns the XML file a patch applies to, None if it is missing.
+
+    Regional patches like 'times_asia_patch.xml' apply to the shared file,
+    'times.xml', or to the regional file if there is no shared one.
+    """
+
+    patch_file = Path(patch_file)
+    match = re.match(PATCH_FINDER, patch_file.name)
+    if match is None:
+        return None
+
+    name, region = match.groups()
+    for base in [f'{name}.xml', f'{name}{region or ""}.xml']:
+        if (patch_file.parent / base).exists():
+            return patch_file.parent / base
+
+    return None
+
+
+class _Comparer():
+    """Text sink comparing what is written to it with a file, chunk by
+    chunk, so neither side is held in memory.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.line = 1
+        self.mismatch = None
+
+    def write(self, text: str) -> None:
+        if self.mismatch is not None:
+            return
+
+        expected = self.f.read(len(text))
+        if expected == text:
+            self.line += text.count('\n')
+            return
+
+        i = next(
+            (i for i, (a, b) in enumerate(zip(text, expected)) if a != b),
+            min(len(text), len(expected))
+        )
+        self.mismatch = self.line + text.count('\n', 0, i)
+
+    def close(self) -> int:
+        """Returns the first line that differs, None if nothing does."""
+
+        if self.mismatch is None and self.f.read(1):
+            self.mismatch = self.line
+
+        return self.mismatch
+
+
+def check_pair(xml_file) -> List:
+    """Checks that a JSON file is the conversion of its XML sibling.
+
+    The XML is converted with write_json and compared with the JSON file
+    as it is written, see ao_bin_convert.
+
+    Parameters
+    ----------
+    xml_file: str or Path
+        Location of the XML file.
+
+    Returns
+    -------
+    list
+        Error messages, empty if the files agree.
+    """
+
+    xml_file = Path(xml_file)
+    json_file = xml_file.with_suffix('.json')
+
+    try:
+        with open(json_file, encoding='utf-8-sig', newline='') as f:
+            comparer = _Comparer(f)
+            write_json(xml_file.read_bytes(), comparer)
+            line = comparer.close()
+    except OSError as e:
+        return [f'{json_file.name}: {e.strerror}']
+    except expat.ExpatError as e:
+        return [f'{xml_file.name}: {e}']
+
+    if line is None:
+        return []
+
+    return [f'{json_file.name}:{line}: differs from {xml_file.name}']
+
+
+def to_path(sel: str) -> tuple:
+    """Splits a patch selector into its root tag and an ElementTree path.
+
+    e.g. "Times/DateTime[@uniquename='X']" is ('Times',
+    "DateTime[@uniquename='X']"). Unquoted predicate values like [@id=4]
+    are quoted, ElementTree only accepts quoted ones.
+    """
+
+    root, _, path = sel.strip().lstrip('/').partition('/')
+
+    return root, re.sub(BARE_VALUE_FINDER, r"\1'\2']", path)
+
+
+def read_selectors(data: bytes) -> List:
+    """Returns the (line, operation, sel) of each operation of a patch."""
+
+    res = []
+    depth = 0
+    parser = expat.ParserCreate()
+
+    def start(name, attributes):
+        nonlocal depth
+        depth += 1
+        if depth == 2 and name in PATCH_OPERATIONS:
+            res.append(
+                (parser.CurrentLineNumber, name, attributes.get('sel'))
+            )
+
+    def end(name):
+        nonlocal depth
+        depth -= 1
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.Parse(data, True)
+
+    return res
+
+
+def check_patch(patch_file, base_file) -> List:
+    """Checks that every selector of a patch matches its base file.
+
+    An 'add' selects the parent the new nodes are added to, a 'replace'
+    or 'remove' the nodes themselves, so each must match at least one
+    element. Selectors are resolved against the base file as shipped, not
+    against the result of the patch's earlier operations.
+
+    Parameters
+    ----------
+    patch_file: str or Path
+        Location of the *_patch.xml file.
+    base_file: str or Path
+        Location of the XML file the patch applies to, see find_patch_base.
+
+    Returns
+    -------
+    list
+        Error messages, empty if every selector resolves.
+    """
+
+    patch_file = Path(patch_file)
+    if base_file is None:
+        return [f'{patch_file.name}: no file to apply the patch to']
+
+    base_file = Path(base_file)
+    try:
+        selectors = read_selectors(patch_file.read_bytes())
+        root = ET.fromstring(base_file.read_bytes())
+    except (expat.ExpatError, ET.ParseError) as e:
+        return [f'{patch_file.name}: {e}']
+
+    res = []
+    for line, operation, sel in selectors:
+        if not sel:
+            res.append(f'{patch_file.name}:{line}: {operation} without sel')
+            continue
+
+        root_tag, path = to_path(sel)
+        try:
+            found = root_tag == root.tag and (
+                not path or root.find(path) is not None
+            )
+        except SyntaxError:
+            res.append(
+                f'{patch_file.name}:{line}: unsupported selector "{sel}"'
+            )
+            continue
+
+        if not found:
+            res.append(
+                f'{patch_file.name}:{line}: {operation} selector "{sel}" '
+                f'matches nothing in {base_file.name}'
+            )
+
+    return res
+
+
+def read_cluster_refs(cluster_file) -> List:
+    """Returns the [instance id, ref] of each template instance."""
+
+    return [
+        [x[INST_ID], x[INST_REF]]
+        for x in parse_cluster(Path(cluster_file).read_bytes())['instances']
+    ]
+
+
+def _run_check(args) -> tuple:
+    """Process pool worker, runs a check unless its files are unchanged.
+
+    The result is the check's error messages, or the template refs for a
+    cluster since those are checked against the current templates by
+    validate.
+    """
+
+    key, kind, files, old_hashes = args
+    hashes = []
+    for fp in files:
+        try:
+            hashes.append(file_hash(Path(fp).read_bytes()))
+        except OSError:
+            hashes.append(None)
+    if hashes == old_hashes:
+        return key, hashes, None
+
+    if kind == 'pair':
+        res = check_pair(files[0])
+    elif kind == 'patch':
+        res = check_patch(files[0], files[1] if len(files) > 1 else None)
+    else:
+        try:
+            res = read_cluster_refs(files[0])
+        except ET.ParseError as e:
+            res = {'error': f'{Path(files[0]).name}: {e}'}
+
+    return key, hashes, res
+
+
+def _discover(data_dir: Path) -> Dict:
+    """Returns check key to (kind, relative paths of the files it reads)."""
+
+    res = {}
+    for xml_file in find_pairs(data_dir):
+        res[f'pair:{xml_file.name}'] = (
+            'pair', [xml_file.name, xml_file.with_suffix('.json').name]
+        )
+    for patch_file in sorted(data_dir.glob(f'*{PATCH_SUFFIX}')):
+        base_file = find_patch_base(patch_file)
+        res[f'patch:{patch_file.name}'] = ('patch', [patch_file.name] + (
+            [base_file.name] if base_file is not None else []
+        ))
+    for fp in sorted(data_dir.glob(f'cluster/*{CLUSTER_SUFFIX}')):
+        rel_path = fp.relative_to(data_dir).as_posix()
+        res[f'cluster:{rel_path}'] = ('cluster', [rel_path])
+
+    return res
+
+
+def validate(
+        data_dir=DATA_DIR,
+        manifest_file=MANIFEST_FILE,
+        workers: int = None,
+        force: bool = False) -> Dict:
+    """Checks the consistency of the dump, rechecking only what changed.
+
+    Three checks are run:
+
+    - every JSON file is the conversion of its XML sibling,
+    - every selector of a *_patch.xml file matches its base file,
+    - every template a cluster instantiates exists in a template folder.
+
+    The manifest stores the stat and content hash of each file read and
+    the result of each check. A check only runs again when the hash of
+    one of its files changed, and a file is only hashed when its mtime or
+    size changed, so a warm run mostly stats files. Checks that run are
+    spread across a process pool. Cluster refs are kept in the manifest
+    and checked against the template names on every run, which only lists
+    the template folders, so removed templates are always caught.
+
+    Parameters
+    ----------
+    data_dir: str or Path
+        Folder containing the dump.
+    manifest_file: str or Path
+        Location of the manifest.
+    workers: int
+        Number of worker processes. (default: one per CPU)
+    force: bool
+        If true, every check runs.
+
+    Returns
+    -------
+    dictionary
+        'checked' and 'unchanged' check counts and 'errors', a dictionary
+        of file name to error messages for the files with errors.
+    """
+
+    data_dir = Path(data_dir)
+    manifest_file = Path(manifest_file)
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        files, results = manifest['files'], manifest['results']
+    except (OSError, ValueError, KeyError):
+        files, results = {}, {}
+
+    checks = _discover(data_dir)
+    stats = {}
+    for _, rel_paths in checks.values():
+        for rel_path in rel_paths:
+            if rel_path not in stats:
+                try:
+                    stat = (data_dir / rel_path).stat()
+                    stats[rel_path] = [stat.st_mtime_ns, stat.st_size]
+                except OSError:
+                    stats[rel_path] = None
+
+    jobs = []
+    res = {'checked': 0, 'unchanged': 0, 'errors': {}}
+    for key, (kind, rel_paths) in checks.items():
+        result = results.get(key)
+        hashes = [
+            files[x]['hash'] if x in files and files[x]['stat'] == stats[x]
+            else None for x in rel_paths
+        ]
+        if (
+            not force and result is not None
+            and None not in hashes and hashes == result['hashes']
+        ):
+            res['unchanged'] += 1
+            continue
+        jobs.append((
+            key,
+            kind,
+            [str(data_dir / x) for x in rel_paths],
+            None if force or result is None else result['hashes'],
+        ))
+
+    if jobs:
+        with ProcessPoolExecutor(workers) as executor:
+            for key, hashes, value in executor.map(
+                _run_check, jobs, chunksize=16
+            ):
+                _, rel_paths = checks[key]
+                for rel_path, content_hash in zip(rel_paths, hashes):
+                    files[rel_path] = {
+                        'stat': stats[rel_path], 'hash': content_hash
+                    }
+                if value is None:
+                    res['unchanged'] += 1
+                    value = results[key]['value']
+                else:
+                    res['checked'] += 1
+                results[key] = {'hashes': hashes, 'value': value}
+
+    templates = {
+        fp.name[:-len(TEMPLATE_SUFFIX)]
+        for fp in data_dir.glob(f'templates/*/*{TEMPLATE_SUFFIX}')
+    }
+    for key, (kind, rel_paths) in checks.items():
+        value = results[key]['value']
+        if kind != 'cluster':
+            errors = value
+        elif isinstance(value, dict):
+            errors = [value['error']]
+        else:
+            errors = [
+                f'{rel_paths[0]}: {instance_id} refers to missing template '
+                f'{ref}'
+                for instance_id, ref in value if ref not in templates
+            ]
+        if errors:
+            res['errors'].setdefault(rel_paths[0], []).extend(errors)
+
+    # Forget files and checks that are gone from the dump
+    used = {x for _, rel_paths in checks.values() for x in rel_paths}
+    manifest = {
+        'files': {k: v for k, v in files.items() if k in used},
+        'results': {k: v for k, v in results.items() if k in checks},
+    }
+    if jobs or len(manifest['results']) != len(results):
+        manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+
+    return res
+
+
+if __name__ == "__main__":
+    print(json.dumps(validate(), indent=2))
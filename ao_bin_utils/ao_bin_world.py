@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import json
+import re
+import xml.etree.ElementTree as ET
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR.parent
+WORLD_FILE = DATA_DIR / 'cluster' / 'world_asia.xml'
+NAME_FILE = DATA_DIR / 'formatted' / 'world.json'
+GRAPH_FILE = BASE_DIR / 'cache' / 'world_graph.npz'
+
+TIER_FINDER = r"^T(\d)$"
+UNREACHABLE = -1
+
+
+def parse_cluster_tags(file_name: str) -> Dict:
+    """Splits a cluster file name into its zone tags.
+
+    e.g. '0201_WRL_SW_AUTO_T5_KPR_ROY.cluster.xml' has kind 'WRL', tier 5
+    and the tags ['WRL', 'SW', 'AUTO', 'T5', 'KPR', 'ROY'].
+
+    Returns
+    -------
+    dictionary
+        'kind': str, the second part of the name, e.g. 'WRL' or 'CTY'.
+        'tier': int, 0 if the name has no tier.
+        'tags': list of every part after the cluster's index.
+    """
+
+    parts = file_name.split('.')[0].split('_')[1:]
+    tier = 0
+    for part in parts:
+        match = re.match(TIER_FINDER, part)
+        if match:
+            tier = int(match[1])
+
+    return {
+        'kind': parts[0] if parts else '',
+        'tier': tier,
+        'tags': parts,
+    }
+
+
+def parse_world(world_file=WORLD_FILE, enabled_only: bool = True) -> Dict:
+    """Reads the clusters and the exits linking them from a world file.
+
+    Exits to other clusters have a targetid of '{exit id}@{cluster id}'.
+    Exits to dungeons and other instances have no cluster and are left
+    out.
+
+    Parameters
+    ----------
+    world_file: str or Path
+        Location of the world XML file.
+    enabled_only: bool
+        If true, disabled clusters and the exits to them are left out.
+
+    Returns
+    -------
+    dictionary
+        'clusters': List of dictionaries with the cluster's 'id', 'file',
+        'name', 'type' and its parse_cluster_tags.
+        'edges': List of (cluster id, cluster id) exits, without duplicates.
+    """
+
+    root = ET.parse(world_file).getroot()
+
+    clusters = []
+    edges = []
+    for cluster in root.find('clusters').iter('cluster'):
+        if enabled_only and cluster.get('enabled') != 'true':
+            continue
+
+        clusters.append({
+            'id': cluster.get('id'),
+            'file': cluster.get('file', ''),
+            'name': cluster.get('displayname', ''),
+            'type': cluster.get('type', ''),
+            **parse_cluster_tags(cluster.get('file', '')),
+        })
+
+        exits = cluster.find('exits')
+        for exit_ in (exits if exits is not None else []):
+            target = exit_.get('targetid', '')
+            if exit_.get('targettype') == 'Cluster' and '@' in target:
+                edges.append((cluster.get('id'), target.split('@', 1)[1]))
+
+    ids = {x['id'] for x in clusters}
+    edges = [x for x in dict.fromkeys(edges) if x[1] in ids]
+
+    return {'clusters': clusters, 'edges': edges}
+
+
+def to_csr(n: int, edges: np.ndarray) -> tuple:
+    """Returns the (indptr, indices) CSR arrays of a directed edge list.
+
+    Parameters
+    ----------
+    n: int
+        Number of nodes.
+    edges: numpy array
+        (m, 2) array of (source, target) node indices.
+    """
+
+    order = np.lexsort((edges[:, 1], edges[:, 0]))
+    indices = np.asarray(edges[order, 1], dtype=np.int32)
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(edges[:, 0], minlength=n), out=indptr[1:])
+
+    return indptr, indices
+
+
+def bfs(indptr, indices, source: int, allowed=None) -> np.ndarray:
+    """Returns the hop count from source to every node.
+
+    Parameters
+    ----------
+    indptr, indices: numpy array
+        The graph in CSR form.
+    source: int
+        Node to start from.
+    allowed: numpy array
+        Boolean mask of the nodes a route may pass through. (default: all)
+
+    Returns
+    -------
+    numpy array
+        Hop counts, UNREACHABLE for nodes that can't be reached.
+    """
+
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    allowed = allowed.tolist() if allowed is not None else None
+
+    res = [UNREACHABLE]*(len(indptr) - 1)
+    res[source] = 0
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        hops = res[node] + 1
+        for target in indices[indptr[node]:indptr[node + 1]]:
+            if res[target] == UNREACHABLE and (
+                allowed is None or allowed[target]
+            ):
+                res[target] = hops
+                queue.append(target)
+
+    return np.array(res, dtype=np.int16)
+
+
+class AoBinWorld():
+    """Routes between clusters over the exits linking them.
+
+    The graph is kept as CSR arrays with the hop count between every pair
+    of clusters. Both are cached to GRAPH_FILE and rebuilt when the world
+    file changes. Routes are answered from the hop counts and kept in an
+    LRU cache. Routes restricted to some zones run a BFS over the allowed
+    clusters instead and are cached the same way.
+
+    ...
+
+    Attributes
+    ----------
+    clusters: list
+        Cluster dictionaries, indexed by node, as returned by parse_world.
+    indptr, indices: numpy array
+        The exits in CSR form, indexed by node.
+    hops: numpy array
+        (n, n) int16 hop counts, UNREACHABLE if there is no route.
+
+    Methods
+    -------
+    node(cluster):
+        Returns the node of a cluster id, name or file name.
+    neighbours(cluster):
+        Returns the ids of the clusters an exit leads to.
+    distance(source, target):
+        Returns the number of exits on the shortest route.
+    route(source, target, kinds, tags, max_tier):
+        Returns the cluster ids along a shortest route.
+    allowed(kinds, tags, max_tier):
+        Returns the mask of the clusters matching zone filters.
+    """
+
+    def __init__(
+            self,
+            world_file=WORLD_FILE,
+            name_file=NAME_FILE,
+            graph_file=GRAPH_FILE,
+            cache_size: int = 65536):
+        """Constructor loads the cached graph or builds it.
+
+        Parameters
+        ----------
+        world_file: str or Path
+            Location of the world XML file.
+        name_file: str or Path
+            Location of formatted/world.json, used for cluster names.
+            Clusters it doesn't list keep the world file's display name.
+        graph_file: str or Path
+            Location of the cached graph, None to not cache it.
+        cache_size: int
+            Number of routes to keep in the LRU cache.
+        """
+
+        world_file = Path(world_file)
+        stat = world_file.stat()
+        signature = [stat.st_mtime_ns, stat.st_size]
+
+        world = parse_world(world_file)
+        self.clusters = world['clusters']
+        self._nodes = {}
+        for i, x in enumerate(self.clusters):
+            self._nodes[x['id']] = i
+
+        names = {}
+        if name_file is not None and Path(name_file).exists():
+            with open(name_file, encoding='utf8') as f:
+                names = {x['Index']: x['UniqueName'] for x in json.load(f)}
+        for i, x in enumerate(self.clusters):
+            x['name'] = names.get(x['id'], x['name'])
+            self._nodes.setdefault(x['name'], i)
+            self._nodes.setdefault(x['file'].split('.')[0], i)
+
+        if not self._load(graph_file, signature):
+            self._build(world['edges'])
+            if graph_file is not None:
+                self._save(graph_file, signature)
+
+        # Reversed exits, filtered routes search backwards from the target
+        sources = np.repeat(
+            np.arange(len(self.clusters)), np.diff(self.indptr)
+        )
+        self._reverse = to_csr(
+            len(self.clusters), np.stack([self.indices, sources], axis=1)
+        )
+
+        self._route = lru_cache(maxsize=cache_size)(self._find_route)
+
+    def _build(self, edges: List) -> None:
+        """Builds the CSR arrays and the hop counts."""
+
+        n = len(self.clusters)
+        edges = np.array(
+            [(self._nodes[a], self._nodes[b]) for a, b in edges],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        self.indptr, self.indices = to_csr(n, edges)
+        self.hops = np.stack([
+            bfs(self.indptr, self.indices, i) for i in range(n)
+        ]) if n else np.zeros((0, 0), dtype=np.int16)
+
+    def _load(self, graph_file, signature: List) -> bool:
+        """Loads the cached graph, returns false if it is missing or stale."""
+
+        try:
+            with np.load(graph_file) as cached:
+                if (
+                    cached['signature'].tolist() != signature
+                    or len(cached['indptr']) != len(self.clusters) + 1
+                ):
+                    return False
+                self.indptr = cached['indptr']
+                self.indices = cached['indices']
+                self.hops = cached['hops']
+        except (OSError, KeyError, ValueError, TypeError):
+            return False
+
+        return True
+
+    def _save(self, graph_file, signature: List) -> None:
+        graph_file = Path(graph_file)
+        graph_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(graph_file, 'wb') as f:
+            np.savez(
+                f,
+                signature=np.array(signature, dtype=np.int64),
+                indptr=self.indptr,
+                indices=self.indices,
+                hops=self.hops,
+            )
+
+    def node(self, cluster: str) -> int:
+        """Returns the node of a cluster id, name or file name.
+
+        Raises KeyError if the cluster isn't found.
+        """
+
+        return self._nodes[cluster]
+
+    def neighbours(self, cluster: str) -> List:
+        """Returns the ids of the clusters an exit leads to."""
+
+        i = self.node(cluster)
+
+        return [
+            self.clusters[x]['id']
+            for x in self.indices[self.indptr[i]:self.indptr[i + 1]]
+        ]
+
+    def distance(self, source: str, target: str) -> int:
+        """Returns the number of exits on the shortest route.
+
+        Returns
+        -------
+        int
+            Number of exits, UNREACHABLE if there is no route.
+        """
+
+        return int(self.hops[self.node(source), self.node(target)])
+
+    def allowed(
+            self,
+            kinds: List = None,
+            tags: List = None,
+            max_tier: int = None) -> np.ndarray:
+        """Returns the mask of the clusters matching zone filters.
+
+        Parameters
+        ----------
+        kinds: list of str
+            Kinds a cluster may have, e.g. ['WRL', 'CTY']. (default: any)
+        tags: list of str
+            Tags a cluster must have one of, e.g. ['ROY']. (default: any)
+        max_tier: int
+            Highest tier a cluster may have. (default: any)
+
+        Returns
+        -------
+        numpy array
+            Boolean mask indexed by node.
+        """
+
+        kinds = set(kinds) if kinds is not None else None
+        tags = set(tags) if tags is not None else None
+
+        return np.array([
+            (kinds is None or x['kind'] in kinds)
+            and (tags is None or not tags.isdisjoint(x['tags']))
+            and (max_tier is None or x['tier'] <= max_tier)
+            for x in self.clusters
+        ], dtype=bool)
+
+    def _find_route(self, source: int, target: int, filters: tuple) -> tuple:
+        """Returns the nodes of a shortest route, empty if there is none."""
+
+        if filters == (None, None, None):
+            hops = self.hops[:, target]
+        else:
+            allowed = self.allowed(*filters)
+            allowed[[source, target]] = True
+            hops = bfs(*self._reverse, target, allowed)
+
+        if hops[source] == UNREACHABLE:
+            return ()
+
+        res = [source]
+        node = source
+        while node != target:
+            for x in self.indices[self.indptr[node]:self.indptr[node + 1]]:
+                if hops[x] == hops[node] - 1:
+                    node = int(x)
+                    break
+            res.append(node)
+
+        return tuple(res)
+
+    def route(
+            self,
+            source: str,
+            target: str,
+            kinds: List = None,
+            tags: List = None,
+            max_tier: int = None) -> List:
+        """Returns the cluster ids along a shortest route.
+
+        Parameters
+        ----------
+        source: str
+            Id, name or file name of the cluster to start from.
+        target: str
+            Id, name or file name of the cluster to reach.
+        kinds, tags, max_tier:
+            Zone filters for the clusters in between, see allowed. The
+            source and target are always allowed.
+
+        Returns
+        -------
+        list
+            Cluster ids from source to target, both included. Empty if
+            there is no route.
+        """
+
+        filters = (
+            tuple(sorted(kinds)) if kinds is not None else None,
+            tuple(sorted(tags)) if tags is not None else None,
+            max_tier,
+        )
+        nodes = self._route(self.node(source), self.node(target), filters)
+
+        return [self.clusters[x]['id'] for x in nodes]
+
+
+if __name__ == "__main__":
+    world = AoBinWorld()
+    print(world.route('Swamp Cross', 'Martlock'))
@@ -1,8 +1,48 @@
+import asyncio
+import io
+import json
+import os
+import pickle
+import sqlite3
+import subprocess
+import tempfile
+import time
 import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
 
 from ao_bin_data import AoBinData
 import ao_bin_utilities as abu
 import ao_bin_utils.ao_bin_tools as aot
+import ao_bin_utils.ao_bin_export as abe
+from ao_bin_utils.ao_bin_catalog import AoBinCatalog, AoBinTable
+from ao_bin_utils.ao_bin_loot import AoBinLoot
+from ao_bin_utils.ao_bin_crafting import AoBinCrafting
+from ao_bin_utils.ao_bin_templates import AoBinTemplateIndex
+import ao_bin_utils.ao_bin_geometry as abg
+import ao_bin_utils.ao_bin_convert as abc
+import ao_bin_utils.ao_bin_names as abn
+from ao_bin_utils.ao_bin_localization import AoBinLocalization
+from ao_bin_utils.ao_bin_world import UNREACHABLE, AoBinWorld
+import ao_bin_utils.ao_bin_benchmark as abb
+from ao_bin_utils.ao_bin_metrics import METRICS, AoBinMetrics
+from ao_bin_utils.ao_bin_data import AoBinData as PackageAoBinData
+import ao_bin_utils.ao_bin_cli as abcli
+from ao_bin_utils.ao_bin_item_id import ItemId
+from ao_bin_utils.ao_bin_data import SingletonMeta
+from ao_bin_utils.ao_bin_reload import AoBinDataReloader
+from ao_bin_utils.ao_bin_service import AoBinService, PriceCache
+import ao_bin_utils.ao_bin_loadtest as ablt
+from ao_bin_utils.ao_bin_ip_index import AoBinIpIndex
+import ao_bin_utils.ao_bin_arbitrage as aba
+import ao_bin_utils.ao_bin_validate as abv
+from ao_bin_utils.ao_bin_progression import AoBinProgression
+from ao_bin_utils.ao_bin_resources import AoBinResources
+from ao_bin_utils.ao_bin_history import AoBinPriceHistory
+import ao_bin_utils.ao_bin_search as abse
+import ao_bin_utils.ao_bin_spawns as absp
 
 import sys
 sys.path.insert(0, 'E:\\GitHub_Repos\\ao-bin-dumps\\')
@@ -120,5 +160,1623 @@ class UnitTests(unittest.TestCase):
         self.assertTrue(self._ao.generate_fixture())
 
 
+class ExportTests(unittest.TestCase):
+
+    def setUp(self):
+        items = [
+            {
+                '@uniquename': 'T5_OFF_SHIELD',
+                '@tier': '5',
+                '@shopcategory': 'offhand',
+                '@shopsubcategory1': 'shield',
+                '@itempower': '800',
+                '@masterymodifier': '0.05',
+                'enchantments': {'enchantment': [
+                    {'@enchantmentlevel': '1', '@itempower': '900'},
+                    {'@enchantmentlevel': '2', '@itempower': '1000'},
+                ]},
+            },
+            {
+                '@uniquename': 'T6_BAG',
+                '@tier': '6',
+                '@shopcategory': 'accessories',
+                '@shopsubcategory1': 'bag',
+                '@itempower': '900',
+                'enchantments': {'enchantment': {
+                    '@enchantmentlevel': '1', '@itempower': '1000'
+                }},
+            },
+        ]
+        self._ao = PackageAoBinData.__new__(PackageAoBinData)
+        self._ao._item_name = {
+            "Expert's Shield": items[0], "Master's Bag": items[1],
+        }
+        self._ao._game = {'Items': {'QualityLevels': {'qualitylevel': [
+            {'@level': str(x), '@itempowerbonus': str(b)}
+            for x, b in [(2, 10), (3, 20), (4, 50), (5, 100)]
+        ]}}}
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._output_dir = Path(self._tmp_dir.name)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_export_sqlite(self):
+        db = abe.export_sqlite(self._ao, self._output_dir / 'ao_bin.sqlite3')
+        con = sqlite3.connect(db)
+        try:
+            items = con.execute(
+                'SELECT unique_name, local_name, tier, shop_subcategory, '
+                'item_power, mastery_modifier FROM items ORDER BY unique_name'
+            ).fetchall()
+            qualities = con.execute(
+                'SELECT * FROM quality_levels ORDER BY level'
+            ).fetchall()
+            item_powers = con.execute(
+                'SELECT enchant, quality, item_power FROM item_powers '
+                'WHERE unique_name = ? ORDER BY enchant, quality',
+                ('T6_BAG',)
+            ).fetchall()
+            data = json.loads(con.execute(
+                'SELECT data FROM items WHERE local_name = ?',
+                ("Expert's Shield",)
+            ).fetchone()[0])
+        finally:
+            con.close()
+
+        self.assertListEqual(items, [
+            ('T5_OFF_SHIELD', "Expert's Shield", 5, 'shield', 800, 0.05),
+            ('T6_BAG', "Master's Bag", 6, 'bag', 900, 0),
+        ])
+        self.assertListEqual(
+            qualities, [(1, 0), (2, 10), (3, 20), (4, 50), (5, 100)]
+        )
+        self.assertListEqual(item_powers, [
+            (0, 1, 900), (0, 2, 910), (0, 3, 920), (0, 4, 950), (0, 5, 1000),
+            (1, 1, 1000), (1, 2, 1010), (1, 3, 1020), (1, 4, 1050),
+            (1, 5, 1100),
+        ])
+        self.assertDictEqual(data, self._ao._item_name["Expert's Shield"])
+
+    def test_export_jsonl(self):
+        files = abe.export_jsonl(self._ao, self._output_dir)
+        self.assertListEqual(
+            [x.name for x in files],
+            ['items.jsonl', 'quality_levels.jsonl', 'item_powers.jsonl']
+        )
+
+        lines = {}
+        for output_file in files:
+            with open(output_file, encoding='utf8') as f:
+                lines[output_file.stem] = [
+                    json.loads(x) for x in f.read().splitlines()
+                ]
+
+        self.assertEqual(len(lines['items']), 2)
+        self.assertDictEqual(
+            {k: v for k, v in lines['items'][1].items() if k != 'data'},
+            {
+                'unique_name': 'T6_BAG',
+                'local_name': "Master's Bag",
+                'tier': 6,
+                'shop_category': 'accessories',
+                'shop_subcategory': 'bag',
+                'item_power': 900,
+                'mastery_modifier': 0.0,
+            }
+        )
+        self.assertDictEqual(
+            lines['quality_levels'][0], {'level': 1, 'item_power_bonus': 0}
+        )
+        # Shield: 3 enchant levels, bag: 2, 5 qualities each
+        self.assertEqual(len(lines['item_powers']), 25)
+        self.assertIn(
+            {
+                'unique_name': 'T5_OFF_SHIELD', 'enchant': 1, 'quality': 2,
+                'item_power': 910,
+            },
+            lines['item_powers']
+        )
+
+    def test_export_columnar(self):
+        output_file = abe.export_columnar(
+            self._ao, self._output_dir / 'ao_bin.npz'
+        )
+        with np.load(output_file) as arrays:
+            self.assertListEqual(
+                arrays['items.unique_name'].tolist(),
+                ['T5_OFF_SHIELD', 'T6_BAG']
+            )
+            self.assertListEqual(arrays['items.tier'].tolist(), [5, 6])
+            self.assertListEqual(
+                arrays['quality_levels.item_power_bonus'].tolist(),
+                [0, 10, 20, 50, 100]
+            )
+
+            names = arrays['item_powers.names'].tolist()
+            self.assertListEqual(names, ['T5_OFF_SHIELD', 'T6_BAG'])
+            match = (
+                (arrays['item_powers.name_index']
+                    == names.index('T5_OFF_SHIELD'))
+                & (arrays['item_powers.enchant'] == 1)
+                & (arrays['item_powers.quality'] == 2)
+            )
+            self.assertListEqual(
+                arrays['item_powers.item_power'][match].tolist(), [910]
+            )
+            self.assertEqual(len(arrays['item_powers.item_power']), 25)
+
+
+class CatalogTests(unittest.TestCase):
+
+    def setUp(self):
+        self._catalog = AoBinCatalog()
+
+    def test_find(self):
+        records = self._catalog.find(
+            'progressiontables', '@uniquename', 'PROGRESSION_PVE'
+        )
+        self.assertEqual(len(records), 1)
+
+    def test_find_references(self):
+        addresses = self._catalog.find_references('T6_BAG')
+        self.assertIn('buildings', [x[0] for x in addresses])
+
+    def test_build_reverse_index(self):
+        index = self._catalog.build_reverse_index(save=False)
+
+        self.assertIn('T6_BAG', index)
+        enchanted = 'T8_MOUNT_RABBIT_EASTER_DARK@1'
+        for address in index[enchanted]:
+            self.assertIn(address, index[enchanted.split('@')[0]])
+
+        for k in ['', 'true', 'false']:
+            self.assertNotIn(k, index)
+
+
+class LootTests(unittest.TestCase):
+
+    class _Catalog():
+        """Catalog stand-in serving a hand written loot table."""
+
+        def __init__(self, lootlists):
+            self._table = AoBinTable('loot', {'Lootlist': lootlists})
+
+        def get_table(self, name):
+            return self._table
+
+    def setUp(self):
+        self._loot = AoBinLoot()
+
+    def test_expected(self):
+        self.assertDictEqual(
+            self._loot.expected('LOOT_TESTCASE_01'),
+            {'UNIQUE_CONSUMABLE_EVENT_HALLOWEEN_CANDY': 2.0}
+        )
+
+    def test_expected_or(self):
+        loot = AoBinLoot(self._Catalog([{
+            '@name': 'TEST_OR',
+            'OR': {
+                '@chance': '0.5',
+                'Item': [
+                    {'@type': 'T4_BAG', '@amount': '1', '@weight': '3'},
+                    {
+                        '@type': 'T5_BAG',
+                        '@amount': '2-4',
+                        '@weight': '1',
+                        '@enchantmentlevel': '1',
+                    },
+                ],
+            },
+        }]))
+
+        self.assertDictEqual(
+            loot.expected('TEST_OR'), {'T4_BAG': 0.375, 'T5_BAG@1': 0.375}
+        )
+
+    def test_expected_cycle(self):
+        loot = AoBinLoot(self._Catalog([
+            {'@name': 'A', 'LootListReference': {'@name': 'B'}},
+            {'@name': 'B', 'LootListReference': {'@name': 'A'}},
+        ]))
+
+        with self.assertRaisesRegex(ValueError, 'A -> B -> A'):
+            loot.expected('A')
+        with self.assertRaisesRegex(ValueError, 'A -> B -> A'):
+            loot.simulate('A', 10, seed=0)
+
+    def test_simulate(self):
+        name = 'T4_LOOT_RD_TOKEN'
+        drops = self._loot.simulate(name, 200000, seed=1)['drops']
+
+        for k, v in self._loot.expected(name).items():
+            self.assertAlmostEqual(drops.get(k, 0), v, delta=0.02*v + 0.01)
+
+
+class CraftingTests(unittest.TestCase):
+
+    class _AoData():
+        """AoBinData stand-in with a two level recipe."""
+
+        def get_items(self):
+            return [
+                ("Adept's Planks", {
+                    '@uniquename': 'T4_PLANKS',
+                    'craftingrequirements': {
+                        'craftresource': [
+                            {'@uniquename': 'T4_WOOD', '@count': '2'},
+                            {'@uniquename': 'T3_PLANKS', '@count': '1'},
+                        ],
+                    },
+                }),
+                ("Adept's Bow", {
+                    '@uniquename': 'T4_2H_BOW',
+                    'craftingrequirements': {
+                        '@silver': '10',
+                        'craftresource': {
+                            '@uniquename': 'T4_PLANKS', '@count': '32'
+                        },
+                    },
+                }),
+            ]
+
+    def setUp(self):
+        self._crafting = AoBinCrafting(self._AoData())
+
+    def test_get_leaves(self):
+        self.assertListEqual(
+            self._crafting.get_leaves(['T4_2H_BOW']), ['T3_PLANKS', 'T4_WOOD']
+        )
+
+    def test_get_craft_costs(self):
+        prices = {'T4_WOOD': 10, 'T3_PLANKS': 5}
+        self.assertDictEqual(
+            self._crafting.get_craft_costs(['T4_2H_BOW'], prices),
+            {'T4_2H_BOW': 10 + 32*25}
+        )
+
+        # Buying the planks is cheaper than crafting them
+        prices['T4_PLANKS'] = 20
+        self.assertDictEqual(
+            self._crafting.get_craft_costs(['T4_2H_BOW'], prices),
+            {'T4_2H_BOW': 10 + 32*20}
+        )
+
+
+class TemplateIndexTests(unittest.TestCase):
+
+    TEMPLATE = (
+        '<template>'
+        '<criticalscenemembers>'
+        '<criticalscenemember id="exit_01" type="exit" layerId="Layer_01">'
+        '<tile name="Exit" pos="10 0 0"><exit kind="Cluster" /></tile>'
+        '</criticalscenemember>'
+        '</criticalscenemembers>'
+        '<tiles><layergroup name="Main"><layer id="Layer_02" name="Mobs">'
+        '<tile name="BUSH" pos="1 0 1" />'
+        '<tile name="Spawn" pos="0 0 5"><mobspawnpoint behavior="GUARD" />'
+        '</tile>'
+        '</layer></layergroup></tiles>'
+        '</template>'
+    )
+    CLUSTER = (
+        '<cluster origin="-50 -50" size="100 100">'
+        '<templateinstance id="slot_00" ref="TEST_T" pos="20 0 0" rot="90">'
+        '<activelayer id="Layer_01" />'
+        '</templateinstance>'
+        '</cluster>'
+    )
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        data_dir = Path(self._tmp_dir.name)
+        (data_dir / 'templates' / 'GREEN').mkdir(parents=True)
+        (data_dir / 'cluster').mkdir()
+        (data_dir / 'templates' / 'GREEN' / 'TEST_T.template.xml').write_text(
+            self.TEMPLATE
+        )
+        (data_dir / 'cluster' / 'TEST_C.cluster.xml').write_text(self.CLUSTER)
+
+        self._index = AoBinTemplateIndex(data_dir, data_dir / 'index.json')
+        self._stats = self._index.update(workers=1)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_update(self):
+        self.assertEqual(self._stats['parsed'], 2)
+        self.assertEqual(self._index.update(workers=1)['unchanged'], 2)
+
+    def test_queries(self):
+        self.assertListEqual(self._index.templates_with_object('BUSH'), [])
+        self.assertListEqual(
+            self._index.clusters_with_template('TEST_T'), ['TEST_C']
+        )
+        self.assertListEqual(
+            self._index.clusters_with_object('exit'), ['TEST_C']
+        )
+        # Layer_02 isn't active in the cluster
+        self.assertListEqual(self._index.clusters_with_object('GUARD'), [])
+
+    def test_get_cluster_objects(self):
+        objects = self._index.get_cluster_objects('TEST_C')
+        self.assertEqual(len(objects), 1)
+        self.assertEqual(objects[0][3], 'exit')
+        self.assertAlmostEqual(objects[0][5], 20)
+        self.assertAlmostEqual(objects[0][6], -10)
+
+
+class GeometryTests(unittest.TestCase):
+
+    def setUp(self):
+        # Reuse the small template/cluster tree of TemplateIndexTests
+        self._templates = TemplateIndexTests()
+        self._templates.setUp()
+        self._geometry = abg.AoBinGeometry(abg.build_geometry(
+            self._templates._index,
+            Path(self._templates._tmp_dir.name) / 'geometry',
+        ))
+
+    def tearDown(self):
+        self._templates.tearDown()
+
+    def test_radius(self):
+        records = self._geometry.to_dicts(
+            self._geometry.radius('TEST_C', 20, -10, 1)
+        )
+        self.assertListEqual([x['type'] for x in records], ['exit/Cluster'])
+
+        records = self._geometry.radius(
+            None, 20, 0, 15, kind=abg.KIND_INSTANCE
+        )
+        self.assertEqual(len(records), 1)
+
+    def test_box(self):
+        records = self._geometry.box(
+            'TEST_C', -100, -100, 100, 100, type_name='exit/Cluster'
+        )
+        self.assertEqual(len(records), 1)
+        self.assertEqual(len(self._geometry.box('TEST_C', 0, 0, 5, 5)), 0)
+
+
+class ConvertTests(unittest.TestCase):
+
+    XML = (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<root xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+        '  <a id="1" />\n'
+        '  <b>text</b>\n'
+        '  <a id="2"><c></c><c /><!-- dropped --></a>\n'
+        '  <d sel="x"><![CDATA[\n<e/>]]></d>\n'
+        '</root>'
+    )
+
+    def test_write_json(self):
+        out = io.StringIO()
+        abc.write_json(self.XML.encode(), out)
+        self.assertEqual(
+            out.getvalue(), json.dumps(abc.parse(self.XML.encode()), indent=2)
+        )
+
+        root = json.loads(out.getvalue())['root']
+        self.assertListEqual(list(root), ['@xmlns:xsi', 'a', 'b', 'd'])
+        self.assertListEqual(root['a'][1]['c'], ['', None])
+        self.assertEqual(root['d']['#cdata-section'], '\n<e/>')
+
+    def test_matches_dump(self):
+        xml_file = abc.DATA_DIR / 'accessrights.xml'
+        out = io.StringIO()
+        abc.write_json(xml_file.read_bytes(), out)
+        self.assertEqual(
+            out.getvalue(),
+            xml_file.with_suffix('.json').read_text(encoding='utf8')
+        )
+
+    def test_convert_all(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            (tmp_dir / 'test.xml').write_text(self.XML)
+            (tmp_dir / 'test.json').touch()
+            manifest_file = tmp_dir / 'manifest.json'
+
+            res = abc.convert_all(tmp_dir, manifest_file, workers=1)
+            self.assertListEqual(res['converted'], ['test.xml'])
+            self.assertIn('"@id": "2"', (tmp_dir / 'test.json').read_text())
+
+            res = abc.convert_all(tmp_dir, manifest_file, workers=1)
+            self.assertListEqual(res['unchanged'], ['test.xml'])
+
+
+class NamesTests(unittest.TestCase):
+
+    def test_read_item_names(self):
+        names = abn.read_item_names()
+        self.assertTupleEqual(
+            names[1],
+            (2, 'T3_2H_TOOL_TRACKING', "Journeyman's Tracking Toolkit"),
+        )
+        # Five digit index and a name wider than its column
+        self.assertIn(
+            (9888, 'UNIQUE_UNLOCK_SKIN_ARMORED_HORSE_HERETIC_PONY_TELLAFRIEND'
+             '_UNTRADEABLE', None),
+            names
+        )
+
+    def test_get_name_maps(self):
+        unique_to_local, local_to_unique = abn.get_name_maps()
+        self.assertEqual(unique_to_local['T5_OFF_SHIELD'], "Expert's Shield")
+        self.assertEqual(local_to_unique["Expert's Shield"], 'T5_OFF_SHIELD')
+
+    def test_map_item_names(self):
+        # Bypasses the singleton, only the name maps are built
+        ao_data = PackageAoBinData.__new__(PackageAoBinData)
+        names = [x for x in abn.load_item_names() if x['LocalizedNames']]
+        ao_data._map_item_names(
+            [{'@uniquename': 'T5_OFF_SHIELD'}, {'@uniquename': 'NOT_AN_ITEM'}],
+            names,
+        )
+        self.assertListEqual(list(ao_data._item_name), ["Expert's Shield"])
+        self.assertEqual(
+            ao_data.get_local_name('T5_OFF_SHIELD@2'), "Expert's Shield"
+        )
+
+
+class LocalizationTests(unittest.TestCase):
+
+    NAMES = [
+        {
+            'UniqueName': 'T4_BAG',
+            'LocalizedNames': {'EN-US': "Adept's Bag", 'DE-DE': 'Tasche'},
+        },
+        {'UniqueName': 'T4_TOKEN', 'LocalizedNames': None},
+        {
+            'UniqueName': 'T5_BAG',
+            'LocalizedNames': {'EN-US': "Expert's Bag", 'DE-DE': 'Tasche'},
+        },
+    ]
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._name_file = str(Path(self._tmp_dir.name) / 'items.json')
+        with open(self._name_file, 'w') as f:
+            json.dump(self.NAMES, f)
+
+        self._localization = AoBinLocalization(self._name_file)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_lazy_load(self):
+        self.assertListEqual(
+            self._localization.languages(), ['EN-US', 'DE-DE']
+        )
+        self.assertNotIn('DE-DE', self._localization._columns)
+        self.assertEqual(
+            self._localization.get_local_name('T5_BAG', 'DE-DE'), 'Tasche'
+        )
+        self.assertIsNone(
+            self._localization.get_local_name('T4_TOKEN', 'DE-DE')
+        )
+        self.assertRaises(
+            KeyError, self._localization.get_local_name, 'T4_BAG', 'FR-FR'
+        )
+
+    def test_interned(self):
+        column = self._localization._column('DE-DE')
+        self.assertIs(column[0], column[2])
+        self.assertEqual(
+            self._localization.get_unique_name('Tasche', 'DE-DE'), 'T4_BAG'
+        )
+
+    def test_ao_data_lang(self):
+        ao_data = PackageAoBinData.__new__(PackageAoBinData)
+        ao_data.TIER_IDENTIFIERS = []
+        ao_data._localization = self._localization
+        ao_data._map_item_names(
+            [{'@uniquename': 'T4_BAG'}, {'@uniquename': 'T5_BAG'}],
+            [x for x in self.NAMES if x['LocalizedNames']],
+        )
+
+        self.assertEqual(ao_data.get_local_name('T5_BAG@1', 'DE-DE'), 'Tasche')
+        self.assertEqual(
+            ao_data.get_unique_name('Tasche', 2, 'DE-DE'), 'T4_BAG@2'
+        )
+        self.assertDictEqual(
+            ao_data.get_item('Tasche', False, 'DE-DE'),
+            {'@uniquename': 'T4_BAG'},
+        )
+
+
+class WorldTests(unittest.TestCase):
+
+    CLUSTER = (
+        '<cluster id="{0}" file="{0}_{1}.cluster.xml" displayname="{0}" '
+        'enabled="{2}"><exits>{3}</exits></cluster>'
+    )
+    EXIT = '<exit id="x" targetid="x@{}" targettype="{}" />'
+
+    def setUp(self):
+        clusters = [
+            ('A', 'CTY_SW_AUTO_T1_NON', ['B', 'D']),
+            ('B', 'WRL_SW_AUTO_T7_KPR_ROY', ['A', 'C']),
+            ('C', 'CTY_SW_AUTO_T1_NON', ['B', 'E']),
+            ('D', 'WRL_SW_AUTO_T4_UND_ROY', ['A', 'E']),
+            ('E', 'WRL_SW_AUTO_T4_UND_ROY', ['D', 'C', 'F']),
+            ('F', 'WRL_SW_AUTO_T4_UND_ROY', ['E']),
+        ]
+        xml = ''.join(
+            self.CLUSTER.format(
+                name, tags, 'false' if name == 'F' else 'true',
+                ''.join(self.EXIT.format(x, 'Cluster') for x in exits)
+                + self.EXIT.format('', 'DungeonSolo'),
+            )
+            for name, tags, exits in clusters
+        )
+
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        tmp_dir = Path(self._tmp_dir.name)
+        (tmp_dir / 'world.xml').write_text(
+            f'<world><clusters>{xml}</clusters></world>'
+        )
+        (tmp_dir / 'world.json').write_text(
+            json.dumps([{'Index': 'A', 'UniqueName': 'Start Town'}])
+        )
+        self._world = AoBinWorld(
+            tmp_dir / 'world.xml', tmp_dir / 'world.json',
+            tmp_dir / 'graph.npz',
+        )
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_graph(self):
+        self.assertEqual(len(self._world.clusters), 5)
+        self.assertListEqual(self._world.neighbours('E'), ['C', 'D'])
+        self.assertEqual(self._world.distance('Start Town', 'E'), 2)
+        self.assertEqual(self._world.distance('A', 'A'), 0)
+
+    def test_route(self):
+        self.assertListEqual(self._world.route('A', 'C'), ['A', 'B', 'C'])
+        self.assertListEqual(
+            self._world.route('A', 'C', max_tier=5), ['A', 'D', 'E', 'C']
+        )
+        self.assertListEqual(self._world.route('A', 'C', kinds=['CTY']), [])
+
+    def test_cache(self):
+        world = AoBinWorld(
+            Path(self._tmp_dir.name) / 'world.xml', None,
+            Path(self._tmp_dir.name) / 'graph.npz',
+        )
+        np.testing.assert_array_equal(world.hops, self._world.hops)
+        self.assertNotIn(UNREACHABLE, world.hops)
+
+
+class BenchmarkTests(unittest.TestCase):
+
+    def test_replay(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fixture_file = Path(tmp_dir) / 'api.json'
+            url = 'https://example.com/prices/T4_BAG'
+            params = {'locations': 'Lymhurst', 'qualities': '1'}
+            fixture_file.write_text(json.dumps({
+                'recorded_at': '2020-01-01T00:00:00',
+                'responses': {abb.ApiReplay.key(url, params): [{
+                    'item_id': 'T4_BAG',
+                    'quality': 1,
+                    'sell_price_min': 500,
+                    'sell_price_min_date': '2019-12-31T23:55:00',
+                }]},
+            }))
+
+            # Recorded 5 minutes old, replayed 5 minutes old
+            replay = abb.ApiReplay(fixture_file)
+            with mock.patch.object(abu.requests, 'get', replay.get), \
+                    mock.patch.object(abu, 'sleep', lambda _: None):
+                self.assertListEqual(
+                    abu.get_item_price(['T4_BAG'], [1], 'Lymhurst', 10),
+                    [('T4_BAG', 1, 500)],
+                )
+
+            self.assertEqual(
+                replay.get(url + ',T5_BAG', params).json(),
+                replay.get(url + ',T5_BAG', params).json(),
+            )
+
+    def test_compare(self):
+        baseline = {'results': {
+            'a': {'median': 1.0}, 'b': {'median': 1.0}, 'c': {'skipped': ''},
+        }}
+        current = {'results': {
+            'a': {'median': 1.05}, 'b': {'median': 2.0}, 'c': {'median': 9},
+        }}
+        self.assertListEqual(
+            abb.compare(baseline, current), [('b', 1.0, 2.0)]
+        )
+
+    def test_run(self):
+        results = abb.run(['get_item_price'], repeat=1)['results']
+        self.assertEqual(results['get_item_price']['repeat'], 1)
+
+
+class MetricsTests(unittest.TestCase):
+
+    def test_disabled(self):
+        metrics = AoBinMetrics()
+        metrics.inc('a_total')
+        with metrics.timer('b_seconds'):
+            pass
+        self.assertDictEqual(
+            metrics.to_json(), {'counters': {}, 'histograms': {}}
+        )
+
+    def test_prometheus(self):
+        metrics = AoBinMetrics(enabled=True)
+        metrics.inc('a_total', status=200)
+        metrics.inc('a_total', 2, status=200)
+        metrics.observe('b_seconds', 0.002)
+        text = metrics.to_prometheus()
+        self.assertIn('a_total{status="200"} 3', text)
+        self.assertIn('b_seconds_bucket{le="0.001"} 0', text)
+        self.assertIn('b_seconds_bucket{le="0.005"} 1', text)
+        self.assertIn('b_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn('b_seconds_count 1', text)
+
+    def test_get_item_price(self):
+        replay = abb.ApiReplay(Path(tempfile.gettempdir()) / 'missing.json')
+        METRICS.reset()
+        METRICS.enable()
+        try:
+            with mock.patch.object(abu.requests, 'get', replay.get), \
+                    mock.patch.object(abu, 'sleep', lambda _: None):
+                abu.get_item_price(['T4_BAG'], [1], 'Lymhurst', 60)
+            res = METRICS.to_json()
+        finally:
+            METRICS.disable()
+            METRICS.reset()
+
+        self.assertEqual(
+            res['counters']['ao_bin_http_requests_total'][0]['value'], 1
+        )
+        self.assertIn('ao_bin_http_request_seconds', res['histograms'])
+        self.assertIn('ao_bin_sleep_seconds_total', res['counters'])
+
+
+class CliTests(unittest.TestCase):
+
+    IMPORT_BUDGET = 0.1
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._index = Path(self._tmp_dir.name) / 'ao_bin.sqlite3'
+        item = {'@uniquename': 'T4_BAG', '@itempower': '700'}
+        abe.export_sqlite(None, self._index, {
+            'items': [(
+                'T4_BAG', "Adept's Bag", 4, 'accessories', 'bag', 700, 0.05,
+                item,
+            )],
+            'quality_levels': [(1, 0), (2, 10)],
+            'item_powers': [
+                ('T4_BAG', 0, 1, 700), ('T4_BAG', 0, 2, 710),
+                ('T4_BAG', 1, 1, 800),
+            ],
+        })
+        self._item_file = mock.patch.object(
+            abcli, 'ITEM_FILE', Path(self._tmp_dir.name) / 'items.json'
+        )
+        self._item_file.start()
+
+    def tearDown(self):
+        self._item_file.stop()
+        self._tmp_dir.cleanup()
+
+    def _run(self, *argv) -> tuple:
+        out = io.StringIO()
+        with mock.patch('sys.stdout', out):
+            status = abcli.main(['--index', str(self._index), *argv])
+
+        return status, out.getvalue().splitlines()
+
+    def test_import_budget(self):
+        code = (
+            'import sys, time\n'
+            't = time.perf_counter()\n'
+            'import ao_bin_utils.ao_bin_cli\n'
+            'print(time.perf_counter() - t)\n'
+            'print(*[x for x in ("requests", "pytz", "numpy") '
+            'if x in sys.modules])'
+        )
+        res = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=Path(__file__).resolve().parent.parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.splitlines()
+
+        self.assertLess(float(res[0]), self.IMPORT_BUDGET)
+        self.assertEqual(res[1], '')
+
+    def test_item(self):
+        status, out = self._run('item', 'T4_BAG@1', 'T5_BAG')
+        self.assertEqual(status, 1)
+        self.assertEqual(json.loads(out[0])['@itempower'], '700')
+        self.assertEqual(out[1], 'null')
+
+        status, out = self._run('item', '--local', "Adept's Bag")
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(out[0])['@uniquename'], 'T4_BAG')
+
+    def test_ip(self):
+        status, out = self._run(
+            'ip', 'T4_BAG', 'T4_BAG@1', '--quality', '2', '--mastery', '100'
+        )
+        self.assertEqual(status, 1)
+        self.assertListEqual(out, ['T4_BAG\t815', 'T4_BAG@1\t-1'])
+
+        status, out = self._run('ip', 'T4_BAG@1')
+        self.assertListEqual(out, ['T4_BAG@1\t800'])
+
+    def test_price(self):
+        replay = abb.ApiReplay(Path(self._tmp_dir.name) / 'missing.json')
+        with mock.patch.object(abb.abu.requests, 'get', replay.get), \
+                mock.patch.object(abb.abu, 'sleep', lambda _: None):
+            status, out = self._run('price', 'T4_BAG', '--max-age', '60')
+
+        self.assertEqual(status, 0)
+        self.assertEqual(out[0].split('\t')[:2], ['T4_BAG', '1'])
+
+
+class ItemIdTests(unittest.TestCase):
+
+    def test_parse(self):
+        item_id = ItemId.parse('T5_OFF_SHIELD@1')
+        self.assertEqual(
+            (item_id.tier, item_id.base, item_id.enchant),
+            (5, 'OFF_SHIELD', 1),
+        )
+        self.assertEqual(item_id.base_name, 'T5_OFF_SHIELD')
+        self.assertEqual(str(item_id), 'T5_OFF_SHIELD@1')
+        self.assertIs(ItemId.parse(item_id), item_id)
+        self.assertIs(ItemId(5, 'OFF_SHIELD', 1), item_id)
+        self.assertIs(pickle.loads(pickle.dumps(item_id)), item_id)
+
+        untiered = ItemId.parse('UNIQUE_HIDEOUT')
+        self.assertEqual((untiered.tier, untiered.enchant), (0, 0))
+        self.assertEqual(untiered.name, 'UNIQUE_HIDEOUT')
+
+        with self.assertRaises(AttributeError):
+            item_id.tier = 6
+
+    def test_variants(self):
+        item_id = ItemId.parse('T4_OFF_SHIELD@1')
+        self.assertIs(item_id.with_tier(8), ItemId.parse('T8_OFF_SHIELD@1'))
+        self.assertIs(item_id.with_enchant(0), ItemId.parse('T4_OFF_SHIELD'))
+
+        variants = abu.get_item_variants(item_id, 7)
+        self.assertEqual(len(variants), 10)
+        self.assertEqual(variants[0], 'T7_OFF_SHIELD')
+        self.assertEqual(variants[-1], 'T8_OFF_SHIELD@4')
+        self.assertListEqual(
+            abu.get_item_variants('T4_OFF_SHIELD@1', 7), variants
+        )
+
+    def test_utilities(self):
+        ao_data = PackageAoBinData.__new__(PackageAoBinData)
+        ao_data._local_name = {'T5_OFF_SHIELD': "Expert's Shield"}
+        ao_data._item_name = {"Expert's Shield": {
+            '@uniquename': 'T5_OFF_SHIELD',
+            '@itempower': '800',
+            '@masterymodifier': '0.05',
+            'enchantments': {'enchantment': {
+                '@enchantmentlevel': '1', '@itempower': '900',
+            }},
+        }}
+        ao_data._game = {'Items': {'QualityLevels': {'qualitylevel': [
+            {'@level': '2', '@itempowerbonus': '10'},
+        ]}}}
+
+        item_id = ItemId.parse('T5_OFF_SHIELD@1')
+        self.assertEqual(ao_data.get_local_name(item_id), "Expert's Shield")
+        self.assertEqual(ao_data.get_item_tier(item_id), '5.1')
+        self.assertEqual(ao_data.get_item_tier('T5_OFF_SHIELD'), '5')
+        self.assertEqual(abu.get_item_power(item_id, 2, 0, ao_data), 910)
+        self.assertEqual(
+            abu.get_item_power('T5_OFF_SHIELD@1', 2, 0, ao_data), 910
+        )
+
+
+class ReloadTests(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        tmp_dir = Path(self._tmp_dir.name)
+        self._kwargs = {
+            'item_file': str(tmp_dir / 'items.json'),
+            'name_file': str(tmp_dir / 'names.json'),
+            'game_file': str(tmp_dir / 'gamedata.json'),
+        }
+        (tmp_dir / 'gamedata.json').write_text(json.dumps({
+            'AO-GameData': {},
+        }))
+        self._write_items(700)
+        self._instances = mock.patch.dict(SingletonMeta._instances)
+        self._instances.start()
+
+    def tearDown(self):
+        self._instances.stop()
+        self._tmp_dir.cleanup()
+
+    def _write_items(self, item_power: int) -> None:
+        tmp_dir = Path(self._tmp_dir.name)
+        (tmp_dir / 'items.json').write_text(json.dumps({'items': {
+            'equipmentitem': [{
+                '@uniquename': 'T4_BAG', '@itempower': str(item_power),
+            }],
+            'weapon': [], 'mount': [], 'transformationweapon': [],
+        }}))
+        (tmp_dir / 'names.json').write_text(json.dumps([{
+            'UniqueName': 'T4_BAG',
+            'LocalizedNames': {'EN-US': "Adept's Bag"},
+        }]))
+
+    def _new_data(self):
+        data = PackageAoBinData.__new__(PackageAoBinData)
+        data.__init__(**self._kwargs)
+        return data
+
+    def test_reload(self):
+        reloader = AoBinDataReloader(data=self._new_data(), **self._kwargs)
+        snapshot = reloader.data
+        self.assertEqual(reloader.version, 0)
+        self.assertFalse(reloader.check())
+
+        self._write_items(800)
+        os.utime(self._kwargs['item_file'], ns=(0, 1))
+        self.assertTrue(reloader.check())
+        self.assertEqual(reloader.version, 1)
+        self.assertIsNot(reloader.data, snapshot)
+        self.assertIs(PackageAoBinData(), reloader.data)
+        self.assertEqual(reloader.data.get_item('T4_BAG')['@itempower'], '800')
+        self.assertEqual(snapshot.get_item('T4_BAG')['@itempower'], '700')
+
+    def test_failed_reload(self):
+        reloader = AoBinDataReloader(data=self._new_data(), **self._kwargs)
+        snapshot = reloader.data
+
+        Path(self._kwargs['item_file']).write_text('{"items": ')
+        with self.assertLogs('ao_bin_utils.ao_bin_reload', 'ERROR'):
+            self.assertFalse(reloader.check())
+        self.assertIs(reloader.data, snapshot)
+        self.assertFalse(reloader.check())
+
+    def test_poll(self):
+        reloader = AoBinDataReloader(
+            interval=0.01, data=self._new_data(), **self._kwargs
+        )
+        reloader.start()
+        try:
+            self._write_items(900)
+            os.utime(self._kwargs['item_file'], ns=(0, 2))
+            for _ in range(500):
+                if reloader.version:
+                    break
+                time.sleep(0.01)
+        finally:
+            reloader.stop()
+
+        self.assertEqual(reloader.version, 1)
+
+
+class ServiceTests(unittest.TestCase):
+
+    def setUp(self):
+        self._calls = []
+        data = PackageAoBinData.__new__(PackageAoBinData)
+        data._local_name = {'T4_BAG': "Adept's Bag"}
+        data._item_name = {"Adept's Bag": {
+            '@uniquename': 'T4_BAG', '@itempower': '700',
+        }}
+        data._game = {'Items': {'QualityLevels': {'qualitylevel': []}}}
+        data.data_files = []
+        self._service = AoBinService(
+            AoBinDataReloader(data=data), PriceCache(60, self._get_price)
+        )
+
+    def _get_price(self, names, qualities, location, max_age):
+        self._calls.append(list(names))
+        time.sleep(0.05)
+        return [(x, q, 100) for x, q in zip(names, qualities) if x != 'NONE']
+
+    def test_price_cache(self):
+        prices = self._service.prices
+        self.assertListEqual(
+            prices.get_item_price(['T4_BAG', 'NONE'], [1, 1], 'Lymhurst', 60),
+            [('T4_BAG', 1, 100)],
+        )
+        self.assertListEqual(
+            prices.get_item_price(['NONE', 'T4_BAG'], [1, 1], 'Lymhurst', 60),
+            [('T4_BAG', 1, 100)],
+        )
+        prices.get_item_price(['T5_BAG', 'T4_BAG'], [1, 1], 'Lymhurst', 60)
+        self.assertListEqual(self._calls, [['T4_BAG', 'NONE'], ['T5_BAG']])
+
+        prices.ttl = 0
+        prices.get_item_price(['T6_BAG'], [1], 'Lymhurst', 60)
+        prices.get_item_price(['T6_BAG'], [1], 'Lymhurst', 60)
+        self.assertEqual(len(self._calls), 4)
+
+    def test_single_flight(self):
+        async def run():
+            return await asyncio.gather(*[
+                self._service.handle('GET', '/price?names=T4_BAG', {})
+                for _ in range(5)
+            ])
+
+        res = asyncio.run(run())
+        self.assertEqual(len(self._calls), 1)
+        self.assertTrue(all(x[0] == 200 for x in res))
+        self.assertEqual(json.loads(res[0][2]), [['T4_BAG', 1, 100]])
+
+    def test_etag(self):
+        async def run():
+            first = await self._service.handle('GET', '/item?name=T4_BAG', {})
+            second = await self._service.handle(
+                'GET', '/item?name=T4_BAG',
+                {'if-none-match': first[1]['ETag']},
+            )
+            missing = await self._service.handle('GET', '/item?name=X', {})
+            bad = await self._service.handle('GET', '/ip', {})
+            return first, second, missing, bad
+
+        first, second, missing, bad = asyncio.run(run())
+        self.assertEqual(first[0], 200)
+        self.assertEqual(json.loads(first[2])['@itempower'], '700')
+        self.assertEqual(second[0], 304)
+        self.assertEqual(second[2], b'')
+        self.assertEqual(missing[0], 404)
+        self.assertEqual(bad[0], 400)
+
+    def test_http(self):
+        async def run():
+            server = await self._service.serve('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            try:
+                return [
+                    await ablt.http_get(reader, writer, x)
+                    for x in ('/ip?name=T4_BAG&mastery=100', '/nothing')
+                ]
+            finally:
+                writer.close()
+                await writer.wait_closed()
+                await asyncio.sleep(0.01)
+                server.close()
+                await server.wait_closed()
+
+        ip, nothing = asyncio.run(run())
+        self.assertEqual(ip[0], 200)
+        self.assertEqual(json.loads(ip[2])['item_power'], 800)
+        self.assertEqual(nothing[0], 404)
+
+
+class IpIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        def item(name, subcategory, slot, item_power, mod):
+            return {
+                '@uniquename': name,
+                '@shopsubcategory1': subcategory,
+                '@slottype': slot,
+                '@itempower': str(item_power),
+                '@masterymodifier': str(mod),
+                'enchantments': {'enchantment': [
+                    {'@enchantmentlevel': str(x),
+                     '@itempower': str(item_power + 100*x)}
+                    for x in range(1, 4)
+                ]},
+            }
+
+        items = [
+            item('T4_OFF_SHIELD', 'shield', 'offhand', 700, 0.05),
+            item('T5_OFF_SHIELD', 'shield', 'offhand', 800, 0.05),
+            item('T4_OFF_TORCH', 'torch', 'offhand', 700, 0.1),
+            item('T6_BAG', 'bag', 'bag', 900, 0),
+        ]
+        self._ao = PackageAoBinData.__new__(PackageAoBinData)
+        self._ao._item_name = {x['@uniquename']: x for x in items}
+        self._ao._local_name = {x: x for x in self._ao._item_name}
+        self._ao._game = {'Items': {'QualityLevels': {'qualitylevel': [
+            {'@level': str(x), '@itempowerbonus': str(b)}
+            for x, b in [(2, 10), (3, 20), (4, 50), (5, 100)]
+        ]}}}
+        self._index = AoBinIpIndex(self._ao)
+
+    def _brute_force(self, subcategory, slot, min_ip, max_ip, mastery):
+        res = []
+        for name, item in self._ao._item_name.items():
+            if subcategory not in (None, item['@shopsubcategory1']):
+                continue
+            if slot not in (None, item['@slottype']):
+                continue
+            for enchant in range(4):
+                variant = ItemId.parse(name).with_enchant(enchant)
+                for quality in range(1, 6):
+                    ip = abu.get_item_power(
+                        variant, quality, mastery, self._ao
+                    )
+                    if min_ip <= ip <= max_ip:
+                        res.append((variant.name, quality))
+
+        return sorted(res)
+
+    def test_query(self):
+        self.assertListEqual(self._index.subcategories(), [
+            'bag', 'shield', 'torch',
+        ])
+        self.assertListEqual(self._index.slots(), ['bag', 'offhand'])
+
+        for args in [
+            (None, None, 900, 1000, 0),
+            ('shield', None, 1000, 1100, 100),
+            (None, 'offhand', 850, 1210, 40),
+            ('torch', 'offhand', 0, 10000, 7),
+            ('bag', 'offhand', 0, 10000, 0),
+        ]:
+            res = self._index.query(*args)
+            self.assertListEqual(
+                sorted(x[:2] for x in res), self._brute_force(*args)
+            )
+            self.assertListEqual(res, sorted(res, key=lambda x: x[2]))
+
+        self.assertIn(
+            ('T5_OFF_SHIELD@2', 5, 1000 + 100 + 100*1.05),
+            self._index.query('shield', mastery=100),
+        )
+
+
+class ArbitrageTests(unittest.TestCase):
+
+    def test_make_batches(self):
+        names = [f'T4_ITEM_{i}' for i in range(1000)]
+        batches = aba.make_batches(names, 500)
+        self.assertListEqual([x for b in batches for x in b], names)
+        for batch in batches:
+            self.assertLessEqual(
+                len(abu.PRICE_URL) + len(','.join(batch)), 500
+            )
+
+    def test_spreads(self):
+        now = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime())
+        old = '2000-01-01T00:00:00'
+        matrix = aba.AoBinPriceMatrix(
+            ['A', 'B', 'C'], ['X', 'Y', 'Z'], [1, 2]
+        )
+
+        def record(item, quality, city, sell, buy, date=now):
+            return {
+                'item_id': item, 'quality': quality, 'city': city,
+                'sell_price_min': sell, 'sell_price_min_date': date,
+                'buy_price_max': buy, 'buy_price_max_date': date,
+            }
+
+        self.assertEqual(matrix.update([
+            record('A', 1, 'X', 100, 90),
+            record('A', 1, 'Y', 300, 250),
+            record('A', 1, 'Z', 150, 0),
+            record('B', 2, 'X', 100, 500),
+            record('B', 2, 'Y', 1000, 200),
+            record('C', 1, 'X', 10, 0, old),
+            record('C', 1, 'Y', 0, 1000, old),
+            record('D', 1, 'X', 1, 1),
+        ]), 7)
+
+        res = matrix.spreads(min_profit=0, tax=0.1)
+        self.assertListEqual(
+            [(x['item'], x['quality'], x['buy_city'], x['sell_city'])
+             for x in res],
+            [('C', 1, 'X', 'Y'), ('A', 1, 'X', 'Y'), ('B', 2, 'X', 'Y')],
+        )
+        self.assertAlmostEqual(res[1]['profit'], 250*0.9 - 100)
+        self.assertAlmostEqual(res[1]['roi'], (250*0.9 - 100)/100)
+
+        # Stale prices are left out
+        res = matrix.spreads(max_age=60, min_profit=100, tax=0.1)
+        self.assertListEqual([x['item'] for x in res], ['A'])
+
+    def test_scan(self):
+        replay = abb.ApiReplay(Path(tempfile.gettempdir()) / 'missing.json')
+        items = [f'T{t}_BAG' for t in range(4, 9)]
+        with mock.patch.object(aba.requests, 'get', replay.get):
+            scanner = aba.AoBinArbitrageScanner(
+                items, rate=None, max_url_length=len(abu.PRICE_URL) + 14
+            )
+            trades = list(scanner.scan(max_age=60, sweeps=1))
+
+        self.assertEqual(len(scanner.batches), 3)
+        self.assertTrue(trades)
+        profits = [x['profit'] for x in trades]
+        self.assertListEqual(profits, sorted(profits, reverse=True))
+        self.assertTrue(all(x['buy_city'] != x['sell_city'] for x in trades))
+
+    def test_rate_limiter(self):
+        limiter = aba.RateLimiter(200)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 4/200)
+
+
+class ValidateTests(unittest.TestCase):
+
+    BASE = (
+        '<Times>\n'
+        '  <DateTime uniquename="A" datetime="2020-01-01" />\n'
+        '  <Time uniquename="B" time="00:00:00" />\n'
+        '</Times>'
+    )
+    PATCH = (
+        '<patch>\n'
+        '  <replace sel="Times/DateTime[@uniquename=\'A\']" />\n'
+        '  <remove sel="Times/DateTime[@uniquename=\'GONE\']" />\n'
+        '  <add sel="/Times"><Time uniquename="C" /></add>\n'
+        '</patch>'
+    )
+    CLUSTER = (
+        '<cluster origin="0 0" size="10 10">'
+        '<templateinstance id="slot_00" ref="TEST_T" pos="0 0 0" />'
+        '<templateinstance id="slot_01" ref="MISSING_T" pos="0 0 0" />'
+        '</cluster>'
+    )
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        data_dir = self._data_dir = Path(self._tmp_dir.name)
+        (data_dir / 'times.xml').write_text(self.BASE)
+        (data_dir / 'times_asia_patch.xml').write_text(self.PATCH)
+        for fp in data_dir.glob('*.xml'):
+            abc.convert_file(fp)
+        (data_dir / 'templates' / 'GREEN').mkdir(parents=True)
+        (data_dir / 'templates' / 'GREEN' / 'TEST_T.template.xml').touch()
+        (data_dir / 'cluster').mkdir()
+        (data_dir / 'cluster' / 'TEST_C.cluster.xml').write_text(
+            self.CLUSTER
+        )
+        self._manifest_file = data_dir / 'manifest.json'
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def validate(self):
+        return abv.validate(self._data_dir, self._manifest_file, workers=1)
+
+    def test_find_patch_base(self):
+        self.assertEqual(
+            abv.find_patch_base(self._data_dir / 'times_asia_patch.xml'),
+            self._data_dir / 'times.xml'
+        )
+        self.assertEqual(
+            abv.to_path('a/b[@id=4006]'), ('a', "b[@id='4006']")
+        )
+
+    def test_validate(self):
+        res = self.validate()
+        self.assertEqual(res['checked'], 4)
+        self.assertListEqual(
+            sorted(res['errors']),
+            ['cluster/TEST_C.cluster.xml', 'times_asia_patch.xml']
+        )
+        self.assertEqual(len(res['errors']['times_asia_patch.xml']), 1)
+        self.assertIn(
+            ':3: remove selector', res['errors']['times_asia_patch.xml'][0]
+        )
+        self.assertIn(
+            'MISSING_T', res['errors']['cluster/TEST_C.cluster.xml'][0]
+        )
+
+        # Only the edited pair is checked again
+        json_file = self._data_dir / 'times.json'
+        json_file.write_text(
+            json_file.read_text().replace('"B"', '"X"')
+        )
+        res = self.validate()
+        self.assertEqual(res['checked'], 1)
+        self.assertEqual(res['unchanged'], 3)
+        self.assertListEqual(
+            res['errors']['times.xml'],
+            ['times.json:8: differs from times.xml']
+        )
+
+        # Cluster refs are checked against the current templates
+        template_file = self._data_dir / 'templates' / 'GREEN' / 'TEST_T'
+        template_file.with_suffix('.template.xml').unlink()
+        res = self.validate()
+        self.assertEqual(res['checked'], 0)
+        self.assertEqual(
+            len(res['errors']['cluster/TEST_C.cluster.xml']), 2
+        )
+
+
+
+class ProgressionTests(unittest.TestCase):
+
+    NAME = 'PROGRESSION_SIPHONING_MAGE'
+
+    def setUp(self):
+        self._progression = AoBinProgression()
+
+    def test_level(self):
+        self.assertEqual(self._progression.max_level(self.NAME), 99)
+        self.assertListEqual(
+            [
+                self._progression.level(self.NAME, x)
+                for x in [0, 899, 900, 2399, 2400, 10**9]
+            ],
+            [0, 0, 1, 1, 2, 99]
+        )
+        self.assertEqual(
+            self._progression.season_points(self.NAME, 2400), 75
+        )
+
+    def test_fame(self):
+        self.assertEqual(self._progression.fame_for_level(self.NAME, 2), 2400)
+        self.assertEqual(
+            self._progression.fame_to_level(self.NAME, 1000, 2), 1400
+        )
+        self.assertEqual(
+            self._progression.hours_to_level(self.NAME, 900, 2, 750), 2.0
+        )
+        with self.assertRaises(ValueError):
+            self._progression.fame_for_level(self.NAME, 100)
+
+    def test_batch(self):
+        fame = np.random.default_rng(0).integers(0, 3*10**6, 1000)
+        levels = self._progression.level(self.NAME, fame)
+        self.assertListEqual(
+            levels.tolist(),
+            [self._progression.level(self.NAME, x) for x in fame.tolist()]
+        )
+
+        hours = self._progression.hours_to_level(
+            self.NAME, [900, 900, 5000], 2, [0, 750, 0]
+        )
+        self.assertListEqual(hours.tolist(), [np.inf, 2.0, 0.0])
+
+
+
+class ResourcesTests(unittest.TestCase):
+
+    class _Catalog():
+        """Catalog stand-in serving hand written resource tables."""
+
+        def __init__(self, tables):
+            self._tables = {k: AoBinTable(k, v) for k, v in tables.items()}
+
+        def get_table(self, name):
+            return self._tables[name]
+
+    def setUp(self):
+        rare_states = [
+            {'@state': '0', '@weight': '6'},
+            {'@state': '1', '@weight': '3'},
+            {'@state': '2', '@weight': '1'},
+        ]
+        self._resources = AoBinResources(self._Catalog({
+            'harvestables': {'Harvestable': [
+                {'@name': 'WOOD', '@resource': 'WOOD', 'Tier': [
+                    {'@tier': '3', '@item': 'T3_WOOD'},
+                    {'@tier': '4', '@item': 'T4_WOOD', 'RareState': [
+                        {'@state': '1', '@item': 'T4_WOOD_LEVEL1'},
+                        {'@state': '2', '@item': 'T4_WOOD_LEVEL2'},
+                    ]},
+                ]},
+                {'@name': 'WOOD_CRITTER', '@resource': 'WOOD'},
+            ]},
+            'rareresourcedistribution': {'RareResourceDistribution': [
+                {'@name': 'DEFAULT', 'Tier': {'RareState': rare_states}},
+                {'@name': 'OUT_Q1', 'Tier': [
+                    {'@value': '4', 'RareState': rare_states[:2]},
+                    {'RareState': rare_states},
+                ]},
+            ]},
+            'resourcedistpresets': {'preset': [
+                {
+                    '@name': 'T4_FR', '@tier': '4', '@biome': 'Forest',
+                    '@continent': 'Royal',
+                    'high': {'wood': [
+                        {'@tier': '4', '@amount': '10'},
+                        {'@tier': '3', '@amount': '20'},
+                    ]},
+                    'medium': {'wood': {'@tier': '4', '@amount': '10'}},
+                    'low': '',
+                },
+                {
+                    '@name': 'T4_FR_OUT_Q1', '@tier': '4', '@biome': 'Forest',
+                    '@continent': 'Outlands', '@clusterquality': 'Q1',
+                    'high': {'wood': {'@tier': '4', '@amount': '9'}},
+                },
+            ]},
+        }))
+
+    def test_expected_nodes(self):
+        self.assertListEqual(self._resources.resources, ['wood'])
+        np.testing.assert_allclose(
+            self._resources.expected_nodes('wood', 4),
+            [[12, 6, 2], [6, 3, 0]]
+        )
+        # Tier 3 wood can't be enchanted
+        np.testing.assert_allclose(
+            self._resources.expected_nodes('WOOD', 3), [[20, 0, 0], [0, 0, 0]]
+        )
+        np.testing.assert_allclose(
+            self._resources.expected_nodes(
+                'wood', 4, [1], distribution='DEFAULT'
+            ),
+            [[5.4, 2.7, 0.9]]
+        )
+        self.assertEqual(
+            self._resources.item_name('wood', 4, 2), 'T4_WOOD_LEVEL2'
+        )
+
+    def test_expected_by_biome(self):
+        res = self._resources.expected_by_biome('wood', 4)
+        self.assertAlmostEqual(res['Forest'], (8 + 3)/2)
+        res = self._resources.expected_by_biome(
+            'wood', 4, continent='Outlands'
+        )
+        self.assertAlmostEqual(res['Forest'], 3)
+        self.assertDictEqual(
+            self._resources.expected_by_biome('wood', 4, biome='Swamp'), {}
+        )
+
+    def test_sample(self):
+        states = self._resources.sample_states(
+            'DEFAULT', 'wood', 4, 100000, seed=0
+        )
+        np.testing.assert_allclose(
+            np.bincount(states)/100000, [0.6, 0.3, 0.1], atol=0.01
+        )
+
+        nodes = self._resources.sample_nodes('T4_FR', 'wood', 4, 1000, seed=0)
+        self.assertTrue((nodes.sum(axis=1) == 20).all())
+        np.testing.assert_allclose(nodes.mean(axis=0), [12, 6, 2], atol=0.5)
+
+    def test_dump(self):
+        resources = AoBinResources()
+        self.assertIn('ore', resources.resources)
+        res = resources.expected_by_biome('hide', 5, continent='Outlands')
+        self.assertGreater(res['Steppe'], 0)
+
+
+
+class HistoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._history_dir = Path(self._tmp_dir.name)
+        self._history = AoBinPriceHistory(self._history_dir, block_rows=4)
+        # Two blocks and two buffered rows, out of time order
+        self._history.append(
+            ['T4_BAG', 'T5_BAG', 'T4_BAG', 'T4_BAG', 'T5_BAG'],
+            [1, 1, 2, 1, 1],
+            ['Lymhurst', 'Martlock', 'Lymhurst', 'Martlock', 'Lymhurst'],
+            [1000, 2000, 1100, 900, 2100],
+            [300, 100, 200, 400, 500],
+        )
+        self._history.append(
+            ['T4_BAG', 'T4_BAG'], [1, 1], ['Lymhurst', 'Lymhurst'],
+            [950, 980], np.array(
+                ['1970-01-01T00:01:40', '1970-01-01T00:10:00'],
+                dtype='datetime64[s]'
+            ),
+        )
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_read(self):
+        res = self._history.read('T4_BAG')
+        self.assertListEqual(
+            res['timestamp'].astype(np.int64).tolist(),
+            [100, 200, 300, 400, 600]
+        )
+        self.assertListEqual(
+            res['price'].tolist(), [950, 1100, 1000, 900, 980]
+        )
+
+        res = self._history.read(
+            'T4_BAG', 200, '1970-01-01T00:06:40', quality=1, city='Martlock'
+        )
+        self.assertListEqual(res['price'].tolist(), [900])
+        self.assertListEqual(res['city'].tolist(), ['Martlock'])
+        self.assertEqual(len(self._history.read('T8_BAG')['price']), 0)
+
+    def test_reopen(self):
+        self._history.flush()
+        for use_mmap in [True, False]:
+            history = AoBinPriceHistory(self._history_dir, use_mmap=use_mmap)
+            self.assertListEqual(
+                history.read('T5_BAG')['price'].tolist(), [2000, 2100]
+            )
+
+    def test_recover(self):
+        self._history.flush()
+        # An interrupted flush, data without its complete record
+        with open(self._history_dir / 'data.bin', 'ab') as f:
+            f.write(b'partial')
+        with open(self._history_dir / 'segments.bin', 'ab') as f:
+            f.write(b'\0'*10)
+
+        history = AoBinPriceHistory(self._history_dir)
+        self.assertEqual(len(history.read('T4_BAG')['price']), 5)
+        history.append(['T4_BAG'], [1], ['Lymhurst'], [990], [700])
+        history.flush()
+        history = AoBinPriceHistory(self._history_dir)
+        self.assertEqual(history.read('T4_BAG')['price'][-1], 990)
+
+    def test_get_item_price(self):
+        replay = abb.ApiReplay(Path(tempfile.gettempdir()) / 'missing.json')
+        with mock.patch.object(abu.requests, 'get', replay.get), \
+                mock.patch.object(abu, 'sleep', lambda _: None), \
+                mock.patch.object(abu, 'PRICE_HISTORY', self._history):
+            prices = abu.get_item_price(['T8_BAG'], [1], 'Lymhurst', 60)
+
+        res = self._history.read('T8_BAG', city='Lymhurst')
+        self.assertListEqual(res['price'].tolist(), [prices[0][2]])
+
+
+class SearchTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp_dir = tempfile.TemporaryDirectory()
+        cls._search_file = Path(cls._tmp_dir.name) / 'search_index.npz'
+        cls._search = abse.AoBinSearch(search_file=cls._search_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp_dir.cleanup()
+
+    def test_tokenize(self):
+        self.assertListEqual(
+            abse.tokenize("T4_2H_BloodLetter Adept's Élan"),
+            ['t4', '2h', 'blood', 'letter', 'adepts', 'elan']
+        )
+
+    def test_search(self):
+        res = self._search.search('bloodletter')
+        self.assertIn('MAIN_RAPIER_MORGANA', res[0]['unique_name'])
+        self.assertIn('Bloodletter', res[0]['local_name'])
+        self.assertEqual(res[0]['score'], abse.EXACT_WEIGHT)
+
+        # Documents matching every word come first
+        res = self._search.search("adept's HELLION", limit=5)
+        for x in res:
+            self.assertEqual(x['matched'], 2)
+            self.assertTrue(x['unique_name'].startswith('T4_'))
+
+    def test_partial(self):
+        exact, partial = self._search.expand('hellio')
+        self.assertIsNone(exact)
+        self.assertIn('hellion', self._search.terms[partial].tolist())
+
+        res = self._search.search('hellio')
+        self.assertIn('Hellion', res[0]['local_name'])
+        self.assertEqual(res[0]['score'], abse.PARTIAL_WEIGHT)
+        self.assertListEqual(self._search.search('xyzzy'), [])
+
+    def test_sources(self):
+        res = self._search.search(
+            'lymhurst', sources=[abse.CLUSTERS_SOURCE]
+        )
+        self.assertEqual(res[0]['local_name'], 'Lymhurst')
+        self.assertIsNone(res[0]['address'])
+
+        res = self._search.search('smelter', sources=['quests'])
+        self.assertEqual(res[0]['address'][0], 'quests')
+
+    def test_cache(self):
+        self.assertTrue(self._search_file.exists())
+        search = abse.AoBinSearch(search_file=self._search_file)
+        self.assertListEqual(
+            search.search('hellion hood'),
+            self._search.search('hellion hood')
+        )
+
+
+class SpawnsTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp_dir = tempfile.TemporaryDirectory()
+        cls._spawn_file = Path(cls._tmp_dir.name) / 'spawn_behaviors.npz'
+        cls._spawns = absp.AoBinSpawns(spawn_file=cls._spawn_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp_dir.cleanup()
+
+    def test_parse_mob_name(self):
+        self.assertTupleEqual(
+            absp.parse_mob_name('T3_MOB_ROAMING_HERETIC_MAGE'),
+            (3, 'MOB_ROAMING_HERETIC_MAGE')
+        )
+        self.assertTupleEqual(
+            absp.parse_mob_name('MOB_WOLF'), (0, 'MOB_WOLF')
+        )
+
+    def test_candidates(self):
+        res = self._spawns.candidates('HUNT_TEST_SPAWN', 5)
+        self.assertEqual(len(res), 5)
+        self.assertAlmostEqual(sum(x['probability'] for x in res), 1)
+        # Upgrade only mobs aren't part of the regular roll
+        boss = res[-1]
+        self.assertTrue(boss['only_as_upgrade'])
+        self.assertEqual(boss['probability'], 0)
+
+        # No tier 3 variant, the default applies
+        self.assertListEqual(
+            self._spawns.candidates('HUNT_TEST_SPAWN', 3),
+            self._spawns.candidates('HUNT_TEST_SPAWN')
+        )
+        with self.assertRaises(KeyError):
+            self._spawns.candidates('MISSING')
+
+    def test_variant(self):
+        spawns = self._spawns
+        default = spawns.variant('HUNT_REVIEW_SPAWN_LOW')
+        self.assertEqual(spawns.variant_tiers[default], absp.DEFAULT_TIER)
+        self.assertEqual(spawns.variant('HUNT_REVIEW_SPAWN_LOW', 5), default)
+
+        v = spawns.variant('HUNT_REVIEW_SPAWN_LOW', 5, 'Outlands')
+        self.assertEqual(spawns.variant_continents[v], 'Outlands')
+        self.assertEqual(spawns.variant_tiers[v], 5)
+        v = spawns.variant('HUNT_REVIEW_SPAWN_LOW', 8, 'Royal')
+        self.assertEqual(v, default)
+
+    def test_find_behaviors(self):
+        res = self._spawns.find_behaviors('T3_MOB_ROAMING_HERETIC_MAGE')
+        self.assertIn('HUNT_TEST_SPAWN', [x['behavior'] for x in res])
+        for x in res:
+            self.assertEqual(x['mob'], 'T3_MOB_ROAMING_HERETIC_MAGE')
+
+        res = self._spawns.find_behaviors(mob_tier=4, tier=5)
+        self.assertTrue(res)
+        for x in res:
+            self.assertEqual(x['tier'], 5)
+            self.assertTrue(x['mob'].startswith('T4_'))
+        self.assertListEqual(self._spawns.find_behaviors('MOB_MISSING'), [])
+
+    def test_sample(self):
+        mobs = self._spawns.sample_mobs('HUNT_TEST_SPAWN', 4000, 5, seed=1)
+        names, counts = np.unique(mobs, return_counts=True)
+        self.assertEqual(len(names), 4)
+        self.assertNotIn('T4_MOB_RD_KEEPER_UNCLEFROST_BOSS', names)
+        np.testing.assert_allclose(counts/4000, 0.25, atol=0.03)
+
+        # One draw per variant, each from its own candidates
+        spawns = self._spawns
+        variants = np.arange(len(spawns.variant_tiers))
+        res = spawns.sample(variants, seed=2)
+        self.assertTupleEqual(res.shape, variants.shape)
+        for v, mob in zip(variants.tolist(), res.tolist()):
+            candidates = spawns.candidate_mobs[
+                spawns.indptr[v]:spawns.indptr[v + 1]
+            ]
+            if mob == absp.NO_MOB:
+                self.assertFalse((spawns.probs[
+                    spawns.indptr[v]:spawns.indptr[v + 1]
+                ] > 0).any())
+            else:
+                self.assertIn(mob, candidates)
+
+    def test_cache(self):
+        self.assertTrue(self._spawn_file.exists())
+        spawns = absp.AoBinSpawns(spawn_file=self._spawn_file)
+        np.testing.assert_array_equal(spawns.cdf, self._spawns.cdf)
+        self.assertListEqual(
+            spawns.find_behaviors('MOB_WOLF'),
+            self._spawns.find_behaviors('MOB_WOLF')
+        )
+
+
 if __name__ == "__main__":
     unittest.main()